@@ -0,0 +1 @@
+"""Incremental analytics over websocket and REST market data"""
@@ -0,0 +1,463 @@
+"""Candles built locally from trades or from lower timeframe candles"""
+import re
+from collections import OrderedDict, deque, namedtuple
+from datetime import datetime, timezone
+
+import numpy as np
+
+TIMEFRAME_UNITS = {
+    "s": 1000,
+    "m": 60 * 1000,
+    "h": 60 * 60 * 1000,
+    "D": 24 * 60 * 60 * 1000,
+}
+
+TIMEFRAME = re.compile(r"^(\d+)([smhDM])$")
+
+Candles = namedtuple("Candles", ["mts", "open", "close", "high", "low", "volume"])
+
+
+def timeframe_ms(timeframe):
+    """Length of a timeframe (e.g. "1s", "5m", "1h", "1D") in milliseconds.
+    Returns None for months ("1M"), which do not have a fixed length."""
+    match = TIMEFRAME.match(timeframe)
+    if not match or int(match.group(1)) == 0:
+        raise ValueError("Invalid timeframe %r" % timeframe)
+    if match.group(2) == "M":
+        return None
+    return int(match.group(1)) * TIMEFRAME_UNITS[match.group(2)]
+
+
+def bar_start(mts, timeframe):
+    """Millisecond timestamp of the start of the bar of a timeframe that
+    contains ``mts``. Bars are aligned to the unix epoch (utc), months to
+    the first day of the month."""
+    length = timeframe_ms(timeframe)
+    if length is not None:
+        return mts - mts % length
+    months = int(timeframe[:-1])
+    date = datetime.fromtimestamp(mts / 1000.0, tz=timezone.utc)
+    month = (date.year * 12 + date.month - 1) // months * months
+    start = datetime(month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+    return int(start.timestamp() * 1000)
+
+
+class Bar:
+    """OHLCV bar that keeps the timestamps of its first and last trades,
+    so that late trades update the open and close correctly."""
+
+    __slots__ = ("mts", "open", "close", "high", "low", "volume",
+                 "first_mts", "last_mts")
+
+    def __init__(self, mts, price, trade_mts, volume):
+        self.mts = mts
+        self.open = self.close = self.high = self.low = price
+        self.volume = volume
+        self.first_mts = self.last_mts = trade_mts
+
+    def add(self, trade_mts, price, volume):
+        """Add a trade to the bar"""
+        if trade_mts < self.first_mts:
+            self.first_mts, self.open = trade_mts, price
+        if trade_mts >= self.last_mts:
+            self.last_mts, self.close = trade_mts, price
+        if price > self.high:
+            self.high = price
+        if price < self.low:
+            self.low = price
+        self.volume += volume
+
+    def to_list(self):
+        """The bar in the Bitfinex candle format
+        ``[MTS, OPEN, CLOSE, HIGH, LOW, VOLUME]``"""
+        return [self.mts, self.open, self.close, self.high, self.low, self.volume]
+
+
+def merge_candles(mts, candles):
+    """Merge consecutive candles (oldest first) into a single candle
+    starting at ``mts``"""
+    return [
+        mts,
+        candles[0][1],
+        candles[-1][2],
+        max(candle[3] for candle in candles),
+        min(candle[4] for candle in candles),
+        sum(candle[5] for candle in candles),
+    ]
+
+
+class _TradeSeries:
+    """Bars of one timeframe built from trades"""
+
+    def __init__(self, timeframe, history, on_close):
+        self.timeframe = timeframe
+        self.on_close = on_close
+        self.current = None
+        self.closed = deque(maxlen=history)
+        self.by_mts = {}
+
+    def add(self, trade_mts, price, volume):
+        start = bar_start(trade_mts, self.timeframe)
+        current = self.current
+        if current is not None and start == current.mts:
+            current.add(trade_mts, price, volume)
+        elif current is None or start > current.mts:
+            if current is not None:
+                self._close(current)
+            self.current = Bar(start, price, trade_mts, volume)
+        else:
+            # Late trade for a closed bar
+            bar = self.by_mts.get(start)
+            if bar is not None:
+                bar.add(trade_mts, price, volume)
+
+    def _close(self, bar):
+        if len(self.closed) == self.closed.maxlen:
+            self.by_mts.pop(self.closed[0].mts, None)
+        self.closed.append(bar)
+        self.by_mts[bar.mts] = bar
+        if self.on_close is not None:
+            self.on_close(self.timeframe, bar.to_list())
+
+    def candles(self):
+        bars = list(self.closed)
+        if self.current is not None:
+            bars.append(self.current)
+        return [bar.to_list() for bar in bars]
+
+
+class _CandleSeries:
+    """Bars of one timeframe built from lower timeframe candles"""
+
+    def __init__(self, timeframe, history, on_close):
+        self.timeframe = timeframe
+        self.on_close = on_close
+        self.mts = None
+        # Candles of the current bar by timestamp, and the merge of all
+        # of them but the latest one, which is the one usually revised.
+        self.parts = OrderedDict()
+        self.committed = None
+        self.closed = deque(maxlen=history)
+
+    def add(self, candle):
+        start = bar_start(candle[0], self.timeframe)
+        if self.mts is None or start > self.mts:
+            if self.mts is not None:
+                self.closed.append(self.current())
+                if self.on_close is not None:
+                    self.on_close(self.timeframe, self.closed[-1])
+            self.mts = start
+            self.parts = OrderedDict()
+            self.committed = None
+        elif start < self.mts:
+            # Revision of a closed bar, only the latest one is supported.
+            return
+        parts = self.parts
+        if candle[0] in parts and candle[0] != next(reversed(parts)):
+            parts[candle[0]] = candle
+            parts_list = list(parts.values())
+            self.committed = merge_candles(self.mts, parts_list[:-1])
+            return
+        if parts and candle[0] != next(reversed(parts)):
+            previous = next(reversed(parts.values()))
+            if self.committed is None:
+                self.committed = merge_candles(self.mts, [previous])
+            else:
+                self.committed = merge_candles(self.mts, [self.committed, previous])
+        parts[candle[0]] = candle
+
+    def current(self):
+        if self.mts is None:
+            return None
+        latest = next(reversed(self.parts.values()))
+        if self.committed is None:
+            return merge_candles(self.mts, [latest])
+        return merge_candles(self.mts, [self.committed, latest])
+
+    def candles(self):
+        candles = list(self.closed)
+        if self.mts is not None:
+            candles.append(self.current())
+        return candles
+
+
+class CandleAggregator:
+    """Builds OHLCV candles of several timeframes locally, either from the
+    trades of a symbol or from its candles of a lower timeframe (e.g. 1m).
+
+    A single trades (or 1m candles) subscription then replaces one candles
+    subscription per timeframe, and timeframes that Bitfinex does not offer,
+    like seconds, become available. Bars are aligned to the unix epoch.
+
+    Parameters
+    ----------
+    timeframes : iterable
+        Timeframes to build, e.g. ("1s", "1m", "5m", "1h", "1D"). When
+        built from candles, each must be a multiple of the candles'
+        timeframe.
+
+    history : int
+        Number of closed candles kept per timeframe. Default: 1000
+
+    on_close : Optional func
+        Called as ``on_close(timeframe, candle)`` each time a candle closes.
+
+    max_trade_ids : int
+        Number of trade ids remembered to recognise repeated trades.
+        Default: 100000
+
+    Example
+    -------
+     ::
+
+        aggregator = CandleAggregator(["1s", "1m", "5m", "1h"], on_close=print)
+        my_client.subscribe_to_trades("BTCUSD", callback=aggregator.on_trades_message)
+
+        aggregator.candles("1m")
+
+    """
+
+    def __init__(self, timeframes, history=1000, on_close=None,
+                 max_trade_ids=100000):
+        self.timeframes = list(timeframes)
+        for timeframe in self.timeframes:
+            timeframe_ms(timeframe)
+        self.history = history
+        self.on_close = on_close
+        self.max_trade_ids = max_trade_ids
+        self._trade_series = {
+            timeframe: _TradeSeries(timeframe, history, on_close)
+            for timeframe in self.timeframes
+        }
+        self._candle_series = {
+            timeframe: _CandleSeries(timeframe, history, on_close)
+            for timeframe in self.timeframes
+        }
+        self._trades = OrderedDict()
+        self._from_candles = None
+
+    def add_trade(self, trade_id, mts, amount, price):
+        """Add a trade to the candles of every timeframe. Trades are
+        recognised by id: a repeated trade is ignored, a repeated trade with
+        different values corrects the candles (late trade correction)."""
+        self._check_source(False)
+        volume = abs(amount)
+        known = self._trades.get(trade_id)
+        if known is not None:
+            if known == (mts, amount, price):
+                return
+            # The trade was corrected: replace its volume and add its price.
+            volume -= abs(known[1])
+        self._trades[trade_id] = (mts, amount, price)
+        if len(self._trades) > self.max_trade_ids:
+            self._trades.popitem(last=False)
+        for series in self._trade_series.values():
+            series.add(mts, price, volume)
+
+    def add_candle(self, candle):
+        """Add (or revise) a lower timeframe candle
+        ``[MTS, OPEN, CLOSE, HIGH, LOW, VOLUME]``"""
+        self._check_source(True)
+        for series in self._candle_series.values():
+            series.add(candle)
+
+    def on_trades_message(self, message):
+        """Trades channel callback. Snapshots, ``te`` and ``tu`` messages
+        are added with ``add_trade``."""
+        if not isinstance(message, list) or len(message) < 2:
+            return
+        if message[1] in ("te", "tu"):
+            trades = [message[2]]
+        elif isinstance(message[1], list):
+            trades = sorted(message[1], key=lambda trade: trade[1])
+        else:
+            return
+        for trade in trades:
+            self.add_trade(*trade[:4])
+
+    def on_candles_message(self, message):
+        """Candles channel callback, e.g. for 1m candles. Snapshots and
+        updates are added with ``add_candle``."""
+        if not isinstance(message, list) or not isinstance(message[1], list):
+            return
+        candles = message[1]
+        if candles and isinstance(candles[0], list):
+            # Snapshots are sent newest first
+            for candle in sorted(candles, key=lambda candle: candle[0]):
+                self.add_candle(candle)
+        elif candles:
+            self.add_candle(candles)
+
+    def current(self, timeframe):
+        """Returns the candle in progress of a timeframe, or None"""
+        candles = self.candles(timeframe)
+        return candles[-1] if candles else None
+
+    def candles(self, timeframe):
+        """Returns the closed candles of a timeframe followed by the one in
+        progress, oldest first, in the Bitfinex candle format."""
+        if self._from_candles:
+            return self._candle_series[timeframe].candles()
+        return self._trade_series[timeframe].candles()
+
+    def _check_source(self, from_candles):
+        if self._from_candles is None:
+            self._from_candles = from_candles
+        elif self._from_candles != from_candles:
+            raise ValueError("An aggregator is built either from trades or from candles")
+
+
+class CandleSeries:
+    """Candles of one subscription kept in preallocated numpy columns.
+
+    Merges the snapshot and the updates of a candles channel (and REST
+    candles): a candle with the timestamp of an existing one overwrites it
+    in place, a newer one is appended. When the columns are full the
+    oldest half is discarded.
+
+    Parameters
+    ----------
+    capacity : int
+        Maximum number of candles kept. Default: 10000
+
+    on_update : Optional func
+        Called as ``on_update(series, appended)`` after each merged message,
+        ``appended`` being True when new candles were added.
+
+    Example
+    -------
+     ::
+
+        series = CandleSeries(on_update=lambda series, appended: print(series.last(20).close.mean()))
+        series.extend(rest_client.candles("1m", "tBTCUSD", "hist", limit=1000))
+        my_client.subscribe_to_candles("BTCUSD", "1m", callback=series.on_message)
+
+    Note
+    ----
+    The arrays returned by ``last`` and the column properties are views on
+    the columns: they are not copied, and are only valid until the next
+    update.
+
+    """
+
+    def __init__(self, capacity=10000, on_update=None):
+        if capacity < 2:
+            raise ValueError("capacity must be at least 2")
+        self.capacity = capacity
+        self.on_update = on_update
+        self._mts = np.zeros(capacity, dtype=np.int64)
+        self._values = np.zeros((5, capacity), dtype=np.float64)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def update(self, candle):
+        """Merge a candle ``[MTS, OPEN, CLOSE, HIGH, LOW, VOLUME]``.
+        Returns True when it was appended."""
+        mts = candle[0]
+        size = self._size
+        if size and mts <= self._mts[size - 1]:
+            if mts == self._mts[size - 1]:
+                index = size - 1
+            else:
+                index = int(np.searchsorted(self._mts[:size], mts))
+                if self._mts[index] != mts:
+                    index = self._insert(index)
+                    if index is None:
+                        return False
+                    self._mts[index] = mts
+            self._values[:, index] = candle[1:6]
+            return False
+        if size == self.capacity:
+            self._compact()
+            size = self._size
+        self._mts[size] = mts
+        self._values[:, size] = candle[1:6]
+        self._size = size + 1
+        return True
+
+    def extend(self, candles):
+        """Merge a list of candles in any order, e.g. a channel snapshot
+        (newest first) or the result of ``restv2.Client.candles``.
+        Returns True when candles were appended."""
+        candles = sorted(candles, key=lambda candle: candle[0])
+        appended = False
+        for candle in candles:
+            appended = self.update(candle) or appended
+        return appended
+
+    def on_message(self, message):
+        """Candles channel callback, merging snapshots and updates"""
+        if not isinstance(message, list) or len(message) < 2:
+            return
+        candles = message[1]
+        if not isinstance(candles, list) or not candles:
+            return
+        if isinstance(candles[0], list):
+            appended = self.extend(candles)
+        else:
+            appended = self.update(candles)
+        if self.on_update is not None:
+            self.on_update(self, appended)
+
+    def last(self, n=None):
+        """Returns the last ``n`` candles (all of them by default) as
+        ``Candles`` of zero-copy column views, oldest first."""
+        start = 0 if n is None else max(0, self._size - n)
+        values = self._values[:, start:self._size]
+        return Candles(self._mts[start:self._size], *values)
+
+    @property
+    def mts(self):
+        return self._mts[:self._size]
+
+    @property
+    def open(self):
+        return self._values[0, :self._size]
+
+    @property
+    def close(self):
+        return self._values[1, :self._size]
+
+    @property
+    def high(self):
+        return self._values[2, :self._size]
+
+    @property
+    def low(self):
+        return self._values[3, :self._size]
+
+    @property
+    def volume(self):
+        return self._values[4, :self._size]
+
+    def to_list(self):
+        """Returns the candles in the Bitfinex format, oldest first"""
+        return [
+            [int(mts)] + values.tolist()
+            for mts, values in zip(self.mts, self._values[:, :self._size].T)
+        ]
+
+    def _insert(self, index):
+        # Candles rarely arrive out of order, shift the newer ones.
+        if self._size == self.capacity:
+            if index == 0:
+                # Older than all the candles kept
+                return None
+            self._compact()
+            index -= self.capacity - self._size
+            if index < 0:
+                # Belongs to the candles just discarded
+                return None
+        size = self._size
+        self._mts[index + 1:size + 1] = self._mts[index:size]
+        self._values[:, index + 1:size + 1] = self._values[:, index:size]
+        self._size = size + 1
+        return index
+
+    def _compact(self):
+        keep = self.capacity // 2
+        self._mts[:keep] = self._mts[self._size - keep:self._size]
+        self._values[:, :keep] = self._values[:, self._size - keep:self._size]
+        self._size = keep
@@ -0,0 +1,368 @@
+"""Technical indicators updated incrementally from candles"""
+import math
+from collections import deque, namedtuple
+
+import numpy as np
+
+Bands = namedtuple("Bands", ["middle", "upper", "lower"])
+
+# Bound of the rescaling factor of a block of ``ema``
+_EMA_RESCALE = 1e100
+
+
+def ema(values, alpha, initial=None):
+    """Vectorized exponential moving average
+    ``y[t] = y[t-1] + alpha * (values[t] - y[t-1])``.
+
+    Parameters
+    ----------
+    values : array_like
+        Input values.
+
+    alpha : float
+        Smoothing factor in (0, 1].
+
+    initial : Optional float
+        Average before the first value. Defaults to the first value.
+
+    Returns
+    -------
+    ndarray
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = np.empty_like(values)
+    if not len(values):
+        return result
+    if initial is None:
+        initial = values[0]
+    if alpha >= 1:
+        result[:] = values
+        return result
+    decay = 1.0 - alpha
+    # y[j] = decay^j * (decay * y[-1] + alpha * cumsum(x[k] / decay^k)),
+    # computed in blocks short enough for decay^-k to stay finite.
+    block = max(1, int(math.log(_EMA_RESCALE) / -math.log(decay)))
+    previous = initial
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        powers = decay ** np.arange(len(chunk))
+        result[start:start + len(chunk)] = powers * (
+            decay * previous + alpha * np.cumsum(chunk / powers))
+        previous = result[start + len(chunk) - 1]
+    return result
+
+
+def _columns(candles):
+    """mts, close, high and low columns of candles given as rows
+    ``[MTS, OPEN, CLOSE, HIGH, LOW, VOLUME]`` or as ``Candles`` columns"""
+    if hasattr(candles, "close"):
+        return (np.asarray(candles.mts), np.asarray(candles.close, dtype=np.float64),
+                np.asarray(candles.high, dtype=np.float64),
+                np.asarray(candles.low, dtype=np.float64))
+    rows = sorted(candles, key=lambda candle: candle[0])
+    array = np.array([row[:5] for row in rows], dtype=np.float64).reshape(-1, 5)
+    return array[:, 0].astype(np.int64), array[:, 2], array[:, 3], array[:, 4]
+
+
+class Indicator:
+    """Base class of the indicators.
+
+    ``update`` takes candles ``[MTS, OPEN, CLOSE, HIGH, LOW, VOLUME]`` in
+    O(1). A candle with the timestamp of the latest one is a revision of
+    the bar in progress and replaces it, a newer one closes it. Subclasses
+    implement ``_compute`` (the value of a candle from the state of the
+    closed bars), ``_commit`` (closes the bar last computed), ``_backfill``
+    (vectorized values of full columns) and ``_restore`` (the state pending
+    commit after backfilled columns).
+
+    Candles built from the trades stream by ``CandleAggregator`` are fed
+    to ``update`` the same way as those of the candles channel.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forget every candle"""
+        self.value = None
+        self._mts = None
+
+    def update(self, candle):
+        """Add or revise a candle and return the value of the indicator"""
+        mts = candle[0]
+        if self._mts is not None:
+            if mts < self._mts:
+                return self.value
+            if mts > self._mts:
+                self._commit()
+        self._mts = mts
+        self.value = self._compute(candle[2], candle[3], candle[4])
+        return self.value
+
+    def backfill(self, candles):
+        """Compute the indicator over candles at once, e.g. the result of
+        ``restv2.Client.candles`` (any order) or ``CandleSeries.last()``.
+        Replaces the state of the indicator, ``update`` then continues from
+        the latest candle.
+
+        Returns
+        -------
+        ndarray
+            The value of the indicator at each candle, oldest first, NaN
+            where it is not defined yet.
+        """
+        mts, close, high, low = _columns(candles)
+        self.reset()
+        if not len(mts):
+            return np.empty(0)
+        values = self._backfill(close, high, low)
+        if len(mts) > 1:
+            # The state after the next to last candle, pending commit
+            self._restore(close[:-1], values[:-1])
+            self._mts = int(mts[-2])
+        self.update([int(mts[-1]), None, close[-1], high[-1], low[-1]])
+        return values
+
+    def on_message(self, message):
+        """Candles channel callback: snapshots are backfilled, updates
+        added with ``update``."""
+        if not isinstance(message, list) or len(message) < 2:
+            return
+        candles = message[1]
+        if not isinstance(candles, list) or not candles:
+            return
+        if isinstance(candles[0], list):
+            self.backfill(candles)
+        else:
+            self.update(candles)
+
+    def _compute(self, close, high, low):
+        raise NotImplementedError
+
+    def _commit(self):
+        raise NotImplementedError
+
+    def _backfill(self, close, high, low):
+        raise NotImplementedError
+
+    def _restore(self, close, values):
+        raise NotImplementedError
+
+
+class EMA(Indicator):
+    """Exponential moving average of the close, seeded with the first close.
+
+    Parameters
+    ----------
+    period : int
+        Number of bars, the smoothing factor being ``2 / (period + 1)``.
+
+    Example
+    -------
+     ::
+
+        ema = EMA(20)
+        ema.backfill(rest_client.candles("1m", "tBTCUSD", "hist", limit=1000))
+        my_client.subscribe_to_candles("BTCUSD", "1m", callback=ema.on_message)
+
+    """
+
+    def __init__(self, period):
+        self.period = period
+        self.alpha = 2.0 / (period + 1)
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+        self._average = None
+        self._pending = None
+
+    def _compute(self, close, high, low):
+        if self._average is None:
+            self._pending = close
+        else:
+            self._pending = self._average + self.alpha * (close - self._average)
+        return self._pending
+
+    def _commit(self):
+        self._average = self._pending
+
+    def _backfill(self, close, high, low):
+        return ema(close, self.alpha)
+
+    def _restore(self, close, values):
+        self._pending = values[-1]
+
+
+class RSI(Indicator):
+    """Relative strength index with Wilder smoothing of the gains and
+    losses, seeded with the first change. The value is None until the
+    second bar.
+
+    Parameters
+    ----------
+    period : int
+        Number of bars. Default: 14
+    """
+
+    def __init__(self, period=14):
+        self.period = period
+        self.alpha = 1.0 / period
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+        self._state = None
+        self._pending = None
+
+    def _compute(self, close, high, low):
+        if self._state is None:
+            self._pending = (close, None, None)
+            return None
+        previous, gain, loss = self._state
+        change = close - previous
+        up, down = max(change, 0.0), max(-change, 0.0)
+        if gain is None:
+            gain, loss = up, down
+        else:
+            gain += self.alpha * (up - gain)
+            loss += self.alpha * (down - loss)
+        self._pending = (close, gain, loss)
+        return self._rsi(gain, loss)
+
+    def _commit(self):
+        self._state = self._pending
+
+    @staticmethod
+    def _rsi(gain, loss):
+        if loss == 0:
+            return 100.0 if gain > 0 else 50.0
+        return 100.0 - 100.0 / (1.0 + gain / loss)
+
+    def _averages(self, close):
+        change = np.diff(close)
+        gain = ema(np.maximum(change, 0.0), self.alpha)
+        loss = ema(np.maximum(-change, 0.0), self.alpha)
+        return gain, loss
+
+    def _backfill(self, close, high, low):
+        values = np.full(len(close), np.nan)
+        gain, loss = self._averages(close)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values[1:] = 100.0 - 100.0 / (1.0 + gain / loss)
+        values[1:][loss == 0] = np.where(gain[loss == 0] > 0, 100.0, 50.0)
+        return values
+
+    def _restore(self, close, values):
+        if len(close) == 1:
+            self._pending = (close[-1], None, None)
+            return
+        gain, loss = self._averages(close)
+        self._pending = (close[-1], gain[-1], loss[-1])
+
+
+class ATR(Indicator):
+    """Average true range with Wilder smoothing, seeded with the range of
+    the first bar.
+
+    Parameters
+    ----------
+    period : int
+        Number of bars. Default: 14
+    """
+
+    def __init__(self, period=14):
+        self.period = period
+        self.alpha = 1.0 / period
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+        self._state = None
+        self._pending = None
+
+    def _compute(self, close, high, low):
+        if self._state is None:
+            average = high - low
+        else:
+            previous, average = self._state
+            true_range = max(high - low, abs(high - previous), abs(low - previous))
+            average += self.alpha * (true_range - average)
+        self._pending = (close, average)
+        return average
+
+    def _commit(self):
+        self._state = self._pending
+
+    def _backfill(self, close, high, low):
+        true_range = high - low
+        previous = close[:-1]
+        true_range[1:] = np.maximum.reduce([
+            true_range[1:], np.abs(high[1:] - previous), np.abs(low[1:] - previous)])
+        return ema(true_range, self.alpha)
+
+    def _restore(self, close, values):
+        self._pending = (close[-1], values[-1])
+
+
+class Bollinger(Indicator):
+    """Bollinger bands: moving average of the close and bands at a number
+    of (population) standard deviations. The value is a ``Bands`` tuple,
+    None until ``period`` bars.
+
+    Parameters
+    ----------
+    period : int
+        Number of bars. Default: 20
+
+    deviations : float
+        Width of the bands in standard deviations. Default: 2
+    """
+
+    def __init__(self, period=20, deviations=2.0):
+        self.period = period
+        self.deviations = deviations
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+        # Closes of the latest period - 1 closed bars and their sums
+        self._closes = deque()
+        self._sum = 0.0
+        self._sum_squares = 0.0
+        self._pending = None
+
+    def _compute(self, close, high, low):
+        self._pending = close
+        if len(self._closes) < self.period - 1:
+            return None
+        mean = (self._sum + close) / self.period
+        variance = (self._sum_squares + close * close) / self.period - mean * mean
+        width = self.deviations * math.sqrt(max(variance, 0.0))
+        return Bands(mean, mean + width, mean - width)
+
+    def _commit(self):
+        close = self._pending
+        self._closes.append(close)
+        self._sum += close
+        self._sum_squares += close * close
+        if len(self._closes) >= self.period:
+            oldest = self._closes.popleft()
+            self._sum -= oldest
+            self._sum_squares -= oldest * oldest
+
+    def _backfill(self, close, high, low):
+        values = np.full((len(close), 3), np.nan)
+        if len(close) < self.period:
+            return values
+        windows = np.lib.stride_tricks.sliding_window_view(close, self.period)
+        mean = windows.mean(axis=1)
+        width = self.deviations * windows.std(axis=1)
+        values[self.period - 1:] = np.column_stack([mean, mean + width, mean - width])
+        return values
+
+    def _restore(self, close, values):
+        self._closes = deque(close[max(0, len(close) - self.period):-1].tolist())
+        self._sum = float(sum(self._closes))
+        self._sum_squares = float(sum(value * value for value in self._closes))
+        self._pending = close[-1]
@@ -0,0 +1,195 @@
+"""Trade tape with rolling trade statistics"""
+from collections import namedtuple
+
+import numpy as np
+
+TapeStats = namedtuple("TapeStats", [
+    "vwap", "volume", "buy_volume", "sell_volume", "imbalance", "count",
+])
+"""Statistics of the trades in a window. ``imbalance`` is
+(buy_volume - sell_volume) / volume, between -1 and 1. ``vwap`` and
+``imbalance`` are NaN for empty windows."""
+
+
+class _Window:
+    """Running sums of the trades of a window"""
+
+    __slots__ = ("length", "tail", "volume", "notional", "buy_volume", "count")
+
+    def __init__(self, length, tail):
+        self.length = length
+        self.tail = tail
+        self.volume = 0.0
+        self.notional = 0.0
+        self.buy_volume = 0.0
+        self.count = 0
+
+
+class TradeTape:
+    """Fixed size ring buffer of the trades of one symbol, maintaining
+    rolling statistics over one or more time windows.
+
+    Trades are stored in preallocated arrays. Each window keeps running sums
+    that are updated when a trade enters or leaves the window, so adding a
+    trade costs O(1) amortized whatever the size of the windows.
+
+    Parameters
+    ----------
+    windows : iterable
+        Window lengths in milliseconds. Default: (60000,)
+
+    capacity : int
+        Number of trades kept. Trades pushed out of the buffer also leave
+        every window, so the capacity should hold the longest window.
+        Default: 65536
+
+    Example
+    -------
+     ::
+
+        tape = TradeTape(windows=(10000, 60000))
+        my_client.subscribe_to_trades("BTCUSD", callback=tape.on_message)
+
+        stats = tape.stats(60000)
+        stats.vwap, stats.imbalance
+
+    """
+
+    def __init__(self, windows=(60000,), capacity=65536):
+        self.capacity = capacity
+        self.mts = np.zeros(capacity, dtype=np.int64)
+        self.amount = np.zeros(capacity, dtype=np.float64)
+        self.price = np.zeros(capacity, dtype=np.float64)
+        self._head = 0
+        self._last_id = None
+        self._windows = {length: _Window(length, 0) for length in windows}
+
+    def __len__(self):
+        return min(self._head, self.capacity)
+
+    @property
+    def last_mts(self):
+        """Timestamp of the latest trade, or None"""
+        if not self._head:
+            return None
+        return int(self.mts[(self._head - 1) % self.capacity])
+
+    def add(self, mts, amount, price):
+        """Add a trade.
+
+        Parameters
+        ----------
+        mts : int
+            Millisecond timestamp of the trade.
+
+        amount : float
+            Amount traded, positive for buys and negative for sells.
+
+        price : float
+            Price of the trade.
+        """
+        head = self._head
+        if head >= self.capacity:
+            # The oldest trade is overwritten, it leaves every window first.
+            oldest = head - self.capacity
+            for window in self._windows.values():
+                if window.tail <= oldest:
+                    self._remove(window, oldest)
+                    window.tail = oldest + 1
+        slot = head % self.capacity
+        self.mts[slot] = mts
+        self.amount[slot] = amount
+        self.price[slot] = price
+        self._head = head + 1
+        volume = abs(amount)
+        notional = volume * price
+        for window in self._windows.values():
+            window.volume += volume
+            window.notional += notional
+            if amount > 0:
+                window.buy_volume += volume
+            window.count += 1
+            self._expire(window, mts - window.length)
+
+    def on_message(self, message):
+        """Trades channel callback. Adds the trades of snapshots and of
+        trade executed (``te``) messages. Trade execution updates (``tu``)
+        repeat the ``te`` trades and are ignored."""
+        if not isinstance(message, list) or len(message) < 2:
+            return
+        if message[1] == "te":
+            trades = [message[2]]
+        elif isinstance(message[1], list):
+            # Snapshots are sent newest first
+            trades = sorted(message[1], key=lambda trade: (trade[1], trade[0]))
+        else:
+            return
+        for trade_id, mts, amount, price in (trade[:4] for trade in trades):
+            if self._last_id is not None and trade_id <= self._last_id:
+                continue
+            self._last_id = trade_id
+            self.add(mts, amount, price)
+
+    def stats(self, window, now=None):
+        """Returns the ``TapeStats`` of a window.
+
+        Parameters
+        ----------
+        window : int
+            Window length in milliseconds, one of the windows of the tape.
+
+        now : Optional int
+            Millisecond timestamp the window ends at. Defaults to the
+            timestamp of the latest trade.
+        """
+        state = self._windows[window]
+        if now is not None:
+            self._expire(state, now - state.length)
+        volume = state.volume
+        if state.count and volume > 0:
+            vwap = state.notional / volume
+            imbalance = (2 * state.buy_volume - volume) / volume
+        else:
+            vwap = imbalance = float("nan")
+        return TapeStats(
+            vwap, volume, state.buy_volume, volume - state.buy_volume,
+            imbalance, state.count
+        )
+
+    def trades(self, n=None):
+        """Returns the latest ``n`` trades (all kept trades by default) as
+        (mts, amount, price) arrays, oldest first. The arrays are views when
+        the trades are contiguous in the ring buffer, copies otherwise."""
+        size = len(self) if n is None else min(n, len(self))
+        stop = self._head % self.capacity or (self.capacity if self._head else 0)
+        start = stop - size
+        if start >= 0:
+            return self.mts[start:stop], self.amount[start:stop], self.price[start:stop]
+        return tuple(
+            np.concatenate([column[start:], column[:stop]])
+            for column in (self.mts, self.amount, self.price)
+        )
+
+    def _remove(self, window, seq):
+        slot = seq % self.capacity
+        amount = self.amount[slot]
+        volume = abs(amount)
+        window.volume -= volume
+        window.notional -= volume * self.price[slot]
+        if amount > 0:
+            window.buy_volume -= volume
+        window.count -= 1
+
+    def _expire(self, window, cutoff):
+        """Remove the trades older than cutoff from a window"""
+        mts = self.mts
+        capacity = self.capacity
+        tail = window.tail
+        head = self._head
+        while tail < head and mts[tail % capacity] < cutoff:
+            self._remove(window, tail)
+            tail += 1
+        window.tail = tail
+        if window.count == 0:
+            # Reset the sums, so rounding errors do not accumulate
+            window.volume = window.notional = window.buy_volume = 0.0
@@ -1,19 +1,134 @@
+"""Market data sources for backtests"""
+import numpy as np
 import pandas as pd
-import Quandl
+
+
+def _to_datetime(value):
+    """Time range bound given as epoch milliseconds, a string or a
+    datetime, as a utc naive ``pd.Timestamp``"""
+    if value is None:
+        return None
+    if isinstance(value, (int, np.integer, float, np.floating)):
+        return pd.Timestamp(int(value), unit="ms")
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert("UTC").tz_localize(None)
+    return timestamp
 
 
 class CSVDataSource:
     """
-    Loads a CSV into a pandas dataframe
+    Loads a CSV into a pandas dataframe.
+
+    The file is read in chunks with the given dtypes, converting the
+    timestamp column to datetime64 and filtering the time range chunk by
+    chunk, so only the rows kept are ever held in memory. ``data`` is
+    loaded on first access; ``iter_chunks`` streams the file instead, for
+    files larger than memory.
+
+    Example
+    -------
+     ::
+
+        source = CSVDataSource(
+            "trades.csv", ["id", "mts", "amount", "price"],
+            timestamp="mts", start="2019-01-01", end="2019-02-01"
+        )
+        for chunk in source.iter_chunks():
+            ...
+
     """
 
-    def __init__(self, fname, fields):
+    def __init__(self, fname, fields, dtype=None, timestamp=None, unit="ms",
+                 start=None, end=None, chunksize=1000000, set_index=False):
         """
-        loads the CSV
+        Describes the CSV, which is read when the data is first needed
         :param fname: csv file name
         :param fields: header names
+        :param dtype: dtypes by column name, passed to ``pd.read_csv``
+        :param timestamp: column of epoch timestamps converted to datetime64 while reading
+        :param unit: time unit of the timestamp column. Default: "ms"
+        :param start: first time included (epoch ms, string or datetime), requires ``timestamp``
+        :param end: first time excluded (epoch ms, string or datetime), requires ``timestamp``
+        :param chunksize: number of rows read at a time
+        :param set_index: use the timestamp column as index of ``data``
         """
-        self.data = pd.read_csv(fname, names=fields, parse_dates=True)
+        if (start is not None or end is not None) and timestamp is None:
+            raise ValueError("A time range requires the timestamp column")
+        self.fname = fname
+        self.fields = fields
+        self.dtype = dict(dtype or {})
+        if timestamp is not None:
+            self.dtype.setdefault(timestamp, np.int64)
+        self.timestamp = timestamp
+        self.unit = unit
+        self.start = _to_datetime(start)
+        self.end = _to_datetime(end)
+        self.chunksize = chunksize
+        self.set_index = set_index
+        self._data = None
+
+    @property
+    def data(self):
+        """The rows of the file (in the time range) as a DataFrame"""
+        if self._data is None:
+            chunks = list(self.iter_chunks())
+            if chunks:
+                self._data = pd.concat(chunks, ignore_index=not self.set_index)
+            else:
+                self._data = self._empty()
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+    def iter_chunks(self, chunksize=None):
+        """
+        Streams the file as DataFrames of at most ``chunksize`` rows, with
+        the timestamp column converted and the time range applied
+        :param chunksize: number of rows read at a time. Default: the chunksize of the source
+        :return: iterator of DataFrames
+        """
+        reader = pd.read_csv(
+            self.fname, names=self.fields, dtype=self.dtype,
+            chunksize=chunksize or self.chunksize
+        )
+        with reader:
+            for chunk in reader:
+                if self.timestamp is not None:
+                    chunk = self._parse_chunk(chunk)
+                    if chunk is None:
+                        continue
+                yield chunk
+
+    def _parse_chunk(self, chunk):
+        label = self.timestamp
+        chunk[label] = pd.to_datetime(chunk[label].to_numpy(), unit=self.unit)
+        if self.start is not None or self.end is not None:
+            times = chunk[label].to_numpy()
+            keep = np.ones(len(chunk), dtype=bool)
+            if self.start is not None:
+                keep &= times >= self.start.to_datetime64()
+            if self.end is not None:
+                keep &= times < self.end.to_datetime64()
+            if not keep.all():
+                chunk = chunk[keep]
+            if not len(chunk):
+                return None
+        if self.set_index:
+            chunk = chunk.set_index(label)
+        return chunk
+
+    def _empty(self):
+        data = pd.DataFrame({
+            field: pd.Series(dtype=self.dtype.get(field, object)) for field in self.fields
+        })
+        if self.timestamp is not None:
+            data[self.timestamp] = pd.Series(dtype="datetime64[ns]")
+            if self.set_index:
+                data = data.set_index(self.timestamp)
+        return data
 
     def parse_timestamp_column(self, label, unit, set_index=True):
         """
@@ -23,10 +138,10 @@ class CSVDataSource:
         :param unit: if column is already a timestamp, i.e. an integer, whats the time unit.
         :return:
         """
-        if isinstance(self.data[label][0], pd.tslib.Timestamp):
-            if set_index:
-                self.data.set_index(label, inplace=True)
+        if label not in self.data.columns:
+            # Already the index
             return
-        self.data[label] = pd.to_datetime(self.data[label], unit=unit)
+        if not pd.api.types.is_datetime64_any_dtype(self.data[label]):
+            self.data[label] = pd.to_datetime(self.data[label], unit=unit)
         if set_index:
             self.data.set_index(label, inplace=True)
@@ -0,0 +1,554 @@
+"""Event driven backtest engine replaying candles, trades and book updates"""
+import heapq
+from collections import deque, namedtuple
+from operator import itemgetter
+
+import numpy as np
+
+from ..analytics.candles import timeframe_ms
+from ..utils import order_symbol
+from .orderbook import OrderBook
+from ..websockets import orders
+
+# Event kinds
+CANDLE = "candle"
+TRADE = "trade"
+BOOK = "book"
+
+# Order types supported by the simulator. EXCHANGE prefixed types are
+# simulated the same way.
+LIMIT = "LIMIT"
+MARKET = "MARKET"
+STOP = "STOP"
+IOC = "IOC"
+FOK = "FOK"
+ORDER_TYPES = frozenset([LIMIT, MARKET, STOP, IOC, FOK])
+
+Fill = namedtuple("Fill", [
+    "mts", "order_id", "cid", "symbol", "amount", "price", "fee", "maker",
+])
+
+BacktestResult = namedtuple("BacktestResult", [
+    "equity", "fills", "orders", "portfolio", "events",
+])
+
+
+def _rows(array, chunk=65536):
+    """Rows of an array as lists, converted a chunk at a time"""
+    for start in range(0, len(array), chunk):
+        yield from array[start:start + chunk].tolist()
+
+
+def candle_events(symbol, candles, timeframe=None):
+    """Events of candles ``[MTS, OPEN, CLOSE, HIGH, LOW, VOLUME]``, e.g.
+    the result of ``restv2.Client.candles`` or a ``CandleSeries``.
+
+    Parameters
+    ----------
+    symbol : str
+        Symbol of the candles, e.g. "BTCUSD".
+
+    candles : iterable
+        Candles in any order, as lists or as the rows of an array.
+
+    timeframe : Optional str
+        Timeframe of the candles. When given, candles are replayed at the
+        end of their bar instead of its start, so that strategies do not
+        see a bar before it closed.
+
+    Returns
+    -------
+    iterator
+        ``(mts, CANDLE, symbol, candle)`` tuples in timestamp order.
+    """
+    if hasattr(candles, "to_list"):
+        candles = candles.to_list()
+    if isinstance(candles, np.ndarray):
+        candles = _rows(candles[np.argsort(candles[:, 0], kind="stable")])
+    else:
+        candles = sorted(candles, key=itemgetter(0))
+    offset = timeframe_ms(timeframe) if timeframe else 0
+    symbol = order_symbol(symbol)
+    return ((int(candle[0]) + offset, CANDLE, symbol, candle) for candle in candles)
+
+
+def trade_events(symbol, trades):
+    """Events of trades ``[ID, MTS, AMOUNT, PRICE]`` as sent by the trades
+    channel or returned by ``restv2.Client.trades``.
+
+    Returns
+    -------
+    iterator
+        ``(mts, TRADE, symbol, trade)`` tuples in timestamp order.
+    """
+    if isinstance(trades, np.ndarray):
+        trades = _rows(trades[np.lexsort((trades[:, 0], trades[:, 1]))])
+    else:
+        trades = sorted(trades, key=itemgetter(1, 0))
+    symbol = order_symbol(symbol)
+    return ((int(trade[1]), TRADE, symbol, trade) for trade in trades)
+
+
+def book_events(symbol, updates):
+    """Events of recorded price level updates ``[MTS, PRICE, COUNT, AMOUNT]``,
+    i.e. the updates of the book channel prefixed with the time they were
+    received. Recorded raw book updates ``[MTS, ORDER_ID, PRICE, AMOUNT]``
+    (the "rawbook" dataset of the store) are passed on the same way.
+
+    Returns
+    -------
+    iterator
+        ``(mts, BOOK, symbol, [PRICE, COUNT, AMOUNT])`` tuples (``[ORDER_ID,
+        PRICE, AMOUNT]`` for raw updates), in the order of the updates.
+    """
+    if isinstance(updates, np.ndarray):
+        updates = _rows(updates)
+    symbol = order_symbol(symbol)
+    return ((int(update[0]), BOOK, symbol, update[1:4]) for update in updates)
+
+
+class Strategy:
+    """Base class of backtested strategies.
+
+    The engine calls the ``on_*`` methods as events are replayed; only the
+    ones overridden are called. Orders are placed with the same methods as
+    on ``WssClient`` (``new_order``, ``cancel_order``, ``cancel_order_cid``
+    and ``update_order``), so a strategy can be moved to a live client by
+    replacing ``self.engine``.
+
+    Example
+    -------
+     ::
+
+        class Breakout(Strategy):
+            def on_candle(self, symbol, candle):
+                if candle[2] > self.level and not self.engine.portfolio.position(symbol):
+                    self.new_order("MARKET", symbol, 0.1, None)
+
+    """
+
+    engine = None
+
+    def on_start(self):
+        """Called before the first event"""
+
+    def on_candle(self, symbol, candle):
+        """Called for each candle ``[MTS, OPEN, CLOSE, HIGH, LOW, VOLUME]``"""
+
+    def on_trade(self, symbol, trade):
+        """Called for each trade ``[ID, MTS, AMOUNT, PRICE]``"""
+
+    def on_book(self, symbol, update):
+        """Called for each book update ``[PRICE, COUNT, AMOUNT]``"""
+
+    def on_order(self, order):
+        """Called when an ``orders.Order`` is accepted, canceled, rejected
+        or executed"""
+
+    def on_fill(self, fill):
+        """Called for each ``Fill`` of an order"""
+
+    def on_finish(self):
+        """Called after the last event"""
+
+    def new_order(self, *args, **kwargs):
+        """Place an order, see ``BacktestEngine.new_order``"""
+        return self.engine.new_order(*args, **kwargs)
+
+    def cancel_order(self, order_id):
+        """Cancel an order by id"""
+        return self.engine.cancel_order(order_id)
+
+    def cancel_order_cid(self, order_cid, order_date):
+        """Cancel an order by cid"""
+        return self.engine.cancel_order_cid(order_cid, order_date)
+
+    def update_order(self, **order_settings):
+        """Update an order, see ``BacktestEngine.update_order``"""
+        return self.engine.update_order(**order_settings)
+
+
+class Portfolio:
+    """Ledger of the cash, positions, realized profit and fees of a
+    backtest. Positions are in base currency, cash, profit and fees in
+    quote currency.
+
+    Parameters
+    ----------
+    cash : float
+        Initial cash. Default: 0
+    """
+
+    def __init__(self, cash=0.0):
+        self.initial_cash = cash
+        self.cash = cash
+        self.fees = 0.0
+        self.realized = 0.0
+        self.positions = {}
+        self.base_prices = {}
+
+    def position(self, symbol):
+        """Position amount of a symbol, negative when short"""
+        return self.positions.get(order_symbol(symbol), 0.0)
+
+    def apply(self, fill):
+        """Book a fill"""
+        symbol, amount, price = fill.symbol, fill.amount, fill.price
+        self.cash -= amount * price + fill.fee
+        self.fees += fill.fee
+        position = self.positions.get(symbol, 0.0)
+        base_price = self.base_prices.get(symbol, 0.0)
+        updated = position + amount
+        if position == 0 or (position > 0) == (amount > 0):
+            base_price = (position * base_price + amount * price) / updated
+        else:
+            closed = min(abs(amount), abs(position))
+            self.realized += closed * (price - base_price) * (1 if position > 0 else -1)
+            if abs(updated) < 1e-12:
+                updated, base_price = 0.0, 0.0
+            elif (updated > 0) != (position > 0):
+                # The position was reversed
+                base_price = price
+        self.positions[symbol] = updated
+        self.base_prices[symbol] = base_price
+
+    def equity(self, marks):
+        """Cash plus the value of the positions at the ``marks`` prices
+        (dict of symbol to price)"""
+        return self.cash + sum(
+            amount * marks.get(symbol, self.base_prices[symbol])
+            for symbol, amount in self.positions.items() if amount
+        )
+
+
+class BacktestEngine:
+    """Replays market data events in timestamp order through a ``Strategy``
+    and simulates the execution of its orders.
+
+    Resting limit orders are filled at their price (maker fee) when a trade
+    prints through it, a candle trades through it or the opposite side of
+    the book reaches it. Market orders, and limit orders that are
+    marketable when placed, are filled at the best opposite price, or the
+    last price without a book (taker fee). Stop orders become market orders
+    when the price reaches them.
+
+    Parameters
+    ----------
+    strategy : Strategy
+        The strategy to backtest.
+
+    events : list
+        Event iterables such as those of ``candle_events``,
+        ``trade_events`` and ``book_events``, each in timestamp order.
+
+    cash : float
+        Initial cash of the portfolio. Default: 0
+
+    maker_fee : float
+        Fee rate of maker fills. Default: 0.001
+
+    taker_fee : float
+        Fee rate of taker fills. Default: 0.002
+
+    latency : int
+        Milliseconds before orders, cancels and updates reach the
+        simulated exchange. Default: 0
+
+    fill_on_touch : bool
+        Fill resting limit orders when the price touches them instead of
+        trading through them. Default: False
+
+    volume_limit : bool
+        Limit the fills of resting orders to the volume of the trade or
+        candle that fills them. Default: False
+
+    record_interval : int
+        Milliseconds between the points of the equity curve. Default: 60000
+
+    Example
+    -------
+     ::
+
+        engine = BacktestEngine(
+            MyStrategy(),
+            [candle_events("BTCUSD", rest_client.candles("1m", "tBTCUSD", "hist", limit=5000), "1m")],
+            cash=10000
+        )
+        result = engine.run()
+        result.equity[-1]
+
+    """
+
+    def __init__(self, strategy, events, cash=0.0, maker_fee=0.001,
+                 taker_fee=0.002, latency=0, fill_on_touch=False,
+                 volume_limit=False, record_interval=60000):
+        self.strategy = strategy
+        self.events = events
+        self.maker_fee = maker_fee
+        self.taker_fee = taker_fee
+        self.latency = latency
+        self.fill_on_touch = fill_on_touch
+        self.volume_limit = volume_limit
+        self.record_interval = record_interval
+        self.portfolio = Portfolio(cash)
+        self.mts = 0
+        self.fills = []
+        self.orders = {}
+        self._by_cid = {}
+        self._resting = {}
+        self._last = {}
+        self._books = {}
+        self._delayed = deque()
+        self._order_id = 0
+        self._equity = []
+        strategy.engine = self
+
+    # Order interface, mirroring WssClient
+
+    def new_order(self, order_type, symbol, amount, price, price_trailing=None,
+                  price_aux_limit=None, price_oco_stop=None, hidden=0,
+                  flags=None, tif=None):
+        """Place an order, with the arguments of ``WssClient.new_order``.
+        The order types simulated are LIMIT, MARKET, STOP, IOC and FOK
+        (optionally prefixed with EXCHANGE); other arguments are accepted
+        and ignored.
+
+        Returns
+        -------
+        int
+            The cid of the order, based on the simulated time.
+        """
+        self._order_id += 1
+        cid = self.mts * 10000 + self._order_id % 10000
+        kind = order_type.replace("EXCHANGE ", "")
+        amount = float(amount)
+        order = orders.Order([
+            self._order_id, None, cid, order_symbol(symbol), self.mts, self.mts,
+            amount, amount, order_type, None, None, None, sum(flags or []),
+            orders.PENDING, None, None,
+            float(price) if price is not None else None, 0.0,
+        ], orders.PENDING)
+        self.orders[order.id] = order
+        self._by_cid[cid] = order
+        if kind not in ORDER_TYPES or not amount:
+            self._close(order, orders.REJECTED)
+        else:
+            self._later(self._place, order, kind)
+        return cid
+
+    def cancel_order(self, order_id):
+        """Cancel an order by id"""
+        self._later(self._cancel, self.orders.get(order_id))
+
+    def cancel_order_cid(self, order_cid, order_date):
+        """Cancel an order by cid (the date is ignored)"""
+        self._later(self._cancel, self._by_cid.get(order_cid))
+
+    def update_order(self, **order_settings):
+        """Update the ``price``, ``amount`` or ``delta`` of the order
+        ``id``, as ``WssClient.update_order``"""
+        self._later(self._update, self.orders.get(order_settings.get("id")), order_settings)
+
+    def open_orders(self, symbol=None):
+        """Resting orders, of a symbol or of all symbols"""
+        if symbol is not None:
+            return list(self._resting.get(order_symbol(symbol), ()))
+        return [order for resting in self._resting.values() for order in resting]
+
+    def last_price(self, symbol):
+        """Latest trade price or candle close of a symbol"""
+        return self._last.get(order_symbol(symbol))
+
+    def best_bid_ask(self, symbol):
+        """Best bid and ask of a symbol, from book events"""
+        book = self._books.get(order_symbol(symbol))
+        return (book.best_bid, book.best_ask) if book else (None, None)
+
+    # Replay
+
+    def run(self):
+        """Replay every event and return a ``BacktestResult``. The equity
+        curve is an array of ``(mts, equity)`` rows."""
+        strategy = self.strategy
+        on_candle = self._hook("on_candle")
+        on_trade = self._hook("on_trade")
+        on_book = self._hook("on_book")
+        resting = self._resting
+        last = self._last
+        books = self._books
+        delayed = self._delayed
+        next_record = None
+        count = 0
+        strategy.on_start()
+        for mts, kind, symbol, data in heapq.merge(*self.events, key=itemgetter(0)):
+            count += 1
+            self.mts = mts
+            while delayed and delayed[0][0] <= mts:
+                _, func, args = delayed.popleft()
+                func(*args)
+            if kind == TRADE:
+                last[symbol] = data[3]
+                if resting.get(symbol):
+                    self._match(symbol, data[3], data[3], data[3], abs(data[2]))
+                if on_trade is not None:
+                    on_trade(symbol, data)
+            elif kind == CANDLE:
+                last[symbol] = data[2]
+                if resting.get(symbol):
+                    self._match(symbol, data[1], data[4], data[3], data[5])
+                if on_candle is not None:
+                    on_candle(symbol, data)
+            else:
+                book = books.get(symbol)
+                if book is None:
+                    book = books[symbol] = OrderBook()
+                book.update(data)
+                if resting.get(symbol):
+                    bid, ask = book.best_bid, book.best_ask
+                    if bid is not None and ask is not None:
+                        self._match(symbol, None, ask, bid, None)
+                if on_book is not None:
+                    on_book(symbol, data)
+            if next_record is None or mts >= next_record:
+                self._equity.append((mts, self.portfolio.equity(last)))
+                next_record = mts - mts % self.record_interval + self.record_interval
+        while delayed:
+            _, func, args = delayed.popleft()
+            func(*args)
+        self._equity.append((self.mts, self.portfolio.equity(last)))
+        strategy.on_finish()
+        return BacktestResult(
+            np.array(self._equity, dtype=np.float64).reshape(-1, 2),
+            self.fills, self.orders, self.portfolio, count
+        )
+
+    def _hook(self, name):
+        # Only call the methods overridden by the strategy
+        method = getattr(self.strategy, name)
+        if getattr(type(self.strategy), name, None) is getattr(Strategy, name):
+            return None
+        return method
+
+    # Simulation
+
+    def _later(self, func, *args):
+        if self.latency:
+            self._delayed.append((self.mts + self.latency, func, args))
+        else:
+            func(*args)
+
+    def _reference(self, symbol, amount):
+        """Price a market order of ``amount`` would fill at"""
+        book = self._books.get(symbol)
+        if book is not None:
+            price = book.best_ask if amount > 0 else book.best_bid
+            if price is not None:
+                return price
+        return self._last.get(symbol)
+
+    def _place(self, order, kind):
+        price = self._reference(order.symbol, order.amount)
+        if price is None and kind != LIMIT:
+            self._close(order, orders.REJECTED)
+            return
+        buy = order.amount > 0
+        if kind == MARKET:
+            marketable = True
+        elif kind == STOP:
+            marketable = price >= order.price if buy else price <= order.price
+        else:
+            marketable = price is not None and (
+                price <= order.price if buy else price >= order.price)
+        if marketable:
+            self._fill(order, order.amount, price, False)
+            return
+        if kind in (MARKET, IOC, FOK):
+            self._close(order, orders.CANCELED)
+            return
+        order.state = order.status = orders.ACTIVE
+        self._resting.setdefault(order.symbol, []).append(order)
+        self._notify(order)
+
+    def _cancel(self, order):
+        if order is not None and order.is_open:
+            self._unrest(order)
+            self._close(order, orders.CANCELED)
+
+    def _update(self, order, settings):
+        if order is None or not order.is_open:
+            return
+        if settings.get("price") is not None:
+            order.price = float(settings["price"])
+        amount = order.amount
+        if settings.get("amount") is not None:
+            amount = float(settings["amount"])
+        if settings.get("delta") is not None:
+            amount += float(settings["delta"])
+        # The filled amount (amount_orig - amount) is kept
+        order.amount_orig += amount - order.amount
+        order.amount = amount
+        order.mts_update = self.mts
+        if not order.amount:
+            self._cancel(order)
+
+    def _match(self, symbol, open_, low, high, volume):
+        """Fill the resting orders of a symbol reached by a price range.
+        ``open_`` is None for book updates, where ``low`` is the best ask
+        and ``high`` the best bid."""
+        touch = self.fill_on_touch or open_ is None
+        for order in list(self._resting[symbol]):
+            price = order.price
+            if order.type.endswith(STOP):
+                if order.amount > 0 and high >= price:
+                    fill_price = price if open_ is None or open_ < price else open_
+                elif order.amount < 0 and low <= price:
+                    fill_price = price if open_ is None or open_ > price else open_
+                else:
+                    continue
+                maker = False
+            else:
+                if order.amount > 0:
+                    reached = low <= price if touch else low < price
+                else:
+                    reached = high >= price if touch else high > price
+                if not reached:
+                    continue
+                fill_price, maker = price, True
+            amount = order.amount
+            if self.volume_limit and volume is not None and volume < abs(amount):
+                amount = volume if amount > 0 else -volume
+                volume = 0.0
+            elif volume is not None:
+                volume -= abs(amount)
+            if amount:
+                self._fill(order, amount, fill_price, maker)
+
+    def _fill(self, order, amount, price, maker):
+        fee = abs(amount) * price * (self.maker_fee if maker else self.taker_fee)
+        fill = Fill(self.mts, order.id, order.cid, order.symbol, amount, price, fee, maker)
+        filled = order.amount_orig - order.amount
+        order.price_avg = (order.price_avg * filled + price * amount) / (filled + amount)
+        order.amount -= amount
+        order.mts_update = self.mts
+        self.fills.append(fill)
+        self.portfolio.apply(fill)
+        if abs(order.amount) < 1e-12:
+            order.amount = 0.0
+            self._unrest(order)
+            self._close(order, orders.EXECUTED)
+        else:
+            order.state = order.status = orders.PARTIALLY_FILLED
+        self.strategy.on_fill(fill)
+
+    def _unrest(self, order):
+        resting = self._resting.get(order.symbol)
+        if resting and order in resting:
+            resting.remove(order)
+
+    def _close(self, order, state):
+        order.state = order.status = state
+        order.mts_update = self.mts
+        self._notify(order)
+
+    def _notify(self, order):
+        self.strategy.on_order(order)
@@ -0,0 +1,134 @@
+"""Order book maintained from the updates of the book channel"""
+from bisect import bisect_left, insort
+
+
+class OrderBook:
+    """Price levels of a symbol maintained from the updates of the book
+    channel, aggregated (``[PRICE, COUNT, AMOUNT]``, precisions P0 to P4)
+    or raw (``[ORDER_ID, PRICE, AMOUNT]``, precision R0).
+
+    Levels are kept in dicts with sorted price lists, so updates and best
+    price lookups cost O(log n) at most.
+
+    Parameters
+    ----------
+    raw : bool
+        The updates are raw book (R0) updates. Default: False
+
+    Example
+    -------
+     ::
+
+        book = OrderBook()
+        my_client.subscribe_to_orderbook("BTCUSD", precision="P0", callback=book.on_message)
+
+        book.best_bid, book.best_ask, book.bids(5)
+
+    """
+
+    def __init__(self, raw=False):
+        self.raw = raw
+        self.clear()
+
+    def clear(self):
+        """Remove every level"""
+        # price -> [count, amount], amounts are positive on both sides
+        self._bids = {}
+        self._asks = {}
+        self._bid_prices = []
+        self._ask_prices = []
+        # Raw books: order id -> (price, amount)
+        self.orders = {}
+
+    def on_message(self, message):
+        """Book channel callback: a snapshot replaces the book, updates
+        are applied with ``update``."""
+        if not isinstance(message, list) or len(message) < 2:
+            return
+        levels = message[1]
+        if not isinstance(levels, list) or not levels:
+            return
+        if isinstance(levels[0], list):
+            self.snapshot(levels)
+        else:
+            self.update(levels)
+
+    def snapshot(self, levels):
+        """Replace the book with the levels (or orders) of a snapshot"""
+        self.clear()
+        for level in levels:
+            self.update(level)
+
+    def update(self, level):
+        """Apply a book update"""
+        if self.raw:
+            order_id, price, amount = level[:3]
+            previous = self.orders.pop(order_id, None)
+            if previous is not None:
+                self._change(previous[1] > 0, previous[0], -1, -abs(previous[1]))
+            if price:
+                self.orders[order_id] = (price, amount)
+                self._change(amount > 0, price, 1, abs(amount))
+            return
+        price, count, amount = level[:3]
+        bid = amount > 0
+        if count:
+            levels = self._bids if bid else self._asks
+            if price not in levels:
+                insort(self._bid_prices if bid else self._ask_prices, price)
+            levels[price] = [count, abs(amount)]
+        else:
+            self._remove(bid, price)
+
+    def _change(self, bid, price, count, amount):
+        levels = self._bids if bid else self._asks
+        level = levels.get(price)
+        if level is None:
+            insort(self._bid_prices if bid else self._ask_prices, price)
+            levels[price] = [count, amount]
+            return
+        level[0] += count
+        level[1] += amount
+        if level[0] <= 0:
+            self._remove(bid, price)
+
+    def _remove(self, bid, price):
+        levels = self._bids if bid else self._asks
+        if levels.pop(price, None) is not None:
+            prices = self._bid_prices if bid else self._ask_prices
+            del prices[bisect_left(prices, price)]
+
+    @property
+    def best_bid(self):
+        """Highest bid price, None without bids"""
+        return self._bid_prices[-1] if self._bid_prices else None
+
+    @property
+    def best_ask(self):
+        """Lowest ask price, None without asks"""
+        return self._ask_prices[0] if self._ask_prices else None
+
+    @property
+    def mid(self):
+        """Mid price, None unless both sides have levels"""
+        if not self._bid_prices or not self._ask_prices:
+            return None
+        return (self._bid_prices[-1] + self._ask_prices[0]) / 2.0
+
+    def amount(self, bid, price):
+        """Amount (positive) resting at a price on a side"""
+        level = (self._bids if bid else self._asks).get(price)
+        return level[1] if level is not None else 0.0
+
+    def bids(self, depth=None):
+        """Best bid levels as ``(price, count, amount)``, best first"""
+        prices = self._bid_prices[::-1] if depth is None else self._bid_prices[:-depth - 1:-1]
+        return [(price,) + tuple(self._bids[price]) for price in prices]
+
+    def asks(self, depth=None):
+        """Best ask levels as ``(price, count, amount)``, best first"""
+        prices = self._ask_prices if depth is None else self._ask_prices[:depth]
+        return [(price,) + tuple(self._asks[price]) for price in prices]
+
+    def __len__(self):
+        return len(self._bids) + len(self._asks)
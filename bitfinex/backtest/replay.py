@@ -0,0 +1,226 @@
+"""Replay of recorded book updates with queue position fill simulation"""
+import heapq
+from operator import itemgetter
+
+from .engine import BOOK, TRADE, Fill
+from .orderbook import OrderBook
+
+
+class QueuedOrder:
+    """A simulated resting limit order and the amount queued ahead of it"""
+
+    __slots__ = ("id", "bid", "price", "amount", "queue_ahead", "filled", "mts")
+
+    def __init__(self, order_id, bid, price, amount, queue_ahead, mts):
+        self.id = order_id
+        self.bid = bid
+        self.price = price
+        self.amount = amount
+        self.queue_ahead = queue_ahead
+        self.filled = 0.0
+        self.mts = mts
+
+    def __repr__(self):
+        return "QueuedOrder(id={}, price={}, amount={}, queue_ahead={})".format(
+            self.id, self.price, self.amount if self.bid else -self.amount,
+            self.queue_ahead)
+
+
+class QueueSimulator:
+    """Simulates the queue position and fills of resting limit orders
+    against recorded book updates and trade prints.
+
+    An order joins the back of its price level: the amount displayed at
+    the level when it is placed is queued ahead of it. Trades at the level
+    consume the queue ahead before filling the order, and a trade through
+    its price fills it entirely. Other decreases of the level are
+    cancellations, assumed spread evenly over the level, so they shorten
+    the queue ahead in proportion to its share of the level. Level
+    decreases already accounted for by trades are not counted twice.
+
+    Parameters
+    ----------
+    symbol : str
+        Symbol of the fills. Default: "tBTCUSD"
+
+    raw : bool
+        The book updates are raw book (R0) updates. Default: False
+
+    maker_fee : float
+        Fee rate of the fills. Default: 0.001
+
+    on_fill : Optional func
+        Called with each ``engine.Fill``.
+
+    Example
+    -------
+     ::
+
+        def quote(simulator, mts, kind, data):
+            if not simulator.orders and simulator.book.best_bid is not None:
+                simulator.new_order(0.01, simulator.book.best_bid)
+                simulator.new_order(-0.01, simulator.book.best_ask)
+
+        simulator = QueueSimulator()
+        fills = simulator.replay([
+            engine.book_events("BTCUSD", store.rows("BTCUSD", "book", start, end)),
+            engine.trade_events("BTCUSD", store.rows("BTCUSD", "trades", start, end)),
+        ], quote)
+
+    """
+
+    def __init__(self, symbol="tBTCUSD", raw=False, maker_fee=0.001, on_fill=None):
+        self.symbol = symbol
+        self.book = OrderBook(raw)
+        self.maker_fee = maker_fee
+        self.on_fill = on_fill
+        self.mts = 0
+        self.orders = {}
+        self.fills = []
+        self._queues = {}
+        self._traded = {}
+        self._order_id = 0
+
+    def new_order(self, amount, price):
+        """Place a post-only limit order (positive amount to buy).
+
+        Returns
+        -------
+        int
+            The id of the order, None if it would cross the book.
+        """
+        bid = amount > 0
+        best = self.book.best_ask if bid else self.book.best_bid
+        if best is not None and (price >= best if bid else price <= best):
+            return None
+        self._order_id += 1
+        order = QueuedOrder(self._order_id, bid, price, abs(amount),
+                            self.book.amount(bid, price), self.mts)
+        self.orders[order.id] = order
+        self._queues.setdefault((bid, price), []).append(order)
+        return order.id
+
+    def cancel_order(self, order_id):
+        """Cancel an order, returns False if it is no longer open"""
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            return False
+        self._dequeue(order)
+        return True
+
+    def on_book(self, update):
+        """Apply a book update and advance the queues of its level"""
+        book = self.book
+        if book.raw:
+            levels = []
+            previous = book.orders.get(update[0])
+            if previous is not None:
+                levels.append((previous[1] > 0, previous[0]))
+            if update[1] and (update[2] > 0, update[1]) not in levels:
+                # Not twice when the order changes amount in place
+                levels.append((update[2] > 0, update[1]))
+        else:
+            levels = [(update[2] > 0, update[0])]
+        levels = [level for level in levels if level in self._queues]
+        if not levels:
+            book.update(update)
+            return
+        before = [book.amount(*level) for level in levels]
+        book.update(update)
+        for level, amount in zip(levels, before):
+            self._decrease(level, amount, book.amount(*level))
+
+    def _decrease(self, level, before, after):
+        decrease = before - after
+        if decrease <= 0:
+            return
+        traded = self._traded.get(level, 0.0)
+        if traded:
+            accounted = min(traded, decrease)
+            self._traded[level] = traded - accounted
+            decrease -= accounted
+        if decrease <= 0:
+            return
+        for order in self._queues[level]:
+            if after <= 0:
+                order.queue_ahead = 0.0
+            else:
+                order.queue_ahead = max(
+                    0.0, order.queue_ahead - decrease * order.queue_ahead / before)
+
+    def on_trade(self, trade):
+        """Fill the orders reached by a trade ``[ID, MTS, AMOUNT, PRICE]``"""
+        _, mts, amount, price = trade[:4]
+        self.mts = mts
+        # A taker sell (negative amount) trades against the bids
+        bid = amount < 0
+        volume = abs(amount)
+        if not self._queues:
+            return
+        for (order_bid, order_price), queue in list(self._queues.items()):
+            if order_bid != bid:
+                continue
+            if order_price == price:
+                our_fills = 0.0
+                for order in list(queue):
+                    ahead = order.queue_ahead
+                    order.queue_ahead = max(0.0, ahead - volume)
+                    available = volume - ahead - our_fills
+                    if available > 0:
+                        filled = min(order.amount, available)
+                        our_fills += filled
+                        self._fill(order, filled)
+                self._traded[(bid, price)] = self._traded.get((bid, price), 0.0) + volume
+            elif (order_price > price) if bid else (order_price < price):
+                for order in list(queue):
+                    self._fill(order, order.amount)
+
+    def _fill(self, order, amount):
+        order.amount -= amount
+        order.filled += amount
+        fill = Fill(self.mts, order.id, None, self.symbol,
+                    amount if order.bid else -amount, order.price,
+                    amount * order.price * self.maker_fee, True)
+        self.fills.append(fill)
+        if order.amount <= 1e-12:
+            self.orders.pop(order.id, None)
+            self._dequeue(order)
+        if self.on_fill is not None:
+            self.on_fill(fill)
+
+    def _dequeue(self, order):
+        level = (order.bid, order.price)
+        queue = self._queues.get(level)
+        if queue is not None and order in queue:
+            queue.remove(order)
+            if not queue:
+                del self._queues[level]
+                self._traded.pop(level, None)
+
+    def replay(self, events, on_event=None):
+        """Replay book and trade events (see ``engine.book_events`` and
+        ``engine.trade_events``) in timestamp order.
+
+        Parameters
+        ----------
+        events : list
+            Event iterables, each in timestamp order.
+
+        on_event : Optional func
+            Called as ``on_event(simulator, mts, kind, data)`` after each
+            event, to place and cancel orders.
+
+        Returns
+        -------
+        list
+            The fills of the replay.
+        """
+        for mts, kind, _, data in heapq.merge(*events, key=itemgetter(0)):
+            self.mts = mts
+            if kind == BOOK:
+                self.on_book(data)
+            elif kind == TRADE:
+                self.on_trade(data)
+            if on_event is not None:
+                on_event(self, mts, kind, data)
+        return self.fills
@@ -0,0 +1,367 @@
+"""Memory mapped columnar store of market data"""
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+DAY = 24 * 60 * 60 * 1000
+
+# Columns of the datasets, in the order of the Bitfinex arrays, and the
+# column identifying a row (later rows with the same key replace earlier
+# ones). Candle datasets are named after their timeframe, e.g. "candles_1m",
+# and "rawbook" holds the updates of raw (R0) book subscriptions.
+SCHEMAS = {
+    "trades": ([("id", "<i8"), ("mts", "<i8"), ("amount", "<f8"), ("price", "<f8")], "id"),
+    "candles": ([("mts", "<i8"), ("open", "<f8"), ("close", "<f8"), ("high", "<f8"),
+                 ("low", "<f8"), ("volume", "<f8")], "mts"),
+    "book": ([("mts", "<i8"), ("price", "<f8"), ("count", "<i8"), ("amount", "<f8")], None),
+    "rawbook": ([("mts", "<i8"), ("id", "<i8"), ("price", "<f8"), ("amount", "<f8")], None),
+}
+
+
+def schema(dataset):
+    """Columns (name, dtype) and key column of a dataset"""
+    try:
+        return SCHEMAS[dataset.split("_")[0]]
+    except KeyError:
+        raise ValueError("Unknown dataset %r" % dataset)
+
+
+def _day(mts):
+    return datetime.fromtimestamp(mts // 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+class ColumnStore:
+    """Market data stored as one binary file per column per symbol and
+    day (``root/SYMBOL/DATASET/YYYY-MM-DD/COLUMN.bin``), sorted by
+    timestamp and read through ``np.memmap``.
+
+    Reading maps the files without parsing anything, and time ranges are
+    located by binary search of the timestamp column. The ``meta.json``
+    file of a day records its columns and number of rows, it is checked
+    against the schema of the dataset when the day is read.
+
+    Newer rows are appended to the column files and published by
+    rewriting ``meta.json`` last, readers never map rows that were not
+    published. Older rows, or rows with a key already stored, make the
+    column files of the day be replaced (written to a temporary file, then
+    ``os.replace``), so arrays that were read keep their data.
+
+    Parameters
+    ----------
+    root : str
+        Directory of the store, created if needed.
+
+    Example
+    -------
+     ::
+
+        store = ColumnStore("/data/bitfinex")
+        store.append("BTCUSD", "candles_1m", rest_client.candles("1m", "tBTCUSD", "hist", limit=5000))
+        my_client.subscribe_to_trades("BTCUSD", callback=store.recorder("BTCUSD", "trades"))
+
+        trades = store.read("BTCUSD", "trades", start=1546300800000, end=1546387200000)
+        trades["price"].mean()
+
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    # Writing
+
+    def append(self, symbol, dataset, rows):
+        """Add rows in the Bitfinex array format of the dataset (in any
+        order), e.g. trades ``[ID, MTS, AMOUNT, PRICE]``, candles ``[MTS,
+        OPEN, CLOSE, HIGH, LOW, VOLUME]``, recorded book updates ``[MTS,
+        PRICE, COUNT, AMOUNT]`` or recorded raw book updates ``[MTS,
+        ORDER_ID, PRICE, AMOUNT]``.
+
+        Rows newer than those of their day are appended to the column
+        files; older rows (or rows with a key already stored) make the day
+        be rewritten.
+        """
+        columns, key = schema(dataset)
+        rows = np.asarray(rows, dtype=np.float64)
+        if not rows.size:
+            return
+        rows = rows.reshape(len(rows), -1)[:, :len(columns)]
+        names = [name for name, _ in columns]
+        mts = rows[:, names.index("mts")].astype(np.int64)
+        days = mts // DAY
+        for day in np.unique(days):
+            selected = rows[days == day]
+            data = {
+                name: selected[:, index].astype(dtype)
+                for index, (name, dtype) in enumerate(columns)
+            }
+            self._append_day(symbol, dataset, _day(int(day) * DAY), data, key)
+
+    def _append_day(self, symbol, dataset, day, data, key):
+        columns, _ = schema(dataset)
+        data = _sort(data, key)
+        path = self._path(symbol, dataset, day)
+        existing = self._read_day(symbol, dataset, day)
+        if existing is None:
+            os.makedirs(path, exist_ok=True)
+        elif len(existing["mts"]) and not self._follows(existing, data, key):
+            merged = {
+                name: np.concatenate([existing[name], data[name]])
+                for name, _ in columns
+            }
+            del existing
+            self._rewrite_day(path, dataset, _sort(merged, key))
+            return
+        rows = 0 if existing is None else len(existing["mts"])
+        del existing
+        self._append_rows(path, dataset, data, rows)
+
+    @staticmethod
+    def _follows(existing, data, key):
+        last, first = existing["mts"][-1], data["mts"][0]
+        if first != last:
+            return first > last
+        if key is None:
+            return True
+        return key != "mts" and data[key][0] > existing[key][-1]
+
+    @staticmethod
+    def _append_rows(path, dataset, data, rows):
+        """Append rows after the ``rows`` published ones, then publish them"""
+        columns, _ = schema(dataset)
+        for name, dtype in columns:
+            with open(os.path.join(path, name + ".bin"), "ab") as column_file:
+                # Drop what an interrupted write left after the published rows
+                column_file.truncate(rows * np.dtype(dtype).itemsize)
+                data[name].tofile(column_file)
+        _write_meta(path, dataset, rows + len(data["mts"]))
+
+    @staticmethod
+    def _rewrite_day(path, dataset, data):
+        """Replace the column files of a day"""
+        columns, _ = schema(dataset)
+        rows = len(data["mts"])
+        published = _read_meta(os.path.join(path, "meta.json"))
+        # Readers map the number of rows of meta.json: publish it last when
+        # the day grows, and first when it shrinks (rows with the same key
+        # replaced), so that no column is ever shorter than that number.
+        if published is not None and rows < published["rows"]:
+            _write_meta(path, dataset, rows)
+        for name, _ in columns:
+            _replace(os.path.join(path, name + ".bin"), data[name].tobytes())
+        if published is None or rows >= published["rows"]:
+            _write_meta(path, dataset, rows)
+
+    def recorder(self, symbol, dataset, flush_size=10000, clock=time.time):
+        """Returns a ``Recorder`` writing the messages of a websocket
+        channel to the store"""
+        return Recorder(self, symbol, dataset, flush_size, clock)
+
+    # Reading
+
+    def symbols(self):
+        """Symbols of the store"""
+        return sorted(os.listdir(self.root))
+
+    def days(self, symbol, dataset):
+        """Days (YYYY-MM-DD) stored for a symbol and dataset"""
+        path = os.path.join(self.root, symbol, dataset)
+        if not os.path.isdir(path):
+            return []
+        return sorted(name for name in os.listdir(path) if name[:1].isdigit())
+
+    def iter_days(self, symbol, dataset, start=None, end=None):
+        """Yields the columns of each day of a time range, as dicts of
+        read-only memory mapped arrays (no data is copied).
+
+        Parameters
+        ----------
+        start : Optional int
+            First millisecond timestamp included.
+
+        end : Optional int
+            First millisecond timestamp excluded.
+        """
+        first = _day(start) if start is not None else None
+        last = _day(end - 1) if end is not None else None
+        for day in self.days(symbol, dataset):
+            if (first is not None and day < first) or (last is not None and day > last):
+                continue
+            data = self._read_day(symbol, dataset, day)
+            mts = data["mts"]
+            low = 0 if start is None else int(np.searchsorted(mts, start, "left"))
+            high = len(mts) if end is None else int(np.searchsorted(mts, end, "left"))
+            if high > low:
+                yield {name: column[low:high] for name, column in data.items()}
+
+    def read(self, symbol, dataset, start=None, end=None):
+        """Columns of a time range as a dict of arrays, memory mapped when
+        the range is within a day and concatenated otherwise."""
+        columns, _ = schema(dataset)
+        days = list(self.iter_days(symbol, dataset, start, end))
+        if len(days) == 1:
+            return days[0]
+        return {
+            name: np.concatenate([day[name] for day in days]) if days
+            else np.empty(0, dtype=dtype)
+            for name, dtype in columns
+        }
+
+    def rows(self, symbol, dataset, start=None, end=None):
+        """A time range as a 2-D array of rows in the Bitfinex array
+        format, e.g. for ``engine.trade_events``"""
+        columns, _ = schema(dataset)
+        data = self.read(symbol, dataset, start, end)
+        return np.column_stack([data[name] for name, _ in columns]).astype(np.float64)
+
+    def _path(self, symbol, dataset, day):
+        return os.path.join(self.root, symbol, dataset, day)
+
+    def _read_day(self, symbol, dataset, day):
+        path = self._path(symbol, dataset, day)
+        if not os.path.isdir(path):
+            return None
+        columns, key = schema(dataset)
+        meta = _read_meta(os.path.join(path, "meta.json"))
+        rows = 0
+        if meta is not None:
+            if [tuple(column) for column in meta["columns"]] != columns or meta["key"] != key:
+                raise ValueError("%s does not hold %s data, its columns are %r" % (
+                    path, dataset, meta["columns"]
+                ))
+            rows = meta["rows"]
+        data = {}
+        for name, dtype in columns:
+            column_path = os.path.join(path, name + ".bin")
+            if not rows:
+                data[name] = np.empty(0, dtype=dtype)
+                continue
+            if os.path.getsize(column_path) < rows * np.dtype(dtype).itemsize:
+                raise ValueError("%s holds less than %s rows" % (column_path, rows))
+            data[name] = np.memmap(column_path, dtype=dtype, mode="r", shape=(rows,))
+        return data
+
+
+def _read_meta(path):
+    """Contents of the meta.json file of a day, None if it was not written"""
+    try:
+        with open(path) as meta_file:
+            return json.load(meta_file)
+    except FileNotFoundError:
+        return None
+
+
+def _write_meta(path, dataset, rows):
+    """Publish the number of rows of a day"""
+    columns, key = schema(dataset)
+    meta = {"columns": columns, "key": key, "rows": rows}
+    _replace(os.path.join(path, "meta.json"), json.dumps(meta).encode("utf8"))
+
+
+def _replace(path, content):
+    """Write a file through a temporary file, so that it is replaced at once"""
+    descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as temp_file:
+            temp_file.write(content)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _sort(data, key):
+    """Sort columns by timestamp (and key), keeping the last of the rows
+    with the same key"""
+    mts = data["mts"]
+    if key is None or key == "mts":
+        order = np.argsort(mts, kind="stable")
+    else:
+        order = np.lexsort((data[key], mts))
+    data = {name: column[order] for name, column in data.items()}
+    if key is not None and len(order) > 1:
+        keys, mts = data[key], data["mts"]
+        keep = keys[1:] != keys[:-1]
+        if key != "mts":
+            keep |= mts[1:] != mts[:-1]
+        keep = np.append(keep, True)
+        if not keep.all():
+            data = {name: column[keep] for name, column in data.items()}
+    return data
+
+
+class Recorder:
+    """Websocket channel callback writing the trades, candles or book
+    updates of a subscription to a ``ColumnStore``.
+
+    Rows are buffered and written every ``flush_size`` rows (and by
+    ``flush``). Candles are written once closed, when a newer candle is
+    received. Book updates are stamped with the time they are received.
+
+    Parameters
+    ----------
+    store : ColumnStore
+        The store written to.
+
+    symbol : str
+        Symbol of the subscription.
+
+    dataset : str
+        "trades", "book", "rawbook" (raw book subscriptions) or a candles
+        dataset like "candles_1m".
+
+    flush_size : int
+        Number of rows buffered before writing. Default: 10000
+
+    clock : func
+        Clock returning seconds, used to stamp book updates.
+    """
+
+    def __init__(self, store, symbol, dataset, flush_size=10000, clock=time.time):
+        schema(dataset)
+        self.store = store
+        self.symbol = symbol
+        self.dataset = dataset
+        self.flush_size = flush_size
+        self.clock = clock
+        self._kind = dataset.split("_")[0]
+        self._rows = []
+        self._candle = None
+
+    def __call__(self, message):
+        if not isinstance(message, list) or len(message) < 2:
+            return
+        if self._kind == "trades":
+            if message[1] == "te":
+                self._rows.append(message[2][:4])
+            elif isinstance(message[1], list):
+                self._rows.extend(trade[:4] for trade in message[1])
+        elif isinstance(message[1], list) and message[1]:
+            if self._kind in ("book", "rawbook"):
+                mts = int(self.clock() * 1000)
+                levels = message[1] if isinstance(message[1][0], list) else [message[1]]
+                self._rows.extend([mts] + level[:3] for level in levels)
+            else:
+                candles = message[1] if isinstance(message[1][0], list) else [message[1]]
+                for candle in sorted(candles, key=lambda candle: candle[0]):
+                    self._add_candle(candle)
+        if len(self._rows) >= self.flush_size:
+            self.flush()
+
+    def _add_candle(self, candle):
+        if self._candle is not None and candle[0] > self._candle[0]:
+            self._rows.append(self._candle)
+        if self._candle is None or candle[0] >= self._candle[0]:
+            self._candle = candle
+        else:
+            self._rows.append(candle)
+
+    def flush(self):
+        """Write the buffered rows"""
+        rows, self._rows = self._rows, []
+        if rows:
+            self.store.append(self.symbol, self.dataset, rows)
@@ -0,0 +1,199 @@
+"""Parameter sweeps of backtests over a process pool"""
+import itertools
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Arrays shared with the worker processes, set by ``_attach``
+_DATA = None
+_SEGMENTS = []
+
+
+def parameter_grid(**parameters):
+    """Every combination of parameter values.
+
+    Example
+    -------
+     ::
+
+        parameter_grid(fast=[5, 10], slow=[50, 100])
+        # [{'fast': 5, 'slow': 50}, {'fast': 5, 'slow': 100},
+        #  {'fast': 10, 'slow': 50}, {'fast': 10, 'slow': 100}]
+
+    """
+    names = list(parameters)
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*(parameters[name] for name in names))
+    ]
+
+
+class SharedArrays:
+    """Numpy arrays shared read-only with worker processes without
+    pickling them.
+
+    Arrays are copied once into shared memory blocks, except memory mapped
+    arrays (``np.memmap`` of a whole file, as those of ``ColumnStore``),
+    which workers map from their file. ``spec`` describes the arrays in a
+    few bytes and ``attach`` rebuilds them from it in any process.
+
+    Parameters
+    ----------
+    arrays : dict
+        Arrays by name.
+
+    Example
+    -------
+     ::
+
+        with SharedArrays({"close": close}) as shared:
+            arrays = SharedArrays.attach(shared.spec)
+
+    """
+
+    def __init__(self, arrays):
+        self.spec = {}
+        self._segments = []
+        try:
+            for name, array in arrays.items():
+                self.spec[name] = self._share(array)
+        except Exception:
+            self.close()
+            raise
+
+    def _share(self, array):
+        if isinstance(array, np.memmap) and isinstance(array.base, mmap.mmap) \
+                and array.filename:
+            return ("file", array.filename, array.dtype.str, array.shape,
+                    array.offset)
+        array = np.ascontiguousarray(array)
+        segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        self._segments.append(segment)
+        np.ndarray(array.shape, array.dtype, buffer=segment.buf)[...] = array
+        return ("shm", segment.name, array.dtype.str, array.shape, 0)
+
+    @staticmethod
+    def attach(spec):
+        """Read-only arrays by name from a ``spec``. Shared memory segments
+        opened are kept open for the life of the process."""
+        arrays = {}
+        for name, (kind, location, dtype, shape, offset) in spec.items():
+            if kind == "file":
+                array = np.memmap(location, dtype=dtype, mode="r", shape=shape,
+                                  offset=offset)
+            else:
+                segment = _open_segment(location)
+                _SEGMENTS.append(segment)
+                array = np.ndarray(shape, dtype, buffer=segment.buf)
+                array.flags.writeable = False
+            arrays[name] = array
+        return arrays
+
+    def close(self):
+        """Release the shared memory segments"""
+        while self._segments:
+            segment = self._segments.pop()
+            segment.close()
+            segment.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _open_segment(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13, attaching registers the segment again with
+        # the resource tracker the workers share with their parent, which
+        # is harmless as the parent unlinks it.
+        return shared_memory.SharedMemory(name=name)
+
+
+def _attach(spec):
+    global _DATA  # pylint: disable=W0603
+    _DATA = SharedArrays.attach(spec)
+
+
+def _run_chunk(func, chunk):
+    return [_metrics(func(_DATA, **parameters)) for parameters in chunk]
+
+
+def _metrics(result):
+    if hasattr(result, "_asdict"):
+        result = result._asdict()
+    return {
+        key: value.item() if isinstance(value, np.generic)
+        or (isinstance(value, np.ndarray) and value.ndim == 0) else value
+        for key, value in dict(result).items()
+    }
+
+
+def run_sweep(func, data, grid, processes=None, chunksize=None):
+    """Run a backtest for each parameter combination of a grid over a
+    process pool and collect their metrics.
+
+    The market data is shared with the workers through ``SharedArrays``
+    once, instead of being pickled with every task.
+
+    Parameters
+    ----------
+    func : func
+        Module level function called as ``func(data, **parameters)``,
+        ``data`` being the dict of read-only arrays, returning a dict or a
+        namedtuple of metrics (e.g. ``vectorized.Metrics``).
+
+    data : dict
+        Arrays by name (e.g. columns of candles).
+
+    grid : list
+        Parameter dicts, see ``parameter_grid``.
+
+    processes : Optional int
+        Number of worker processes. Default: the number of CPUs.
+
+    chunksize : Optional int
+        Parameter combinations per task. Default: a quarter of an even
+        split of the grid between the workers.
+
+    Returns
+    -------
+    list
+        A dict per combination of the grid, in the order of the grid,
+        with its parameters and metrics (e.g. for ``pandas.DataFrame``).
+
+    Example
+    -------
+     ::
+
+        def crossover(data, fast, slow):
+            close = data["close"]
+            signals = np.where(ema(close, 2. / (fast + 1)) > ema(close, 2. / (slow + 1)), 1., -1.)
+            return vectorized.metrics(vectorized.backtest(close, signals))
+
+        results = run_sweep(crossover, {"close": close},
+                            parameter_grid(fast=range(5, 50), slow=range(50, 200, 10)))
+
+    """
+    processes = processes or os.cpu_count() or 1
+    grid = list(grid)
+    if chunksize is None:
+        chunksize = max(1, len(grid) // (processes * 4))
+    chunks = [grid[start:start + chunksize] for start in range(0, len(grid), chunksize)]
+    results = []
+    with SharedArrays(data) as shared:
+        with ProcessPoolExecutor(processes, initializer=_attach,
+                                 initargs=(shared.spec,)) as executor:
+            futures = [executor.submit(_run_chunk, func, chunk) for chunk in chunks]
+            for chunk, future in zip(chunks, futures):
+                for parameters, metrics in zip(chunk, future.result()):
+                    row = dict(parameters)
+                    row.update(metrics)
+                    results.append(row)
+    return results
@@ -0,0 +1,145 @@
+"""Vectorized backtests of bar based strategies"""
+from collections import namedtuple
+
+import numpy as np
+
+VectorResult = namedtuple("VectorResult", [
+    "positions", "returns", "equity", "drawdown", "fees",
+])
+
+Metrics = namedtuple("Metrics", [
+    "total_return", "max_drawdown", "sharpe", "trades", "turnover", "fees",
+])
+
+
+def closes(candles):
+    """Close prices of candles given as rows ``[MTS, OPEN, CLOSE, HIGH,
+    LOW, VOLUME]`` (e.g. the result of ``restv2.Client.candles``, oldest or
+    newest first), ``Candles`` columns, a pandas object with a ``close``
+    column or an array of prices.
+
+    Returns
+    -------
+    ndarray
+        Close prices, oldest first.
+    """
+    if hasattr(candles, "close"):
+        return np.asarray(candles.close, dtype=np.float64)
+    if hasattr(candles, "to_numpy"):
+        return candles.to_numpy(dtype=np.float64)
+    array = np.asarray(candles, dtype=np.float64)
+    if array.ndim == 1:
+        return array
+    return array[np.argsort(array[:, 0], kind="stable"), 2]
+
+
+def backtest(prices, signals, fee=0.002, cash=1.0, delay=1):
+    """Backtest target positions over close prices at once.
+
+    Positions are fractions of the equity (1 is fully long, -1 fully
+    short) rebalanced at the close. The signal of a bar is acted on
+    ``delay`` bars later, so a signal computed from a close can not trade
+    at that same close.
+
+    Parameters
+    ----------
+    prices : array_like
+        Close prices, see ``closes``.
+
+    signals : array_like
+        Target positions, of shape (n,) for a single run or (n, k) for k
+        runs at once (e.g. the parameter combinations of a sweep).
+
+    fee : float
+        Fee rate on the traded notional. Default: 0.002
+
+    cash : float
+        Initial equity. Default: 1
+
+    delay : int
+        Bars between a signal and the trade. Default: 1
+
+    Returns
+    -------
+    VectorResult
+        ``positions`` held over each bar, strategy ``returns`` of each bar
+        net of fees, ``equity`` and ``drawdown`` (from the running
+        maximum) at each close and ``fees`` paid at each close, with the
+        shape of ``signals``.
+
+    Example
+    -------
+     ::
+
+        from bitfinex.analytics.indicators import ema
+
+        prices = closes(rest_client.candles("1h", "tBTCUSD", "hist", limit=5000))
+        fast, slow = ema(prices, 2 / 11.), ema(prices, 2 / 51.)
+        result = backtest(prices, np.where(fast > slow, 1.0, -1.0))
+        metrics(result, periods_per_year=24 * 365).sharpe
+
+    """
+    prices = closes(prices)
+    signals = np.asarray(signals, dtype=np.float64)
+    if signals.shape[0] != len(prices):
+        raise ValueError("signals must have one row per price")
+    column = prices.reshape((-1,) + (1,) * (signals.ndim - 1))
+    changes = np.zeros_like(column)
+    changes[1:] = column[1:] / column[:-1] - 1.0
+
+    positions = np.zeros_like(signals)
+    if delay < len(signals):
+        positions[delay:] = signals[:len(signals) - delay]
+    positions = np.nan_to_num(positions)
+    # The position held over bar t is set at the close of bar t - 1
+    held = np.zeros_like(positions)
+    held[1:] = positions[:-1]
+    turnover = np.abs(np.diff(positions, axis=0, prepend=0.0))
+
+    # Fees are paid at the close, on the equity before the rebalance
+    gross = 1.0 + held * changes
+    returns = gross * (1.0 - fee * turnover) - 1.0
+    equity = cash * np.cumprod(1.0 + returns, axis=0)
+    previous = np.empty_like(equity)
+    previous[0] = cash
+    previous[1:] = equity[:-1]
+    fees = fee * turnover * previous * gross
+    drawdown = equity / np.maximum.accumulate(equity, axis=0) - 1.0
+    return VectorResult(positions, returns, equity, drawdown, fees)
+
+
+def metrics(result, periods_per_year=None):
+    """Summary of a ``VectorResult``, with a value per run.
+
+    Parameters
+    ----------
+    result : VectorResult
+        Result of ``backtest``.
+
+    periods_per_year : Optional float
+        Bars per year, to annualize the Sharpe ratio (e.g. 365 * 24 for
+        hourly candles). Not annualized by default.
+
+    Returns
+    -------
+    Metrics
+        ``total_return``, ``max_drawdown`` (negative), ``sharpe`` ratio of
+        the bar returns, number of ``trades`` (position changes),
+        ``turnover`` and ``fees``, each a float or an array of shape (k,).
+    """
+    returns = result.returns
+    initial = result.equity[0] / (1.0 + returns[0])
+    deviation = returns.std(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(deviation > 0, returns.mean(axis=0) / deviation, 0.0)
+    if periods_per_year:
+        sharpe = sharpe * np.sqrt(periods_per_year)
+    changes = np.diff(result.positions, axis=0, prepend=0.0)
+    return Metrics(
+        result.equity[-1] / initial - 1.0,
+        result.drawdown.min(axis=0),
+        sharpe,
+        np.count_nonzero(changes, axis=0),
+        np.abs(changes).sum(axis=0),
+        result.fees.sum(axis=0),
+    )
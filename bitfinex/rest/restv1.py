@@ -5,8 +5,6 @@ from __future__ import absolute_import
 import json
 from json.decoder import JSONDecodeError
 import base64
-import hmac
-import hashlib
 import requests
 from bitfinex import utils
 
@@ -48,7 +46,13 @@ class Client:
         Bitfinex api secret
 
     nonce_multiplier : Optional float
-        Multiply nonce by this number
+        Multiply nonce by this number. Nonces are in microseconds, values
+        above about 5 are rejected, see ``utils.NonceProvider``.
+
+    nonce_provider : Optional callable
+        Callable returning the next nonce, e.g. a ``utils.NonceProvider`` or
+        ``utils.FileNonceProvider`` shared by all clients (and processes)
+        using the same key. Defaults to a provider shared within the process.
 
     Examples
     --------
@@ -59,13 +63,18 @@ class Client:
         bfx_client = Client(key,secret,2.0)
     """
 
-    def __init__(self, key=None, secret=None, nonce_multiplier=1.0):
+    def __init__(self, key=None, secret=None, nonce_multiplier=1.0,
+                 nonce_provider=None):
         assert isinstance(nonce_multiplier, float), "nonce_multiplier must be decimal"
         self.url = "%s://%s/%s" % (PROTOCOL, HOST, VERSION)
         self.base_url = "%s://%s/" % (PROTOCOL, HOST)
         self.key = key
         self.secret = secret
+        self._signer = utils.HmacSigner(secret) if secret else None
         self.nonce_multiplier = nonce_multiplier
+        self.nonce_provider = (
+            nonce_provider or utils.default_nonce_provider(nonce_multiplier)
+        )
 
     def server(self):
         return u"{0:s}://{1:s}/{2:s}".format(PROTOCOL, HOST, VERSION)
@@ -92,14 +101,13 @@ class Client:
         Nonce must be an increasing number, if the API key has been used
         earlier or other frameworks that have used higher numbers you might
         need to increase the nonce_multiplier."""
-        return str(utils.get_nonce(self.nonce_multiplier))
+        return self.nonce_provider()
 
     def _sign_payload(self, payload):
         j = json.dumps(payload)
         data = base64.standard_b64encode(j.encode('utf8'))
 
-        hmc = hmac.new(self.secret.encode('utf8'), data, hashlib.sha384)
-        signature = hmc.hexdigest()
+        signature = self._signer.sign(data)
         return {
             "X-BFX-APIKEY": self.key,
             "X-BFX-SIGNATURE": signature,
@@ -5,8 +5,6 @@
 from __future__ import absolute_import
 import json
 from json.decoder import JSONDecodeError
-import hmac
-import hashlib
 import requests
 from bitfinex import utils
 
@@ -43,7 +41,13 @@ class Client:
         Bitfinex api secret
 
     nonce_multiplier : Optional float
-        Multiply nonce by this number
+        Multiply nonce by this number. Nonces are in microseconds, values
+        above about 5 are rejected, see ``utils.NonceProvider``.
+
+    nonce_provider : Optional callable
+        Callable returning the next nonce, e.g. a ``utils.NonceProvider`` or
+        ``utils.FileNonceProvider`` shared by all clients (and processes)
+        using the same key. Defaults to a provider shared within the process.
 
     Examples
     --------
@@ -54,7 +58,8 @@ class Client:
         bfx_client = Client(key,secret,2.0)
     """
 
-    def __init__(self, key=None, secret=None, nonce_multiplier=1.0):
+    def __init__(self, key=None, secret=None, nonce_multiplier=1.0,
+                 nonce_provider=None):
         """
         Object initialisation takes 2 mandatory arguments key and secret and a optional one
         nonce_multiplier
@@ -64,22 +69,24 @@ class Client:
         self.base_url = "%s://%s/" % (PROTOCOL, HOST)
         self.key = key
         self.secret = secret
+        self._signer = utils.HmacSigner(secret) if secret else None
         self.nonce_multiplier = nonce_multiplier
+        self.nonce_provider = (
+            nonce_provider or utils.default_nonce_provider(nonce_multiplier)
+        )
 
     def _nonce(self):
         """Returns a nonce used in authentication.
         Nonce must be an increasing number, if the API key has been used
         earlier or other frameworks that have used higher numbers you might
         need to increase the nonce_multiplier."""
-        return str(utils.get_nonce(self.nonce_multiplier))
+        return self.nonce_provider()
 
     def _headers(self, path, nonce, body):
         """
         create signed headers
         """
-        signature = "/api/{}{}{}".format(path, nonce, body)
-        hmc = hmac.new(self.secret.encode('utf8'), signature.encode('utf8'), hashlib.sha384)
-        signature = hmc.hexdigest()
+        signature = self._signer.sign("/api/{}{}{}".format(path, nonce, body))
 
         return {
             "bfx-nonce": nonce,
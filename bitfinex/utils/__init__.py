@@ -1,19 +1,150 @@
 """Module for rest and websocket utilities"""
+import logging
+import os
 import re
+import tempfile
+import threading
 import time
 from datetime import datetime
+from .nonce import NonceProvider, FileNonceProvider
+from .signing import HmacSigner
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on windows
+    fcntl = None
+
+LOGGER = logging.getLogger(__name__)
+
+class CidGenerator:
+    """Thread safe generator of unique and strictly increasing client order
+    ids.
+
+    The ids have the same format as the ones historically returned by
+    ``create_cid``, the current utc timestamp in units of 100 nanoseconds,
+    so they can still be decoded with ``cid_to_date``. The last digits of the
+    id are reserved for a worker slot, which keeps ids generated by
+    different processes apart. When more ids are requested than the clock
+    can provide, the generator runs ahead of the clock instead of returning
+    duplicates.
+
+    Without a ``worker_id``, the generator claims a free slot on first use
+    by locking one of the files ``cid-slot-N.lock`` of ``slot_dir``, held
+    until the process exits (forked children claim their own). This keeps
+    the processes of one user on one host apart. When no slot can be
+    claimed (every slot is held, or ``fcntl`` is not available) the slot
+    falls back to the process id modulo ``workers``, which may collide
+    with another process; a warning is logged. Processes on different
+    hosts sharing an API key must be given distinct ``worker_id`` values
+    explicitly.
+
+    Parameters
+    ----------
+    worker_id : Optional int
+        Slot used by this generator, in ``[0, workers)``. Default: a free
+        slot claimed on first use.
+
+    workers : int
+        Number of worker slots. Default: 16
+
+    slot_dir : Optional str
+        Directory of the slot lock files. Default:
+        ``bitfinex-cid-slots-UID`` in the temporary directory.
+
+    Example
+    -------
+     ::
+
+        cid_generator = CidGenerator(worker_id=3)
+        cid = cid_generator()
+    """
+
+    def __init__(self, worker_id=None, workers=16, slot_dir=None):
+        if worker_id is not None and not 0 <= worker_id < workers:
+            raise ValueError("worker_id must be in the range [0, %s)" % workers)
+        self.workers = workers
+        self.slot_dir = slot_dir or os.path.join(
+            tempfile.gettempdir(),
+            "bitfinex-cid-slots-%s" % (os.getuid() if hasattr(os, "getuid") else "")
+        )
+        self._fixed_worker_id = worker_id is not None
+        self.worker_id = worker_id
+        self._slot_fd = None
+        self._pid = os.getpid()
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def _claim_slot(self):
+        """Lock the file of the first free slot and keep it open. Falls
+        back to the process id when no slot can be locked."""
+        if fcntl is not None:
+            try:
+                os.makedirs(self.slot_dir, exist_ok=True)
+            except OSError:
+                pass
+            for slot in range(self.workers):
+                path = os.path.join(self.slot_dir, "cid-slot-%d.lock" % slot)
+                try:
+                    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+                except OSError:
+                    # e.g. created by another user
+                    continue
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    os.close(fd)
+                    continue
+                self._slot_fd = fd
+                return slot
+        slot = os.getpid() % self.workers
+        LOGGER.warning(
+            "No free cid worker slot in %s, using slot %d of the process id. "
+            "Pass a worker_id to keep the ids of processes apart.", self.slot_dir, slot
+        )
+        return slot
+
+    def _after_fork(self):
+        """Reset the state of the generator in a forked child process"""
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        if not self._fixed_worker_id:
+            # The inherited lock belongs to the parent's slot
+            if self._slot_fd is not None:
+                os.close(self._slot_fd)
+                self._slot_fd = None
+            self.worker_id = None
+
+    def __call__(self):
+        if self._pid != os.getpid():
+            self._after_fork()
+        with self._lock:
+            if self.worker_id is None:
+                self.worker_id = self._claim_slot()
+            tick = time.time_ns() // 100
+            cid = tick - tick % self.workers + self.worker_id
+            if cid <= self._last:
+                cid = self._last + self.workers
+            self._last = cid
+        return cid
+
+
+_CID_GENERATOR = CidGenerator()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_CID_GENERATOR._after_fork)
+
 
 def create_cid():
-    """Create a new Client order id. Based on timestamp multiplied to 100k to
-    make it improbable that two actions are assigned the same cid.
+    """Create a new Client order id. Based on the current utc timestamp in
+    units of 100 nanoseconds. Ids are increasing within the process and
+    unique across the processes of a host, see ``CidGenerator`` for
+    details.
 
     Returns
     -------
     int
         A integer number equal to the current timestamp * 10 mill.
     """
-    now = datetime.utcnow()
-    return int(float(now.strftime("%s.%f"))*10000000)
+    return _CID_GENERATOR()
 
 def cid_to_date(cid):
     """Converts a cid to date string YYYY-MM-DD
@@ -32,12 +163,25 @@ def cid_to_date(cid):
         cid/10000000.0
     ).strftime("%Y-%m-%d")
 
+_NONCE_PROVIDERS = {}
+_NONCE_PROVIDERS_LOCK = threading.Lock()
+
+def default_nonce_provider(multiplier):
+    """Returns the process wide ``NonceProvider`` for the given multiplier.
+    Clients created without an explicit nonce provider share it, so several
+    clients using the same API key in one process never reuse a nonce.
+    """
+    with _NONCE_PROVIDERS_LOCK:
+        if multiplier not in _NONCE_PROVIDERS:
+            _NONCE_PROVIDERS[multiplier] = NonceProvider(multiplier)
+        return _NONCE_PROVIDERS[multiplier]
+
 def get_nonce(multiplier):
     """Returns a nonce used in authentication.
     Nonce must be an increasing number. If other frameworks have used
     higher numbers you might need to increase the nonce_multiplier.
     """
-    return str(float(time.time()) * multiplier)
+    return default_nonce_provider(multiplier)()
 
 TRADE_SYMBOL_MISSING = re.compile(r"^[a-zA-Z]{6}$")
 """Regular explression used to match trade symbols without a leading t (e.g. BTCUSD)"""
@@ -0,0 +1,153 @@
+"""Nonce providers used to authenticate against the Bitfinex API"""
+import mmap
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on windows
+    fcntl = None
+
+MAX_NONCE = 2 ** 53 - 1
+"""Largest nonce accepted by Bitfinex"""
+
+
+class NonceProvider:
+    """Thread safe provider of strictly increasing nonces.
+
+    Nonces are plain integer strings: the current timestamp in microseconds
+    multiplied by ``multiplier``. They are calculated with integers, so two
+    calls never return the same value and never go backwards, even when
+    called from several threads or clients at the same time. Being in
+    microseconds, they are larger than the decimal second based nonces
+    used previously with the same multiplier: a multiplier of 1.0 already
+    covers any nonce sent before with a multiplier up to 1e6. Multipliers
+    that would push nonces past ``MAX_NONCE`` (above about 5) are
+    rejected.
+
+    A single provider should be shared by all clients that use the same API
+    key. Use ``FileNonceProvider`` when the key is shared between processes.
+
+    Parameters
+    ----------
+    multiplier : float
+        Multiply the nonce by this number. Default: 1.0
+
+    Raises
+    ------
+    ValueError
+        If the multiplier is not positive or the nonces would be larger
+        than ``MAX_NONCE``.
+
+    Example
+    -------
+     ::
+
+        nonce_provider = NonceProvider()
+        rest_client = ClientV2(key, secret, nonce_provider=nonce_provider)
+        wss_client = WssClient(key, secret, nonce_provider=nonce_provider)
+    """
+
+    def __init__(self, multiplier=1.0):
+        self.multiplier = multiplier
+        self._last = 0
+        self._lock = threading.Lock()
+        if not multiplier > 0:
+            raise ValueError("The nonce multiplier must be positive")
+        self._check(self._now())
+
+    def _now(self):
+        """Current time in micro units of the nonce"""
+        return int(time.time_ns() // 1000 * self.multiplier)
+
+    def _check(self, value):
+        if value > MAX_NONCE:
+            raise ValueError(
+                "Nonce %s is larger than %s, the nonce multiplier %s is too "
+                "large (nonces are in microseconds)" % (value, MAX_NONCE, self.multiplier)
+            )
+        return value
+
+    def _next(self, last):
+        return self._check(max(self._now(), last + 1))
+
+    @staticmethod
+    def _format(value):
+        return str(value)
+
+    def __call__(self):
+        with self._lock:
+            self._last = self._next(self._last)
+            value = self._last
+        return self._format(value)
+
+
+class FileNonceProvider(NonceProvider):
+    """Nonce provider shared between processes on the same host.
+
+    The last nonce is stored in a small memory mapped file, guarded by an
+    exclusive file lock. Every process using the same ``path`` (and the same
+    ``multiplier``) gets nonces that are strictly increasing across all
+    processes.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file used to store the last nonce. The file is created
+        if it does not exist.
+
+    multiplier : float
+        Multiply the nonce by this number. Default: 1.0
+
+    Example
+    -------
+     ::
+
+        # in every worker process
+        nonce_provider = FileNonceProvider("/tmp/bitfinex-my-key.nonce")
+        rest_client = ClientV2(key, secret, nonce_provider=nonce_provider)
+    """
+
+    SIZE = 16
+
+    def __init__(self, path, multiplier=1.0):
+        if fcntl is None:
+            raise RuntimeError("FileNonceProvider requires fcntl (posix only)")
+        super().__init__(multiplier)
+        self.path = path
+        self._pid = None
+        self._fd = None
+        self._map = None
+
+    def _open(self):
+        """(Re)open the file. Locks are not shared with a forked parent, so
+        this is also done the first time the provider is used in a child."""
+        self.close()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < self.SIZE:
+            os.ftruncate(self._fd, self.SIZE)
+        self._map = mmap.mmap(self._fd, self.SIZE)
+        self._pid = os.getpid()
+
+    def close(self):
+        """Close the underlying file"""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __call__(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                last = int.from_bytes(self._map[:self.SIZE], "big")
+                value = self._next(last)
+                self._map[:self.SIZE] = value.to_bytes(self.SIZE, "big")
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return self._format(value)
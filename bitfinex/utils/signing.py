@@ -0,0 +1,47 @@
+"""Request signing used to authenticate against the Bitfinex API"""
+import hashlib
+import hmac
+
+
+class HmacSigner:
+    """HMAC-SHA384 signer keyed once with the API secret.
+
+    Keying the HMAC (encoding the secret and hashing the padded key) is done
+    once when the signer is created. Each signature is made from a copy of
+    the keyed HMAC, which is considerably cheaper than calling ``hmac.new``
+    for every request.
+
+    Parameters
+    ----------
+    secret : str
+        Bitfinex api secret
+
+    Example
+    -------
+     ::
+
+        signer = HmacSigner(secret)
+        signature = signer.sign("/api/v2/auth/r/wallets{}{}".format(nonce, body))
+    """
+
+    def __init__(self, secret):
+        self._hmac = hmac.new(secret.encode('utf8'), digestmod=hashlib.sha384)
+
+    def sign(self, message):
+        """Sign a message.
+
+        Parameters
+        ----------
+        message : str, bytes
+            The message to sign. Strings are utf8 encoded.
+
+        Returns
+        -------
+        str
+            Hex encoded signature.
+        """
+        if isinstance(message, str):
+            message = message.encode('utf8')
+        hmc = self._hmac.copy()
+        hmc.update(message)
+        return hmc.hexdigest()
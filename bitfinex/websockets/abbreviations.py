@@ -68,9 +68,114 @@ NOTIFICATION_CODES = {
 }
 
 
+NOTIFICATION_DESCRIPTIONS = {
+    description: code for code, description in NOTIFICATION_CODES.items()
+}
+"""Reverse lookup of ``NOTIFICATION_CODES`` (description -> code)"""
+
+EVENT_NAMES = {"auth", "info", "error", "pong", "conf", "subscribed", "unsubscribed"}
+"""Names of the event messages (dicts) sent by the websocket server"""
+
+
 def get_notification_code(description):
-    index = list(NOTIFICATION_CODES.values()).index(description)
-    return list(NOTIFICATION_CODES.keys())[index]
+    """Returns the abbreviation used for a given description, e.g.
+    ``"order new"`` -> ``"on"``."""
+    try:
+        return NOTIFICATION_DESCRIPTIONS[description]
+    except KeyError:
+        raise ValueError("Unknown notification description %r" % description)
+
+
+def get_notification_description(code):
+    """Returns the description of a given abbreviation, e.g.
+    ``"on"`` -> ``"order new"``."""
+    try:
+        return NOTIFICATION_CODES[code]
+    except KeyError:
+        raise ValueError("Unknown notification code %r" % code)
+
+
+def event_key(message):
+    """Returns the key used to route an incoming websocket message.
+
+    Parameters
+    ----------
+    message : list, dict
+        A decoded websocket message.
+
+    Returns
+    -------
+    str, None
+        The abbreviation of channel messages (e.g. ``"on"`` for
+        ``[0, "on", [...]]`` or ``"hb"`` for heartbeats), the event name of
+        event messages (e.g. ``"auth"``) and None for anything else, like
+        public channel data.
+    """
+    if isinstance(message, list):
+        if len(message) > 1 and isinstance(message[1], str):
+            return message[1]
+        return None
+    if isinstance(message, dict):
+        return message.get("event")
+    return None
+
+
+def build_dispatch_table(handlers):
+    """Builds a dispatch table used to route incoming messages with
+    ``dispatch``.
+
+    Parameters
+    ----------
+    handlers : dict
+        Maps abbreviations (``"on"``), their descriptions (``"order new"``),
+        ``"hb"`` or event names (``"auth"``) to a handler or a list of
+        handlers.
+
+    Returns
+    -------
+    dict
+        Maps each abbreviation or event name to a tuple of handlers.
+    """
+    table = {}
+    for key, key_handlers in handlers.items():
+        if key in NOTIFICATION_DESCRIPTIONS:
+            key = NOTIFICATION_DESCRIPTIONS[key]
+        elif key not in NOTIFICATION_CODES and key not in EVENT_NAMES \
+                and key != "hb":
+            raise ValueError("Unknown message type %r" % key)
+        if callable(key_handlers):
+            key_handlers = [key_handlers]
+        table[key] = table.get(key, ()) + tuple(key_handlers)
+    return table
+
+
+def dispatch(table, message, default=None):
+    """Routes a message to the handlers registered for its type.
+
+    Parameters
+    ----------
+    table : dict
+        A table created with ``build_dispatch_table``.
+
+    message : list, dict
+        A decoded websocket message.
+
+    default : Optional func
+        Called with messages that have no registered handlers.
+
+    Returns
+    -------
+    bool
+        True if the message was handled by a registered handler.
+    """
+    handlers = table.get(event_key(message))
+    if handlers is None:
+        if default is not None:
+            default(message)
+        return False
+    for handler in handlers:
+        handler(message)
+    return True
 
 
 ORDER_TYPES = [
@@ -0,0 +1,185 @@
+"""In memory wallet and position state maintained from the authenticated
+websocket channel"""
+import threading
+from collections import namedtuple
+
+Wallet = namedtuple("Wallet", [
+    "type", "currency", "balance", "unsettled_interest", "balance_available",
+])
+"""A wallet as sent in ``ws``/``wu`` messages and by ``restv2.Client.wallets_balance``"""
+
+Position = namedtuple("Position", [
+    "symbol", "status", "amount", "base_price", "margin_funding",
+    "margin_funding_type", "pl", "pl_perc", "price_liq", "leverage",
+])
+"""A position as sent in ``ps``/``pn``/``pu``/``pc`` messages and by
+``restv2.Client.active_positions``"""
+
+AccountSnapshot = namedtuple("AccountSnapshot", ["wallets", "positions"])
+"""Consistent view of all wallets, keyed by (type, currency), and open
+positions, keyed by symbol. The dicts of a snapshot are never modified."""
+
+
+def _from_array(cls, data):
+    size = len(cls._fields)
+    data = list(data[:size])
+    return cls(*(data + [None] * (size - len(data))))
+
+
+class AccountStore:
+    """Maintains wallets and positions from the ``ws``, ``wu``, ``ps``,
+    ``pn``, ``pu`` and ``pc`` messages of the authenticated channel.
+
+    Every change publishes a new immutable ``AccountSnapshot``, so reads are
+    lock free and always consistent, however many threads read at the same
+    time.
+
+    Parameters
+    ----------
+    rest_client : Optional restv2.Client
+        When given, wallets and positions are loaded over REST each time the
+        authenticated channel connects, until the websocket snapshots arrive.
+
+    Example
+    -------
+     ::
+
+        account = AccountStore(rest_client=ClientV2(key, secret))
+        my_client = WssClient(key, secret)
+        account.attach(my_client)
+        my_client.authenticate(print)
+        my_client.start()
+
+        account.wallet("exchange", "USD").balance
+        account.position("tBTCUSD")
+
+    """
+
+    def __init__(self, rest_client=None):
+        self.rest_client = rest_client
+        self._lock = threading.Lock()
+        self._snapshot = AccountSnapshot({}, {})
+        self._streamed_wallets = False
+        self._streamed_positions = False
+
+    def attach(self, client):
+        """Register the handlers of the store on a ``WssClient`` as
+        listeners (see ``WssClient.add_auth_listener``), so the messages are
+        still passed to the ``authenticate`` callback.
+
+        Parameters
+        ----------
+        client : WssClient
+            The client used for the authenticated channel.
+        """
+        client.add_auth_listener("ws", self.on_wallet_snapshot)
+        client.add_auth_listener("wu", self.on_wallet_update)
+        client.add_auth_listener("ps", self.on_position_snapshot)
+        client.add_auth_listener("pn", self.on_position_update)
+        client.add_auth_listener("pu", self.on_position_update)
+        client.add_auth_listener("pc", self.on_position_close)
+        if self.rest_client is not None:
+            client.add_auth_listener("auth", self.on_auth)
+
+    # Reads
+
+    def snapshot(self):
+        """Returns the current ``AccountSnapshot``"""
+        return self._snapshot
+
+    def wallet(self, wallet_type, currency):
+        """Returns the wallet of the given type ("exchange", "margin" or
+        "funding") and currency, or None"""
+        return self._snapshot.wallets.get((wallet_type, currency))
+
+    def position(self, symbol):
+        """Returns the open position for the given symbol, or None"""
+        return self._snapshot.positions.get(symbol)
+
+    # Message handlers
+
+    def on_auth(self, message):
+        """Bootstrap from REST when the authenticated channel connects. The
+        requests are made on a separate thread, not to block the reactor."""
+        if message.get("status") != "OK":
+            return
+        with self._lock:
+            self._streamed_wallets = False
+            self._streamed_positions = False
+        threading.Thread(target=self.bootstrap, daemon=True).start()
+
+    def bootstrap(self, rest_client=None):
+        """Load wallets and positions over REST. Data already received from
+        the websocket is newer and is never overwritten.
+
+        Parameters
+        ----------
+        rest_client : Optional restv2.Client
+            Defaults to the client given to the store.
+        """
+        rest_client = rest_client or self.rest_client
+        wallets = rest_client.wallets_balance()
+        positions = rest_client.active_positions()
+        with self._lock:
+            if not self._streamed_wallets:
+                self._publish(wallets=self._wallets_from(wallets))
+            if not self._streamed_positions:
+                self._publish(positions=self._positions_from(positions))
+
+    def on_wallet_snapshot(self, message):
+        """Handle wallet snapshot (``ws``) messages"""
+        with self._lock:
+            self._streamed_wallets = True
+            self._publish(wallets=self._wallets_from(message[2]))
+
+    def on_wallet_update(self, message):
+        """Handle wallet update (``wu``) messages"""
+        wallet = _from_array(Wallet, message[2])
+        with self._lock:
+            self._streamed_wallets = True
+            wallets = dict(self._snapshot.wallets)
+            wallets[(wallet.type, wallet.currency)] = wallet
+            self._publish(wallets=wallets)
+
+    def on_position_snapshot(self, message):
+        """Handle position snapshot (``ps``) messages"""
+        with self._lock:
+            self._streamed_positions = True
+            self._publish(positions=self._positions_from(message[2]))
+
+    def on_position_update(self, message):
+        """Handle new position (``pn``) and position update (``pu``) messages"""
+        position = _from_array(Position, message[2])
+        with self._lock:
+            self._streamed_positions = True
+            positions = dict(self._snapshot.positions)
+            positions[position.symbol] = position
+            self._publish(positions=positions)
+
+    def on_position_close(self, message):
+        """Handle position close (``pc``) messages"""
+        symbol = message[2][0]
+        with self._lock:
+            self._streamed_positions = True
+            positions = dict(self._snapshot.positions)
+            positions.pop(symbol, None)
+            self._publish(positions=positions)
+
+    # Internals
+
+    @staticmethod
+    def _wallets_from(data):
+        wallets = (_from_array(Wallet, item) for item in data)
+        return {(wallet.type, wallet.currency): wallet for wallet in wallets}
+
+    @staticmethod
+    def _positions_from(data):
+        positions = (_from_array(Position, item) for item in data)
+        return {position.symbol: position for position in positions}
+
+    def _publish(self, wallets=None, positions=None):
+        """Replace the current snapshot. Must be called with the lock held."""
+        self._snapshot = AccountSnapshot(
+            self._snapshot.wallets if wallets is None else wallets,
+            self._snapshot.positions if positions is None else positions,
+        )
@@ -0,0 +1,67 @@
+"""Micro batching of websocket order operations"""
+import threading
+
+MAX_OPERATIONS = 75
+"""Maximum number of operations accepted by Bitfinex in one multi-op frame"""
+
+
+class OrderBatcher:
+    """Collects order operations over a short window and passes them on as
+    one batch, to be sent as a single ``ox_multi`` frame.
+
+    A batch is sent ``window`` seconds after its first operation was added,
+    or as soon as it holds ``max_operations`` operations.
+
+    Parameters
+    ----------
+    send_batch : func
+        Called with the list of operations of each batch, e.g.
+        ``[["on", {...}], ["oc", {"id": 1}]]``.
+
+    schedule : func
+        Called as ``schedule(delay, func)`` to run ``func`` after ``delay``
+        seconds.
+
+    window : float
+        Seconds to collect operations before sending them. Default: 0.005
+
+    max_operations : int
+        Maximum number of operations per batch. Default: 75
+    """
+
+    def __init__(self, send_batch, schedule, window=0.005,
+                 max_operations=MAX_OPERATIONS):
+        if not 0 < max_operations <= MAX_OPERATIONS:
+            raise ValueError("max_operations must be in the range [1, %s]" % MAX_OPERATIONS)
+        self.send_batch = send_batch
+        self.schedule = schedule
+        self.window = window
+        self.max_operations = max_operations
+        self._lock = threading.Lock()
+        self._operations = []
+        self._scheduled = False
+
+    def __len__(self):
+        return len(self._operations)
+
+    def add(self, operation):
+        """Add an operation (e.g. ``["on", {...}]``) to the current batch"""
+        with self._lock:
+            self._operations.append(operation)
+            full = len(self._operations) >= self.max_operations
+            schedule = not full and not self._scheduled
+            if schedule:
+                self._scheduled = True
+        if full:
+            self.flush()
+        elif schedule:
+            self.schedule(self.window, self.flush)
+
+    def flush(self):
+        """Send all collected operations now"""
+        with self._lock:
+            operations = self._operations
+            self._operations = []
+            self._scheduled = False
+        for start in range(0, len(operations), self.max_operations):
+            self.send_batch(operations[start:start + self.max_operations])
@@ -0,0 +1,124 @@
+"""Coalescing and pacing of websocket calc requests"""
+import threading
+import time
+
+from .ratelimit import TokenBucket
+
+MAX_BATCH = 30
+"""Maximum number of calculations accepted by Bitfinex in one calc message"""
+
+MAX_RATE = 8.0
+"""Maximum number of calculations per second performed by Bitfinex for a
+client"""
+
+
+def calculation_keys(calculations):
+    """Flatten calc arguments to calculation keys.
+
+    Parameters
+    ----------
+    calculations : iterable
+        Calculation keys (e.g. ``"position_tBTCUSD"``) or lists of keys, as
+        passed to ``WssClient.calc``.
+
+    Returns
+    -------
+    list
+        The calculation keys.
+    """
+    keys = []
+    for calculation in calculations:
+        if isinstance(calculation, str):
+            keys.append(calculation)
+        else:
+            keys.extend(calculation)
+    return keys
+
+
+class CalcScheduler:
+    """Coalesces calc requests into batches paced to the server limits.
+
+    Requested calculation keys (``margin_sym_*``, ``position_*``,
+    ``wallet_*``, ...) are kept in a pending set until they are sent, so a
+    key requested again before that is sent only once. Pending keys are sent
+    in batches of up to ``max_batch`` keys, paced so that at most ``rate``
+    calculations are requested per second: each key of a batch counts, not
+    the message. A batch holds at most one second worth of calculations.
+
+    Parameters
+    ----------
+    send_batch : func
+        Called with each batch, a list of calculations in the format
+        expected by the calc message, e.g. ``[["position_tBTCUSD"]]``.
+
+    schedule : func
+        Called as ``schedule(delay, func)`` to run ``func`` after ``delay``
+        seconds.
+
+    rate : float
+        Maximum number of calculations per second. Default: 8.0
+
+    max_batch : int
+        Maximum number of calculations per batch. Default: 30
+    """
+
+    def __init__(self, send_batch, schedule, rate=MAX_RATE, max_batch=MAX_BATCH,
+                 clock=time.monotonic):
+        if not 0 < max_batch <= MAX_BATCH:
+            raise ValueError("max_batch must be in the range [1, %s]" % MAX_BATCH)
+        self.send_batch = send_batch
+        self.schedule = schedule
+        self.max_batch = max_batch
+        # One token per calculation, the bucket holds one second worth
+        self._bucket = TokenBucket(rate, max(1, int(rate)), clock)
+        self._pending = {}
+        self._scheduled = False
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        """List of calculation keys waiting to be sent"""
+        return list(self._pending)
+
+    def request(self, *calculations):
+        """Request calculations. Keys that are already pending are ignored.
+
+        Parameters
+        ----------
+        *calculations : str, list
+            Calculation keys or lists of keys.
+        """
+        with self._lock:
+            for key in calculation_keys(calculations):
+                self._pending[key] = None
+            if self._scheduled or not self._pending:
+                return
+            self._scheduled = True
+            delay = self._bucket.delay(self._batch_size())
+        self.schedule(delay, self.drain)
+
+    def _batch_size(self):
+        """Number of keys of the next batch, must be called with the lock
+        held"""
+        return min(len(self._pending), self.max_batch, self._bucket.burst)
+
+    def drain(self):
+        """Send the next batch of pending calculations if the rate allows
+        it, and schedule the following one"""
+        batch = None
+        with self._lock:
+            self._scheduled = False
+            size = self._batch_size()
+            if self._pending and self._bucket.consume(size):
+                keys = list(self._pending)[:size]
+                for key in keys:
+                    del self._pending[key]
+                batch = [[key] for key in keys]
+            delay = None
+            if self._pending:
+                self._scheduled = True
+                delay = self._bucket.delay(self._batch_size())
+        if batch:
+            self.send_batch(batch)
+        if delay is not None:
+            self.schedule(delay, self.drain)
@@ -1,8 +1,9 @@
 # coding=utf-8
+import asyncio
 import threading
 import json
-import hmac
-import hashlib
+import time
+from collections import deque
 
 from autobahn.twisted.websocket import WebSocketClientFactory, \
     WebSocketClientProtocol, \
@@ -12,6 +13,11 @@ from twisted.internet.protocol import ReconnectingClientFactory
 from twisted.internet.error import ReactorAlreadyRunning
 from bitfinex import utils
 from . import abbreviations
+from . import batching
+from . import calculations as calc_scheduling
+from . import correlation
+from . import delivery
+from . import ratelimit
 
 # Example used to make send logic
 # https://stackoverflow.com/questions/18899515/writing-an-interactive-client-with-twisted-autobahn-websockets
@@ -26,6 +32,19 @@ class BitfinexClientProtocol(WebSocketClientProtocol):
 
     def onOpen(self):
         self.factory.protocol_instance = self
+        # Send the messages queued while the socket was not connected
+        while self.factory.unsent:
+            self.sendMessage(self.factory.unsent.popleft(), isBinary=False)
+
+    def onClose(self, wasClean, code, reason):
+        if self.factory.protocol_instance is self:
+            self.factory.protocol_instance = None
+            self.factory.authenticated = False
+            if self.factory.base_client is not None:
+                # Order operations must not be replayed on the next session
+                self.factory.base_client._fail_unsent_orders(
+                    self.factory, "Not sent, the socket was disconnected"
+                )
 
     def onConnect(self, response):
         if self.payload:
@@ -58,6 +77,11 @@ class BitfinexClientFactory(WebSocketClientFactory, BitfinexReconnectingClientFa
     def __init__(self, *args, payload=None, **kwargs):
         WebSocketClientFactory.__init__(self, *args, **kwargs)
         self.protocol_instance = None
+        self.unsent = deque()
+        # Order operations waiting for the authentication, as
+        # (deadline, payload, data) tuples
+        self.unsent_orders = deque()
+        self.authenticated = False
         self.base_client = None
         self.payload = payload
 
@@ -85,20 +109,103 @@ class BitfinexSocketManager(threading.Thread):
 
     STREAM_URL = 'wss://api.bitfinex.com/ws/2'
 
+    # Seconds an order operation may wait for the authenticated socket
+    # before it is failed instead of sent
+    ORDER_SEND_TIMEOUT = 5.0
+
     def __init__(self):  # client
         """Initialise the BitfinexSocketManager"""
         threading.Thread.__init__(self)
         self.factories = {}
+        self.queues = {}
         self._connected_event = threading.Event()
         self._conns = {}
         self._user_timer = None
         self._user_listen_key = None
         self._user_callback = None
-
-    def _start_socket(self, id_, payload, callback):
+        self._outbound = deque()
+        self._flush_scheduled = False
+
+    def _queue_payload(self, id_, payload, order=None):
+        """Queue a payload to be sent on a socket. Safe to call from any
+        thread: the payload is written by the reactor thread, together with
+        every other payload queued before it runs. ``order`` is the message
+        of an order operation, these are only sent once the socket is
+        authenticated."""
+        self._outbound.append((self.factories[id_], payload, order))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            reactor.callFromThread(self._flush_outbound)
+
+    def _flush_outbound(self):
+        """Write all queued payloads. Runs on the reactor thread."""
+        # Reset the flag first, payloads queued from now on either get
+        # written by this loop or schedule a new flush.
+        self._flush_scheduled = False
+        outbound = self._outbound
+        while outbound:
+            factory, payload, order = outbound.popleft()
+            protocol = factory.protocol_instance
+            if order is not None:
+                if protocol is None or not factory.authenticated or factory.unsent_orders:
+                    # Sent once authenticated, unless it is stale by then
+                    deadline = time.monotonic() + self.ORDER_SEND_TIMEOUT
+                    factory.unsent_orders.append((deadline, payload, order))
+                else:
+                    protocol.sendMessage(payload, isBinary=False)
+            elif protocol is None or factory.unsent:
+                # Not connected (yet), sent by the protocol when it opens
+                factory.unsent.append(payload)
+            else:
+                protocol.sendMessage(payload, isBinary=False)
+
+    def _on_authenticated(self, id_, status):
+        """Send the order operations that waited for the authentication of
+        a socket, or fail them if it was refused. Runs on the reactor
+        thread."""
+        factory = self.factories.get(id_)
+        if factory is None:
+            return
+        if status != "OK":
+            self._fail_unsent_orders(factory, "Not sent, the authentication failed")
+            return
+        factory.authenticated = True
+        now = time.monotonic()
+        while factory.unsent_orders and factory.protocol_instance is not None:
+            deadline, payload, order = factory.unsent_orders.popleft()
+            if deadline < now:
+                self._order_not_sent(factory, order, "Not sent in time")
+            else:
+                factory.protocol_instance.sendMessage(payload, isBinary=False)
+
+    def _fail_unsent_orders(self, factory, reason):
+        """Fail the order operations waiting to be sent on a socket"""
+        while factory.unsent_orders:
+            _, _, order = factory.unsent_orders.popleft()
+            self._order_not_sent(factory, order, reason)
+
+    def _order_not_sent(self, factory, order, reason):
+        """Report an order operation that was dropped to the socket callback,
+        as an error notification like the ones Bitfinex sends"""
+        factory.callback([0, "n", [
+            int(time.time() * 1000), order[1] + "-req", None, None, order[3],
+            None, "ERROR", reason
+        ]])
+
+    def _start_socket(self, id_, payload, callback, queue_policy=None,
+                      queue_size=1000, queue_interval=0):
         if id_ in self._conns:
             return False
 
+        if queue_policy is not None:
+            callback = delivery.DeliveryQueue(
+                callback, maxsize=queue_size, policy=queue_policy,
+                min_interval=queue_interval, name=id_,
+                on_full=lambda: reactor.callFromThread(self._pause_reading, id_),
+                on_drain=lambda: reactor.callFromThread(self._resume_reading, id_)
+            )
+            self.queues[id_] = callback
+
         factory_url = self.STREAM_URL
         factory = BitfinexClientFactory(factory_url, payload=payload)
         factory.base_client = self
@@ -108,6 +215,22 @@ class BitfinexSocketManager(threading.Thread):
         self.factories[id_] = factory
         reactor.callFromThread(self.add_connection, id_)
 
+    def _pause_reading(self, id_):
+        """Stop reading the socket of a subscription whose delivery queue is
+        full. Runs on the reactor thread, other sockets are not affected."""
+        factory = self.factories.get(id_)
+        protocol = factory.protocol_instance if factory else None
+        if protocol is not None and protocol.transport is not None:
+            protocol.transport.pauseProducing()
+
+    def _resume_reading(self, id_):
+        """Resume reading the socket of a subscription. Runs on the reactor
+        thread."""
+        factory = self.factories.get(id_)
+        protocol = factory.protocol_instance if factory else None
+        if protocol is not None and protocol.transport is not None:
+            protocol.transport.resumeProducing()
+
     def add_connection(self, id_):
         """
         Convenience function to connect and store the resulting
@@ -137,6 +260,28 @@ class BitfinexSocketManager(threading.Thread):
         self._conns[conn_key].factory = WebSocketClientFactory(self.STREAM_URL)
         self._conns[conn_key].disconnect()
         del self._conns[conn_key]
+        if conn_key in self.queues:
+            self.queues.pop(conn_key).close(timeout=0)
+
+    def queue_stats(self):
+        """Returns the state of the delivery queues of the subscriptions
+        that use one.
+
+        Returns
+        -------
+        dict
+            Maps socket identifiers to a dict with the ``depth``,
+            ``max_depth``, ``delivered`` and ``dropped`` counters.
+        """
+        return {
+            id_: {
+                "depth": queue.depth,
+                "max_depth": queue.max_depth,
+                "delivered": queue.delivered,
+                "dropped": queue.dropped,
+            }
+            for id_, queue in list(self.queues.items())
+        }
 
     def run(self):
         try:
@@ -166,6 +311,14 @@ class WssClient(BitfinexSocketManager):
     secret : str
         Your API secret
 
+    nonce_multiplier : Optional float
+        Multiply nonce by this number. Nonces are in microseconds, values
+        above about 5 are rejected, see ``utils.NonceProvider``.
+
+    nonce_provider : Optional callable
+        Callable returning the next nonce, e.g. a ``utils.NonceProvider`` or
+        ``utils.FileNonceProvider`` shared by all clients (and processes)
+        using the same key. Defaults to a provider shared within the process.
 
     .. Hint::
 
@@ -179,20 +332,366 @@ class WssClient(BitfinexSocketManager):
     # Bitfinex commands
     ###########################################################################
 
-    def __init__(self, key=None, secret=None, nonce_multiplier=1.0):  # client
+    def __init__(self, key=None, secret=None, nonce_multiplier=1.0,
+                 nonce_provider=None):  # client
         super().__init__()
         self.key = key
         self.secret = secret
+        self._signer = utils.HmacSigner(secret) if secret else None
         self.nonce_multiplier = nonce_multiplier
+        self.nonce_provider = (
+            nonce_provider or utils.default_nonce_provider(nonce_multiplier)
+        )
+        self._auth_callback = None
+        self._auth_handlers = {}
+        self._auth_dispatch_table = {}
+        self._auth_listeners = {}
+        self._auth_listen_table = {}
+        self._auth_handlers_lock = threading.Lock()
+        self._requests = correlation.RequestTracker()
+        self._batcher = None
+        self._governor = None
+        self._calc_scheduler = None
 
     def _nonce(self):
         """Returns a nonce used in authentication.
         Nonce must be an increasing number, if the API key has been used
         earlier or other frameworks that have used higher numbers you might
         need to increase the nonce_multiplier."""
-        return str(utils.get_nonce(self.nonce_multiplier))
+        return self.nonce_provider()
+
+    def _send(self, data, channel="auth"):
+        """Send a message on the given channel, within the rate limits when
+        they are enabled"""
+        if self._governor is not None:
+            self._governor.submit(
+                ratelimit.classify(data), (data, channel), ratelimit.order_targets(data)
+            )
+        else:
+            self._write((data, channel))
+
+    def _write(self, message):
+        """Serialize and queue a (data, channel) message for its socket"""
+        data, channel = message
+        payload = json.dumps(data, ensure_ascii=False).encode('utf8')
+        is_order = ratelimit.classify(data) in (ratelimit.CANCEL, ratelimit.ORDER)
+        self._queue_payload(channel, payload, order=data if is_order else None)
+
+    def _order_not_sent(self, factory, order, reason):
+        for key in correlation.request_keys(order):
+            self._requests.fail(key, correlation.OrderNotSentError(reason))
+        super()._order_not_sent(factory, order, reason)
+
+    def enable_rate_limit(self, budgets=None, max_queued=1000, high_watermark=None,
+                          on_backpressure=None):
+        """Send messages within a budget per message class (cancels, orders,
+        calculations, pings and others). Messages over budget are queued and
+        sent by priority, cancels first, as soon as the budget allows it.
+
+        Parameters
+        ----------
+        budgets : Optional dict
+            Maps message classes to (messages per second, burst). See
+            ``ratelimit.DEFAULT_BUDGETS``.
+
+        max_queued : int
+            Maximum number of queued messages. Sending more raises
+            ``ratelimit.SendQueueFull``. Default: 1000
+
+        high_watermark : Optional int
+            Number of queued messages above which the client is congested.
+            Default: half of ``max_queued``
+
+        on_backpressure : Optional func
+            Called with True when the client becomes congested, and with
+            False when it is not anymore.
+
+        Example
+        -------
+         ::
+
+            my_client = WssClient(key, secret)
+            my_client.authenticate(print)
+            my_client.enable_rate_limit(
+                budgets={ratelimit.ORDER: (20.0, 20)},
+                on_backpressure=lambda congested: print("congested", congested)
+            )
+            my_client.start()
+
+        """
+        self._governor = ratelimit.SendGovernor(
+            self._write,
+            lambda delay, func: reactor.callFromThread(reactor.callLater, delay, func),
+            budgets=budgets,
+            max_queued=max_queued,
+            high_watermark=high_watermark,
+            on_backpressure=on_backpressure
+        )
+
+    def enable_calc_scheduler(self, rate=calc_scheduling.MAX_RATE,
+                              max_batch=calc_scheduling.MAX_BATCH):
+        """Coalesce ``calc`` requests. Calculation keys requested again
+        before they are sent are sent only once, and pending keys are merged
+        into batches paced to at most ``rate`` calculations per second.
+
+        Parameters
+        ----------
+        rate : float
+            Maximum number of calculations per second. Default: 8.0
+
+        max_batch : int
+            Maximum number of calculations per message. Default: 30
+
+        Example
+        -------
+         ::
+
+            my_client = WssClient(key, secret)
+            my_client.authenticate(print)
+            my_client.enable_calc_scheduler()
+            my_client.start()
+
+            # Sent once, in a single message
+            for _ in range(100):
+                my_client.calc("margin_sym_tBTCUSD", "position_tBTCUSD")
+
+        """
+        self._calc_scheduler = calc_scheduling.CalcScheduler(
+            self._send_calc,
+            lambda delay, func: reactor.callFromThread(reactor.callLater, delay, func),
+            rate=rate,
+            max_batch=max_batch
+        )
+
+    def _send_calc(self, calculations):
+        """Send a calc message"""
+        self._send([0, 'calc', None, calculations])
+
+    @property
+    def congested(self):
+        """True while the rate limiter holds more messages than its high
+        watermark. Always False when rate limiting is not enabled."""
+        return self._governor is not None and self._governor.congested
+
+    def _send_tracked(self, send, keys, future, timeout):
+        """Call ``send`` with a future registered for each request key of
+        the order operations it sends. The futures are registered first, so
+        that no notification is missed, and discarded again if ``send``
+        raises. Returns the futures, None for keys that are None or if no
+        future was requested."""
+        requests = []
+        if future:
+            timeout = self._requests.timeout if timeout is None else timeout
+            requests = [
+                None if key is None else self._requests.register(key, timeout)
+                for key in keys
+            ]
+        try:
+            send()
+        except Exception:
+            for key, request in zip(keys, requests):
+                if request is not None:
+                    self._requests.discard(key, request)
+            raise
+        if not any(request is not None for request in requests):
+            return [None] * len(keys)
+        reactor.callFromThread(reactor.callLater, timeout, self._requests.expire)
+        if future == "asyncio":
+            return [
+                None if request is None else asyncio.wrap_future(request)
+                for request in requests
+            ]
+        return requests
+
+    def _submit_order_op(self, op_code, params, key, future, timeout):
+        """Send an order operation, or add it to the current batch when
+        batching is enabled. Returns the future of the operation, if any."""
+        if self._batcher is not None:
+            send, message = self._batcher.add, [op_code, params]
+        else:
+            send, message = self._send, [0, op_code, None, params]
+        return self._send_tracked(lambda: send(message), [key], future, timeout)[0]
+
+    def _send_order_ops(self, operations):
+        """Send a batch of order operations"""
+        if len(operations) == 1:
+            op_code, params = operations[0]
+            self._send([0, op_code, None, params])
+        else:
+            self._send([
+                0,
+                abbreviations.get_notification_code('order multi-op'),
+                None,
+                operations
+            ])
+
+    def enable_batching(self, window=0.005, max_operations=batching.MAX_OPERATIONS):
+        """Collect the operations of ``new_order``, ``cancel_order``,
+        ``cancel_order_cid`` and ``update_order`` over a short window and
+        send them as ``ox_multi`` frames. Use ``future=True`` on these
+        methods to follow the result of each operation.
+
+        Parameters
+        ----------
+        window : float
+            Seconds to collect operations before sending them. Default: 0.005
+
+        max_operations : int
+            Maximum number of operations per frame. Default: 75
+
+        Example
+        -------
+         ::
+
+            my_client = WssClient(key, secret)
+            my_client.authenticate(print)
+            my_client.enable_batching(window=0.01)
+            my_client.start()
+
+            futures = [
+                my_client.new_order("LIMIT", "BTCUSD", "0.01", price, future=True)
+                for price in ladder
+            ]
+
+        """
+        self._batcher = batching.OrderBatcher(
+            self._send_order_ops,
+            lambda delay, func: reactor.callFromThread(reactor.callLater, delay, func),
+            window=window,
+            max_operations=max_operations
+        )
+
+    def disable_batching(self):
+        """Send pending batched operations and stop batching"""
+        batcher, self._batcher = self._batcher, None
+        if batcher is not None:
+            batcher.flush()
+
+    def add_auth_handler(self, message_type, handler):
+        """Register a handler for one type of message on the authenticated
+        channel. Messages of that type are routed only to their handlers and
+        are no longer passed to the ``authenticate`` callback.
+
+        Parameters
+        ----------
+        message_type : str
+            Abbreviation (e.g. "on", "te", "ws", "n"), its description (e.g.
+            "order new"), "hb" for heartbeats or an event name (e.g. "auth").
+            See ``abbreviations.NOTIFICATION_CODES``.
+
+        handler : func
+            A function called with each message of the given type.
+
+        Example
+        -------
+         ::
+
+            my_client = WssClient(key, secret)
+            my_client.add_auth_handler("te", handle_trade_executed)
+            my_client.add_auth_handler("order cancel", handle_order_cancel)
+            my_client.authenticate()
+            my_client.start()
+
+        """
+        with self._auth_handlers_lock:
+            handlers = dict(self._auth_handlers)
+            handlers[message_type] = handlers.get(message_type, []) + [handler]
+            # The table is replaced, never mutated, so it can be read from
+            # the reactor thread without locking.
+            self._auth_dispatch_table = abbreviations.build_dispatch_table(handlers)
+            self._auth_handlers = handlers
+
+    def remove_auth_handler(self, message_type, handler):
+        """Remove a handler registered with ``add_auth_handler``.
+
+        Parameters
+        ----------
+        message_type : str
+            The message type the handler was registered for.
+
+        handler : func
+            The handler to remove.
+        """
+        with self._auth_handlers_lock:
+            handlers = dict(self._auth_handlers)
+            remaining = [
+                registered for registered in handlers.get(message_type, [])
+                if registered != handler
+            ]
+            if remaining:
+                handlers[message_type] = remaining
+            else:
+                handlers.pop(message_type, None)
+            self._auth_dispatch_table = abbreviations.build_dispatch_table(handlers)
+            self._auth_handlers = handlers
+
+    def add_auth_listener(self, message_type, listener):
+        """Register a listener for one type of message on the authenticated
+        channel. Unlike handlers, listeners only observe the messages: they
+        are still passed to their handlers or the ``authenticate`` callback.
+
+        Parameters
+        ----------
+        message_type : str
+            The message type, as for ``add_auth_handler``.
+
+        listener : func
+            A function called with each message of the given type, before
+            its handlers.
+
+        Example
+        -------
+         ::
+
+            my_client = WssClient(key, secret)
+            my_client.add_auth_listener("n", log_notification)
+            my_client.authenticate(callback=handle_account_messages)
+            my_client.start()
+
+        """
+        with self._auth_handlers_lock:
+            listeners = dict(self._auth_listeners)
+            listeners[message_type] = listeners.get(message_type, []) + [listener]
+            self._auth_listen_table = abbreviations.build_dispatch_table(listeners)
+            self._auth_listeners = listeners
+
+    def remove_auth_listener(self, message_type, listener):
+        """Remove a listener registered with ``add_auth_listener``.
+
+        Parameters
+        ----------
+        message_type : str
+            The message type the listener was registered for.
+
+        listener : func
+            The listener to remove.
+        """
+        with self._auth_handlers_lock:
+            listeners = dict(self._auth_listeners)
+            remaining = [
+                registered for registered in listeners.get(message_type, [])
+                if registered != listener
+            ]
+            if remaining:
+                listeners[message_type] = remaining
+            else:
+                listeners.pop(message_type, None)
+            self._auth_listen_table = abbreviations.build_dispatch_table(listeners)
+            self._auth_listeners = listeners
+
+    def _handle_auth_message(self, message):
+        """Route a message from the authenticated channel to its listeners
+        and handlers"""
+        if isinstance(message, dict) and message.get("event") == "auth":
+            reactor.callFromThread(self._on_authenticated, "auth", message.get("status"))
+        if self._requests:
+            self._requests.on_message(message)
+        abbreviations.dispatch(self._auth_listen_table, message)
+        abbreviations.dispatch(
+            self._auth_dispatch_table, message, self._auth_callback
+        )
 
-    def authenticate(self, callback, filters=None):
+    def authenticate(self, callback=None, filters=None, handlers=None):
         """Method used to create an authenticated channel that both recieves
         account spesific messages and is used to send account spesific messages.
         So in order to be able to use the new_order method, you have to
@@ -204,11 +703,17 @@ class WssClient(BitfinexSocketManager):
             A function to use to handle incomming messages. This channel wil
             be handling all messages returned from operations like new_order or
             cancel_order, so make sure you handle all these messages.
+            Messages with a handler registered for their type (see
+            ``add_auth_handler``) are not passed to the callback.
 
         filters : List[str]
             A list of filter strings. See more information here:
             https://docs.bitfinex.com/v2/docs/ws-auth#section-channel-filters
 
+        handlers : dict
+            Maps message types to a handler or a list of handlers. Each item
+            is registered with ``add_auth_handler``.
+
         Example
         -------
          ::
@@ -224,14 +729,26 @@ class WssClient(BitfinexSocketManager):
              )
              my_client.start()
 
+             # Or route each message type to its own handler
+             my_client.authenticate(
+                callback=handle_other_messages,
+                handlers={
+                    "on": handle_new_order,
+                    "oc": handle_order_cancel,
+                    "te": handle_trade_executed,
+                }
+             )
+
         """
+        for message_type, message_handlers in (handlers or {}).items():
+            if callable(message_handlers):
+                message_handlers = [message_handlers]
+            for handler in message_handlers:
+                self.add_auth_handler(message_type, handler)
+        self._auth_callback = callback
         nonce = self._nonce()
         auth_payload = 'AUTH{}'.format(nonce)
-        signature = hmac.new(
-            self.secret.encode(),  # settings.API_SECRET.encode()
-            msg=auth_payload.encode('utf8'),
-            digestmod=hashlib.sha384
-        ).hexdigest()
+        signature = self._signer.sign(auth_payload)
         data = {
             # docs: http://bit.ly/2CEx9bM
             'event': 'auth',
@@ -244,9 +761,10 @@ class WssClient(BitfinexSocketManager):
         if filters:
             data['filter'] = filters
         payload = json.dumps(data, ensure_ascii=False).encode('utf8')
-        return self._start_socket("auth", payload, callback)
+        return self._start_socket("auth", payload, self._handle_auth_message)
 
-    def subscribe_to_ticker(self, symbol, callback):
+    def subscribe_to_ticker(self, symbol, callback, queue_policy=None,
+                            queue_size=1000, conflate=None):
         """Subscribe to the passed symbol ticks data channel.
 
         Parameters
@@ -257,6 +775,22 @@ class WssClient(BitfinexSocketManager):
         callback : func
             A function to use to handle incomming messages
 
+        queue_policy : Optional str
+            Deliver messages to the callback on a worker thread through a
+            bounded queue, so a slow callback does not hold up other
+            sockets. One of ``delivery.PAUSE``, ``delivery.DROP_OLDEST`` or
+            ``delivery.CONFLATE``. Default: None, the callback runs on the
+            reactor thread.
+
+        queue_size : int
+            Maximum number of queued messages. Default: 1000
+
+        conflate : Optional float
+            Deliver only the latest ticker, at most once every ``conflate``
+            seconds and never faster than the callback handles them. Use 0
+            to deliver as soon as the callback is ready. Implies the
+            ``delivery.CONFLATE`` queue policy. Default: None
+
         Example
         -------
          ::
@@ -283,9 +817,15 @@ class WssClient(BitfinexSocketManager):
             'symbol': symbol,
         }
         payload = json.dumps(data, ensure_ascii=False).encode('utf8')
-        return self._start_socket(id_, payload, callback)
+        queue_interval = 0
+        if conflate is not None:
+            queue_policy, queue_interval = delivery.CONFLATE, conflate
+        return self._start_socket(
+            id_, payload, callback, queue_policy, queue_size, queue_interval
+        )
 
-    def subscribe_to_trades(self, symbol, callback):
+    def subscribe_to_trades(self, symbol, callback, queue_policy=None,
+                            queue_size=1000):
         """Subscribe to the passed symbol trades data channel.
 
         Parameters
@@ -296,6 +836,16 @@ class WssClient(BitfinexSocketManager):
         callback : func
             A function to use to handle incomming messages
 
+        queue_policy : Optional str
+            Deliver messages to the callback on a worker thread through a
+            bounded queue, so a slow callback does not hold up other
+            sockets. One of ``delivery.PAUSE`` or ``delivery.DROP_OLDEST``;
+            ``delivery.CONFLATE`` is refused as it would drop trades.
+            Default: None, the callback runs on the reactor thread.
+
+        queue_size : int
+            Maximum number of queued messages. Default: 1000
+
         Example
         -------
          ::
@@ -322,10 +872,13 @@ class WssClient(BitfinexSocketManager):
             'symbol': symbol,
         }
         payload = json.dumps(data, ensure_ascii=False).encode('utf8')
-        return self._start_socket(id_, payload, callback)
+        if queue_policy == delivery.CONFLATE:
+            raise ValueError("Trade updates can not be conflated")
+        return self._start_socket(id_, payload, callback, queue_policy, queue_size)
 
     # Precision: R0, P0, P1, P2, P3
-    def subscribe_to_orderbook(self, symbol, precision, callback):
+    def subscribe_to_orderbook(self, symbol, precision, callback,
+                               queue_policy=None, queue_size=1000):
         """Subscribe to the orderbook of a given symbol.
 
         Parameters
@@ -339,6 +892,16 @@ class WssClient(BitfinexSocketManager):
         callback : func
             A function to use to handle incomming messages
 
+        queue_policy : Optional str
+            Deliver messages to the callback on a worker thread through a
+            bounded queue, so a slow callback does not hold up other
+            sockets. One of ``delivery.PAUSE`` or ``delivery.DROP_OLDEST``;
+            ``delivery.CONFLATE`` is refused as it would drop book level changes.
+            Default: None, the callback runs on the reactor thread.
+
+        queue_size : int
+            Maximum number of queued messages. Default: 1000
+
         Example
         -------
          ::
@@ -367,9 +930,12 @@ class WssClient(BitfinexSocketManager):
             'symbol': symbol,
         }
         payload = json.dumps(data, ensure_ascii=False).encode('utf8')
-        return self._start_socket(id_, payload, callback)
+        if queue_policy == delivery.CONFLATE:
+            raise ValueError("Book updates can not be conflated")
+        return self._start_socket(id_, payload, callback, queue_policy, queue_size)
 
-    def subscribe_to_candles(self, symbol, timeframe, callback):
+    def subscribe_to_candles(self, symbol, timeframe, callback,
+                             queue_policy=None, queue_size=1000, conflate=None):
         """Subscribe to the passed symbol's OHLC data channel.
 
         Parameters
@@ -384,6 +950,22 @@ class WssClient(BitfinexSocketManager):
         callback : func
             A function to use to handle incomming messages
 
+        queue_policy : Optional str
+            Deliver messages to the callback on a worker thread through a
+            bounded queue, so a slow callback does not hold up other
+            sockets. One of ``delivery.PAUSE``, ``delivery.DROP_OLDEST`` or
+            ``delivery.CONFLATE``. Default: None, the callback runs on the
+            reactor thread.
+
+        queue_size : int
+            Maximum number of queued messages. Default: 1000
+
+        conflate : Optional float
+            Deliver only the latest candle, at most once every ``conflate``
+            seconds and never faster than the callback handles them. Use 0
+            to deliver as soon as the callback is ready. Implies the
+            ``delivery.CONFLATE`` queue policy. Default: None
+
         Returns
         -------
         str
@@ -432,7 +1014,12 @@ class WssClient(BitfinexSocketManager):
             'key': key,
         }
         payload = json.dumps(data, ensure_ascii=False).encode('utf8')
-        return self._start_socket(id_, payload, callback)
+        queue_interval = 0
+        if conflate is not None:
+            queue_policy, queue_interval = delivery.CONFLATE, conflate
+        return self._start_socket(
+            id_, payload, callback, queue_policy, queue_size, queue_interval
+        )
 
     def ping(self, channel="auth"):
         """Ping bitfinex.
@@ -448,8 +1035,7 @@ class WssClient(BitfinexSocketManager):
             'event': 'ping',
             'cid': client_cid
         }
-        payload = json.dumps(data, ensure_ascii=False).encode('utf8')
-        self.factories[channel].protocol_instance.sendMessage(payload, isBinary=False)
+        self._send(data, channel)
         return client_cid
 
     def new_order_op(self, order_type, symbol, amount, price, price_trailing=None,
@@ -553,7 +1139,7 @@ class WssClient(BitfinexSocketManager):
 
     def new_order(self, order_type, symbol, amount, price, price_trailing=None,
                   price_aux_limit=None, price_oco_stop=None, hidden=0,
-                  flags=None, tif=None):
+                  flags=None, tif=None, future=False, timeout=None):
         """
         Create new order.
 
@@ -593,11 +1179,22 @@ class WssClient(BitfinexSocketManager):
 
         tif : datetime string
 
+        future : bool, str
+            Return a future resolved by the matching notification. True (or
+            "thread") returns a ``concurrent.futures.Future``, "asyncio" an
+            ``asyncio.Future`` bound to the event loop of the caller. The
+            future fails with ``correlation.OrderRequestError`` if the
+            request is rejected.
+
+        timeout : Optional float
+            Seconds to wait for the notification before the future fails
+            with a ``TimeoutError``. Default: 30.0
+
         Returns
         -------
         int
             Order client id (cid). The CID is also a mts date stamp of when the
-            order was created.
+            order was created. A future if ``future`` is set.
 
 
         Example
@@ -617,6 +1214,15 @@ class WssClient(BitfinexSocketManager):
                 price=1000.0
             )
 
+            # Wait for the order to be accepted
+            order = my_client.new_order(
+                order_type="LIMIT",
+                symbol="BTCUSD",
+                amount=0.004,
+                price=1000.0,
+                future=True
+            ).result(timeout=10)
+
         """
         operation = self.new_order_op(
             order_type=order_type,
@@ -630,17 +1236,16 @@ class WssClient(BitfinexSocketManager):
             flags=flags,
             tif=tif
         )
-        data = [
-            0,
+        request = self._submit_order_op(
             abbreviations.get_notification_code('order new'),
-            None,
-            operation
-        ]
-        payload = json.dumps(data, ensure_ascii=False).encode('utf8')
-        self.factories["auth"].protocol_instance.sendMessage(payload, isBinary=False)
-        return operation["cid"]
+            operation,
+            correlation.new_order_key(operation["cid"]),
+            future,
+            timeout
+        )
+        return request if future else operation["cid"]
 
-    def multi_order(self, operations):
+    def multi_order(self, operations, future=False, timeout=None):
         """Multi order operation.
 
         Parameters
@@ -651,11 +1256,23 @@ class WssClient(BitfinexSocketManager):
             Hint. you can use the self.new_order_op() for easy new order
             operation creation.
 
+        future : bool, str
+            Return a future for each operation, resolved by its
+            notification. True (or "thread") returns
+            ``concurrent.futures.Future`` objects, "asyncio" ``asyncio.Future``
+            objects bound to the event loop of the caller. A future fails with ``correlation.OrderRequestError`` if the
+            request is rejected.
+
+        timeout : Optional float
+            Seconds to wait for the notification before the future fails
+            with a ``TimeoutError``. Default: 30.0
+
         Returns
         -------
         list
             A list of all the client ids created for each order. Returned in
-            the order they are given to the method.
+            the order they are given to the method. A list of futures (None
+            for operations that can not be tracked) if ``future`` is set.
 
         Example
         -------
@@ -694,11 +1311,17 @@ class WssClient(BitfinexSocketManager):
             None,
             operations
         ]
-        payload = json.dumps(data, ensure_ascii=False).encode('utf8')
-        self.factories["auth"].protocol_instance.sendMessage(payload, isBinary=False)
+        requests = self._send_tracked(
+            lambda: self._send(data),
+            [correlation.operation_key(operation) for operation in operations],
+            future,
+            timeout
+        )
+        if future:
+            return requests
         return [order[1].get("cid", None) for order in operations]
 
-    def cancel_order(self, order_id):
+    def cancel_order(self, order_id, future=False, timeout=None):
         """Cancel order
 
         Parameters
@@ -706,6 +1329,22 @@ class WssClient(BitfinexSocketManager):
         order_id : int, str
             Order id created by Bitfinex
 
+        future : bool, str
+            Return a future resolved by the matching notification. True (or
+            "thread") returns a ``concurrent.futures.Future``, "asyncio" an
+            ``asyncio.Future`` bound to the event loop of the caller. The
+            future fails with ``correlation.OrderRequestError`` if the
+            request is rejected.
+
+        timeout : Optional float
+            Seconds to wait for the notification before the future fails
+            with a ``TimeoutError``. Default: 30.0
+
+        Returns
+        -------
+        None
+            A future if ``future`` is set.
+
         Example
         -------
          ::
@@ -721,19 +1360,18 @@ class WssClient(BitfinexSocketManager):
             )
 
         """
-        data = [
-            0,
+        return self._submit_order_op(
             abbreviations.get_notification_code('order cancel'),
-            None,
             {
                 # docs: http://bit.ly/2BVqwW6
                 'id': order_id
-            }
-        ]
-        payload = json.dumps(data, ensure_ascii=False).encode('utf8')
-        self.factories["auth"].protocol_instance.sendMessage(payload, isBinary=False)
+            },
+            correlation.cancel_order_key(order_id),
+            future,
+            timeout
+        )
 
-    def cancel_order_cid(self, order_cid, order_date):
+    def cancel_order_cid(self, order_cid, order_date, future=False, timeout=None):
         """Cancel order using the client id and the date of the cid. Both are
         returned from the new_order command from this library.
 
@@ -745,6 +1383,21 @@ class WssClient(BitfinexSocketManager):
         order_date : str
             Iso formated order date. e.g. "2012-01-23"
 
+        future : bool, str
+            Return a future resolved by the matching notification. True (or
+            "thread") returns a ``concurrent.futures.Future``, "asyncio" an
+            ``asyncio.Future`` bound to the event loop of the caller. The
+            future fails with ``correlation.OrderRequestError`` if the
+            request is rejected.
+
+        timeout : Optional float
+            Seconds to wait for the notification before the future fails
+            with a ``TimeoutError``. Default: 30.0
+
+        Returns
+        -------
+        None
+            A future if ``future`` is set.
 
         Example
         -------
@@ -768,20 +1421,19 @@ class WssClient(BitfinexSocketManager):
             )
 
         """
-        data = [
-            0,
+        return self._submit_order_op(
             abbreviations.get_notification_code('order cancel'),
-            None,
             {
                 # docs: http://bit.ly/2BVqwW6
                 'cid': order_cid,
                 'cid_date': order_date
-            }
-        ]
-        payload = json.dumps(data, ensure_ascii=False).encode('utf8')
-        self.factories["auth"].protocol_instance.sendMessage(payload, isBinary=False)
+            },
+            correlation.cancel_order_cid_key(order_cid),
+            future,
+            timeout
+        )
 
-    def update_order(self, **order_settings):
+    def update_order(self, future=False, timeout=None, **order_settings):
         """Update order using the order id
 
         Parameters
@@ -809,15 +1461,30 @@ class WssClient(BitfinexSocketManager):
 
         tif : datetime string
             Time-In-Force: datetime for automatic order cancellation (ie. 2020-01-01 10:45:23)
+
+        future : bool, str
+            Return a future resolved by the matching notification. True (or
+            "thread") returns a ``concurrent.futures.Future``, "asyncio" an
+            ``asyncio.Future`` bound to the event loop of the caller. The
+            future fails with ``correlation.OrderRequestError`` if the
+            request is rejected.
+
+        timeout : Optional float
+            Seconds to wait for the notification before the future fails
+            with a ``TimeoutError``. Default: 30.0
+
+        Returns
+        -------
+        None
+            A future if ``future`` is set.
         """
-        data = [
-            0,
+        return self._submit_order_op(
             abbreviations.get_notification_code('order update'),
-            None,
-            order_settings
-        ]
-        payload = json.dumps(data, ensure_ascii=False).encode('utf8')
-        self.factories["auth"].protocol_instance.sendMessage(payload, isBinary=False)
+            order_settings,
+            correlation.update_order_key(order_settings.get("id")),
+            future,
+            timeout
+        )
 
     def calc(self, *calculations):
         """
@@ -868,14 +1535,11 @@ class WssClient(BitfinexSocketManager):
             If the client sends too many concurrent requests (or tries to spam) requests,
             it will receive an error and potentially a disconnection.
             The Websocket server performs a maximum of 8 calculations per second per client.
+            Use ``enable_calc_scheduler`` to deduplicate, batch and pace requests.
 
         """
 
-        data = [
-            0,
-            'calc',
-            None,
-            calculations
-        ]
-        payload = json.dumps(data, ensure_ascii=False).encode('utf8')
-        self.factories["auth"].protocol_instance.sendMessage(payload, isBinary=False)
+        if self._calc_scheduler is not None:
+            self._calc_scheduler.request(*calculations)
+        else:
+            self._send_calc(calculations)
@@ -0,0 +1,200 @@
+"""Correlation of websocket order operations with their notifications"""
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+
+
+class OrderRequestError(Exception):
+    """Raised (set on the future) when Bitfinex rejects an order operation.
+
+    Attributes
+    ----------
+    notification : list
+        The notification array sent by Bitfinex:
+        ``[MTS, TYPE, MESSAGE_ID, null, DATA, CODE, STATUS, TEXT]``
+    """
+
+    def __init__(self, notification):
+        super().__init__(notification[7] if len(notification) > 7 else notification)
+        self.notification = notification
+
+
+class OrderNotSentError(ConnectionError):
+    """Raised (set on the future) when an order operation is dropped
+    instead of being sent, e.g. because the authenticated socket
+    disconnected before it could be sent."""
+
+
+def new_order_key(cid):
+    """Key of a new order request"""
+    return ("on-req", cid)
+
+
+def cancel_order_key(order_id):
+    """Key of a cancel order request by id"""
+    return ("oc-req", order_id)
+
+
+def cancel_order_cid_key(cid):
+    """Key of a cancel order request by client order id"""
+    return ("oc-req-cid", cid)
+
+
+def update_order_key(order_id):
+    """Key of an update order request"""
+    return ("ou-req", order_id)
+
+
+def operation_key(operation):
+    """Returns the key of a multi order operation (e.g. ``["on", {...}]``),
+    or None for operations that can not be correlated."""
+    op_type, params = operation
+    if op_type == "on":
+        return new_order_key(params.get("cid"))
+    if op_type == "oc":
+        if "id" in params:
+            return cancel_order_key(params["id"])
+        return cancel_order_cid_key(params.get("cid"))
+    if op_type == "ou":
+        return update_order_key(params.get("id"))
+    return None
+
+
+def request_keys(data):
+    """Returns the keys of the requests in an outgoing order message
+    (e.g. ``[0, "on", None, {...}]``)"""
+    if data[1] == "ox_multi":
+        keys = [operation_key(operation) for operation in data[3]]
+    else:
+        keys = [operation_key((data[1], data[3]))]
+    return [key for key in keys if key is not None]
+
+
+def _notification_keys(notification):
+    """Keys that a notification may resolve"""
+    request_type, data = notification[1], notification[4]
+    if not isinstance(data, list) or len(data) < 3:
+        return []
+    if request_type == "on-req":
+        return [new_order_key(data[2])]
+    if request_type == "oc-req":
+        return [cancel_order_key(data[0]), cancel_order_cid_key(data[2])]
+    if request_type == "ou-req":
+        return [update_order_key(data[0])]
+    return []
+
+
+class RequestTracker:
+    """Keeps the futures of pending order operations and resolves them when
+    the matching notification (``n`` message) arrives on the authenticated
+    channel. Futures resolve with the order array of the notification, fail
+    with ``OrderRequestError`` when the request is rejected and with
+    ``TimeoutError`` when no notification arrives in time.
+
+    Parameters
+    ----------
+    timeout : float
+        Default number of seconds to wait for a notification. Default: 30.0
+    """
+
+    def __init__(self, timeout=30.0):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._deadlines = []
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def register(self, key, timeout=None):
+        """Create a future for a request that is about to be sent.
+
+        Parameters
+        ----------
+        key : tuple
+            Request key, e.g. ``new_order_key(cid)``.
+
+        timeout : Optional float
+            Seconds to wait for the notification.
+
+        Returns
+        -------
+        concurrent.futures.Future
+        """
+        future = Future()
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        with self._lock:
+            self._pending.setdefault(key, []).append((deadline, future))
+            heapq.heappush(self._deadlines, (deadline, next(self._counter), key))
+        self.expire()
+        return future
+
+    def on_message(self, message):
+        """Resolve the futures matching a notification message
+        (``[0, "n", [...]]``). Other messages are ignored."""
+        if isinstance(message, list) and len(message) > 2 and message[1] == "n":
+            self._resolve(message[2])
+        self.expire()
+
+    def _resolve(self, notification):
+        if notification[1] == "ox_multi-req" and isinstance(notification[4], list):
+            for nested in notification[4]:
+                if isinstance(nested, list) and len(nested) > 4:
+                    self._resolve(nested)
+        for key in _notification_keys(notification):
+            with self._lock:
+                waiting = self._pending.get(key)
+                if not waiting:
+                    continue
+                _, future = waiting.pop(0)
+                if not waiting:
+                    del self._pending[key]
+            if future.done():
+                # Cancelled by the caller
+                return
+            if notification[6] == "SUCCESS":
+                future.set_result(notification[4])
+            else:
+                future.set_exception(OrderRequestError(notification))
+            return
+
+    def discard(self, key, future):
+        """Forget the future of a request that was not sent after all"""
+        with self._lock:
+            waiting = self._pending.get(key, [])
+            waiting[:] = [item for item in waiting if item[1] is not future]
+            if not waiting:
+                self._pending.pop(key, None)
+
+    def fail(self, key, exception):
+        """Fail the oldest pending future of a request with an exception"""
+        with self._lock:
+            waiting = self._pending.get(key)
+            if not waiting:
+                return
+            _, future = waiting.pop(0)
+            if not waiting:
+                del self._pending[key]
+        if not future.done():
+            future.set_exception(exception)
+
+    def expire(self, now=None):
+        """Fail the futures of requests that passed their deadline"""
+        now = time.monotonic() if now is None else now
+        expired = []
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _, _, key = heapq.heappop(self._deadlines)
+                waiting = self._pending.get(key)
+                if waiting is None:
+                    continue
+                expired.extend(future for deadline, future in waiting if deadline <= now)
+                waiting[:] = [item for item in waiting if item[0] > now]
+                if not waiting:
+                    del self._pending[key]
+        for future in expired:
+            if not future.done():
+                future.set_exception(TimeoutError("No notification received in time"))
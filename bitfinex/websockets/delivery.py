@@ -0,0 +1,178 @@
+"""Bounded queues used to deliver websocket messages on worker threads"""
+import logging
+import threading
+import time
+from collections import deque
+
+LOGGER = logging.getLogger(__name__)
+
+PAUSE = "pause"
+"""Never drop messages: when the queue is full, ``on_full`` is called (the
+client pauses reading the socket of the subscription) and ``on_drain``
+once the queue is half empty again. ``put`` never waits."""
+
+DROP_OLDEST = "drop_oldest"
+"""Drop the oldest queued message to make room for the new one."""
+
+CONFLATE = "conflate"
+"""Keep only the latest data message. Suited for tickers and candles."""
+
+POLICIES = (PAUSE, DROP_OLDEST, CONFLATE)
+
+
+def _is_heartbeat(message):
+    return isinstance(message, list) and len(message) > 1 and message[1] == "hb"
+
+
+def _is_conflatable(message):
+    """True for channel updates. Events (dicts) and snapshots (lists of
+    lists) are never replaced by a newer message."""
+    if not isinstance(message, list) or len(message) < 2:
+        return False
+    data = message[-1]
+    if not isinstance(data, list):
+        return False
+    return not (data and isinstance(data[0], list))
+
+
+class DeliveryQueue:
+    """Delivers messages to a callback on a dedicated worker thread, through
+    a bounded queue, so a slow callback does not hold up the reactor.
+
+    Parameters
+    ----------
+    callback : func
+        Called with each delivered message, on the worker thread.
+
+    maxsize : int
+        Maximum number of queued messages. Default: 1000
+
+    policy : str
+        What to do with a new message when the queue is full, one of
+        ``PAUSE``, ``DROP_OLDEST`` or ``CONFLATE``. With ``CONFLATE`` a new
+        update replaces the queued update, whether the queue is full or
+        not, so only the latest one is delivered. Events and snapshots are
+        always delivered. Default: DROP_OLDEST
+
+    min_interval : float
+        Minimum number of seconds between two deliveries. Combined with
+        ``CONFLATE``, the latest update is delivered at most once per
+        interval. Default: 0
+
+    name : Optional str
+        Name of the worker thread.
+
+    on_full : Optional func
+        With ``PAUSE``, called when the queue becomes full. Messages put
+        while it is full are still queued, the producer has to stop.
+
+    on_drain : Optional func
+        With ``PAUSE``, called on the worker thread when the queue is half
+        empty again after ``on_full``.
+
+    Attributes
+    ----------
+    delivered : int
+        Number of messages passed to the callback.
+
+    dropped : int
+        Number of messages dropped or replaced by a newer one.
+
+    max_depth : int
+        Highest number of queued messages so far.
+    """
+
+    def __init__(self, callback, maxsize=1000, policy=DROP_OLDEST,
+                 min_interval=0, name=None, on_full=None, on_drain=None):
+        if policy not in POLICIES:
+            raise ValueError("policy must be one of %s" % (POLICIES,))
+        self.callback = callback
+        self.policy = policy
+        self.maxsize = maxsize
+        self.min_interval = min_interval
+        self.delivered = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.on_full = on_full
+        self.on_drain = on_drain
+        self.paused = False
+        self._queue = deque()
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def depth(self):
+        """Number of queued messages"""
+        return len(self._queue)
+
+    def put(self, message):
+        """Queue a message for delivery. Never waits, so it is safe to call
+        from the reactor thread."""
+        full = False
+        with self._condition:
+            if self.policy == CONFLATE and self._queue:
+                if _is_heartbeat(message):
+                    # Keep the pending data, the heartbeat carries none
+                    self.dropped += 1
+                    return
+                if _is_conflatable(message) and _is_conflatable(self._queue[-1]):
+                    self._queue.pop()
+                    self.dropped += 1
+            if self._closed:
+                return
+            if len(self._queue) >= self.maxsize and self.policy != PAUSE:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(message)
+            self.max_depth = max(self.max_depth, len(self._queue))
+            if self.policy == PAUSE and not self.paused \
+                    and len(self._queue) >= self.maxsize:
+                self.paused = full = True
+            self._condition.notify_all()
+        # Called without the lock, the handler may put messages itself
+        if full and self.on_full is not None:
+            self.on_full()
+
+    __call__ = put
+
+    def close(self, timeout=None):
+        """Stop the worker thread once the queued messages are delivered"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def _next(self, not_before):
+        with self._condition:
+            # Messages arriving during the interval are conflated
+            delay = not_before - time.monotonic()
+            while delay > 0 and not self._closed:
+                self._condition.wait(delay)
+                delay = not_before - time.monotonic()
+            while not self._queue:
+                if self._closed:
+                    return None, False
+                self._condition.wait()
+            message = self._queue.popleft()
+            drained = self.paused and len(self._queue) <= self.maxsize // 2
+            if drained:
+                self.paused = False
+        if drained and self.on_drain is not None:
+            self.on_drain()
+        return message, True
+
+    def _run(self):
+        not_before = 0
+        while True:
+            message, ok = self._next(not_before)
+            if not ok:
+                return
+            not_before = time.monotonic() + self.min_interval
+            try:
+                self.callback(message)
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("Error in callback of %s", self._thread.name)
+            self.delivered += 1
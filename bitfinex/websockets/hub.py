@@ -0,0 +1,313 @@
+"""Fan-out of websocket market data to local processes through a memory
+mapped ring buffer"""
+import time
+
+import numpy as np
+
+from bitfinex import utils
+
+TICKER = 1
+TRADE = 2
+BOOK = 3
+CANDLE = 4
+
+VALUES = 10
+"""Number of values per record"""
+
+MAX_SYMBOLS = 1024
+
+MAGIC = b"BFXHUB1"
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("capacity", "<u8"),
+    ("write_seq", "<u8"),
+    ("symbol_count", "<u8"),
+    ("symbols", "S16", (MAX_SYMBOLS,)),
+], align=True)
+
+RECORD_DTYPE = np.dtype([
+    ("seq", "<u8"),
+    ("mts", "<i8"),
+    ("kind", "u1"),
+    ("symbol", "<u2"),
+    ("values", "<f8", (VALUES,)),
+], align=True)
+"""Layout of a record. The values depend on the kind of record:
+
+- ``TICKER``: BID, BID_SIZE, ASK, ASK_SIZE, DAILY_CHANGE, DAILY_CHANGE_PERC,
+  LAST_PRICE, VOLUME, HIGH, LOW
+- ``TRADE``: ID, AMOUNT, PRICE
+- ``BOOK``: PRICE, COUNT, AMOUNT
+- ``CANDLE``: OPEN, CLOSE, HIGH, LOW, VOLUME
+"""
+
+
+def _now_mts():
+    return int(time.time() * 1000)
+
+
+class MarketDataHub:
+    """Publishes parsed market data into a ring buffer in a memory mapped
+    file, which any number of local processes read with ``HubReader``.
+
+    One process owns the websocket subscriptions and the hub, the other
+    processes read the records without opening connections or parsing
+    JSON. Put the file on a memory backed file system (e.g. ``/dev/shm``)
+    to avoid disk writes.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file backing the ring buffer. It is created or
+        overwritten.
+
+    capacity : int
+        Number of records in the ring buffer. Readers that fall more than
+        ``capacity`` records behind lose records. Default: 65536
+
+    Example
+    -------
+     ::
+
+        # In the process owning the sockets
+        hub = MarketDataHub("/dev/shm/bitfinex-hub")
+        my_client = WssClient()
+        hub.subscribe_to_ticker(my_client, "BTCUSD")
+        hub.subscribe_to_trades(my_client, "BTCUSD")
+        my_client.start()
+
+        # In each strategy process
+        reader = HubReader("/dev/shm/bitfinex-hub")
+        while True:
+            for records in reader.poll():
+                process(records)
+
+    """
+
+    def __init__(self, path, capacity=65536):
+        self.path = path
+        self.capacity = capacity
+        size = HEADER_DTYPE.itemsize + RECORD_DTYPE.itemsize * capacity
+        with open(path, "wb") as file_:
+            file_.truncate(size)
+        self._header = np.memmap(path, dtype=HEADER_DTYPE, mode="r+", shape=(1,))
+        self._ring = np.memmap(
+            path, dtype=RECORD_DTYPE, mode="r+", offset=HEADER_DTYPE.itemsize,
+            shape=(capacity,)
+        )
+        self._header["capacity"] = capacity
+        self._header["magic"] = MAGIC
+        # Plain ndarray column views, writing to them is much faster than
+        # writing to memmap records
+        ring = self._ring.view(np.ndarray)
+        self._seqs = ring["seq"]
+        self._mts = ring["mts"]
+        self._kinds = ring["kind"]
+        self._symbol_indexes = ring["symbol"]
+        self._values = ring["values"]
+        self._write_seq = self._header.view(np.ndarray)["write_seq"]
+        self._symbols = {}
+        self._seq = 0
+
+    def symbol_index(self, symbol):
+        """Returns the index of a symbol in the symbol table of the hub"""
+        index = self._symbols.get(symbol)
+        if index is None:
+            index = len(self._symbols)
+            if index >= MAX_SYMBOLS:
+                raise ValueError("The hub holds at most %s symbols" % MAX_SYMBOLS)
+            self._header["symbols"][0, index] = symbol.encode("ascii")
+            self._header["symbol_count"] = index + 1
+            self._symbols[symbol] = index
+        return index
+
+    def publish(self, kind, symbol, mts, values):
+        """Write a record to the ring buffer.
+
+        Parameters
+        ----------
+        kind : int
+            One of ``TICKER``, ``TRADE``, ``BOOK`` or ``CANDLE``.
+
+        symbol : str
+            Symbol of the record, e.g. "tBTCUSD".
+
+        mts : int
+            Millisecond timestamp.
+
+        values : list
+            Up to ``VALUES`` numbers, see ``RECORD_DTYPE``.
+        """
+        self._seq += 1
+        slot = self._seq % self.capacity
+        # The slot is marked as being written, readers that see a sequence
+        # number other than the one they expect know it was overwritten.
+        self._seqs[slot] = 0
+        self._mts[slot] = mts
+        self._kinds[slot] = kind
+        self._symbol_indexes[slot] = self.symbol_index(symbol)
+        record_values = self._values[slot]
+        record_values[:] = np.nan
+        record_values[:len(values)] = values
+        self._seqs[slot] = self._seq
+        self._write_seq[0] = self._seq
+
+    # Websocket callbacks
+
+    def ticker_callback(self, symbol):
+        """Returns a ticker channel callback publishing to the hub"""
+        symbol = utils.order_symbol(symbol)
+
+        def callback(message):
+            if isinstance(message, list) and isinstance(message[1], list):
+                self.publish(TICKER, symbol, _now_mts(), message[1][:VALUES])
+        return callback
+
+    def trades_callback(self, symbol):
+        """Returns a trades channel callback publishing executed trades
+        (``te``) to the hub"""
+        symbol = utils.order_symbol(symbol)
+
+        def callback(message):
+            if isinstance(message, list) and message[1] == "te":
+                trade_id, mts, amount, price = message[2][:4]
+                self.publish(TRADE, symbol, mts, (trade_id, amount, price))
+        return callback
+
+    def orderbook_callback(self, symbol):
+        """Returns an order book channel callback publishing each price
+        level to the hub"""
+        symbol = utils.order_symbol(symbol)
+
+        def callback(message):
+            if not isinstance(message, list) or not isinstance(message[1], list):
+                return
+            mts = _now_mts()
+            levels = message[1]
+            if levels and not isinstance(levels[0], list):
+                levels = [levels]
+            for level in levels:
+                self.publish(BOOK, symbol, mts, level[:3])
+        return callback
+
+    def candles_callback(self, symbol):
+        """Returns a candles channel callback publishing each candle to the
+        hub"""
+        symbol = utils.order_symbol(symbol)
+
+        def callback(message):
+            if not isinstance(message, list) or not isinstance(message[1], list):
+                return
+            candles = message[1]
+            if candles and not isinstance(candles[0], list):
+                candles = [candles]
+            # Snapshots are sent newest first
+            for candle in reversed(candles):
+                self.publish(CANDLE, symbol, candle[0], candle[1:6])
+        return callback
+
+    def subscribe_to_ticker(self, client, symbol):
+        """Subscribe a ``WssClient`` to a ticker and publish it to the hub"""
+        return client.subscribe_to_ticker(symbol, self.ticker_callback(symbol))
+
+    def subscribe_to_trades(self, client, symbol):
+        """Subscribe a ``WssClient`` to trades and publish them to the hub"""
+        return client.subscribe_to_trades(symbol, self.trades_callback(symbol))
+
+    def subscribe_to_orderbook(self, client, symbol, precision):
+        """Subscribe a ``WssClient`` to an order book and publish it to the
+        hub"""
+        return client.subscribe_to_orderbook(
+            symbol, precision, self.orderbook_callback(symbol)
+        )
+
+    def subscribe_to_candles(self, client, symbol, timeframe):
+        """Subscribe a ``WssClient`` to candles and publish them to the hub"""
+        return client.subscribe_to_candles(
+            symbol, timeframe, self.candles_callback(symbol)
+        )
+
+
+class HubReader:
+    """Reads the records published by a ``MarketDataHub`` in another
+    process.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file backing the ring buffer.
+
+    from_start : bool
+        Read the records still in the ring buffer, instead of only the ones
+        published from now on. Default: False
+
+    Attributes
+    ----------
+    lost : int
+        Number of records overwritten before they could be read.
+    """
+
+    def __init__(self, path, from_start=False):
+        self._header = np.memmap(path, dtype=HEADER_DTYPE, mode="r", shape=(1,))
+        if self._header["magic"][0] != MAGIC:
+            raise ValueError("%s is not a market data hub" % path)
+        self.capacity = int(self._header["capacity"][0])
+        self._ring = np.memmap(
+            path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_DTYPE.itemsize,
+            shape=(self.capacity,)
+        ).view(np.ndarray)
+        write_seq = int(self._header["write_seq"][0])
+        self._seq = max(0, write_seq - self.capacity) if from_start else write_seq
+        self._symbols = []
+        self.lost = 0
+
+    def symbol(self, index):
+        """Returns the symbol of a record's symbol index"""
+        if index >= len(self._symbols):
+            count = int(self._header["symbol_count"][0])
+            self._symbols = [
+                symbol.decode("ascii") for symbol in self._header["symbols"][0, :count]
+            ]
+        return self._symbols[index]
+
+    def poll(self):
+        """Returns the records published since the last call.
+
+        Returns
+        -------
+        list
+            Zero, one or two arrays of ``RECORD_DTYPE`` records, in the order
+            they were published. The arrays are copies, records the hub
+            overwrote before they were copied are left out and counted in
+            ``lost``.
+        """
+        write_seq = int(self._header["write_seq"][0])
+        first = self._seq + 1
+        if write_seq < first:
+            return []
+        if write_seq - first >= self.capacity:
+            lost = write_seq - self.capacity + 1 - first
+            self.lost += lost
+            first += lost
+        start, stop = first % self.capacity, write_seq % self.capacity
+        if start <= stop:
+            views = [self._ring[start:stop + 1]]
+        else:
+            views = [self._ring[start:], self._ring[:stop + 1]]
+        self._seq = write_seq
+        chunks = []
+        for view in views:
+            chunk = view.copy()
+            expected = np.arange(first, first + len(chunk), dtype=chunk["seq"].dtype)
+            first += len(chunk)
+            # A record is valid if it had the expected sequence number both
+            # before and after it was copied: the hub zeroes it while it
+            # rewrites the slot, and the writer may lap us mid-chunk.
+            valid = (chunk["seq"] == expected) & (view["seq"] == expected)
+            if not valid.all():
+                self.lost += int(np.count_nonzero(~valid))
+                chunk = chunk[valid]
+            if len(chunk):
+                chunks.append(chunk)
+        return chunks
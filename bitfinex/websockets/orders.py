@@ -0,0 +1,245 @@
+"""In memory order state maintained from the authenticated websocket channel"""
+import threading
+from collections import deque
+
+# Order states
+PENDING = "PENDING"
+ACTIVE = "ACTIVE"
+PARTIALLY_FILLED = "PARTIALLY FILLED"
+EXECUTED = "EXECUTED"
+CANCELED = "CANCELED"
+REJECTED = "REJECTED"
+
+OPEN_STATES = frozenset([PENDING, ACTIVE, PARTIALLY_FILLED])
+"""States of orders that are still resting on the exchange"""
+
+
+def parse_order_state(status):
+    """Convert an order status string to an order state.
+
+    Parameters
+    ----------
+    status : str
+        Order status as sent by Bitfinex, e.g. "ACTIVE",
+        "PARTIALLY FILLED @ 107.6(-0.2)" or "EXECUTED @ 107.6(-0.2): was
+        PARTIALLY FILLED @ 107.6(-0.1)".
+
+    Returns
+    -------
+    str
+        One of the order states defined in this module.
+    """
+    status = (status or "").upper()
+    if status.startswith(ACTIVE):
+        return ACTIVE
+    if status.startswith(EXECUTED):
+        return EXECUTED
+    if status.startswith(PARTIALLY_FILLED):
+        return PARTIALLY_FILLED
+    if CANCELED in status:
+        return CANCELED
+    return REJECTED
+
+
+class Order:
+    """An order as sent over the authenticated channel.
+
+    Attributes mirror the fields of the order arrays documented here:
+    https://docs.bitfinex.com/v2/reference#ws-auth-orders
+    """
+
+    __slots__ = (
+        "id", "gid", "cid", "symbol", "mts_create", "mts_update", "amount",
+        "amount_orig", "type", "flags", "status", "price", "price_avg",
+        "state",
+    )
+
+    def __init__(self, data, state=None):
+        self.update(data, state)
+
+    def update(self, data, state=None):
+        """Update the order from an order array"""
+        (self.id, self.gid, self.cid, self.symbol, self.mts_create,
+         self.mts_update, self.amount, self.amount_orig, self.type) = data[:9]
+        self.flags = data[12]
+        self.status = data[13]
+        self.price = data[16]
+        self.price_avg = data[17]
+        self.state = state or parse_order_state(self.status)
+
+    @property
+    def is_open(self):
+        """True while the order is resting on the exchange"""
+        return self.state in OPEN_STATES
+
+    def __repr__(self):
+        return "Order(id={}, cid={}, symbol={}, amount={}, price={}, state={})".format(
+            self.id, self.cid, self.symbol, self.amount, self.price, self.state
+        )
+
+
+class OrderManager:
+    """Tracks every order of the account through its lifecycle from the
+    ``os``, ``on``, ``ou``, ``oc`` and ``n`` messages of the authenticated
+    channel. Orders are indexed by id, cid and symbol, so open orders can be
+    looked up without any REST calls.
+
+    Parameters
+    ----------
+    max_closed : int
+        Number of closed (executed, canceled or rejected) orders to keep in
+        memory. Default: 10000
+
+    Example
+    -------
+     ::
+
+        order_manager = OrderManager()
+        my_client = WssClient(key, secret)
+        order_manager.attach(my_client)
+        my_client.authenticate(print)
+        my_client.start()
+
+        order_manager.open_orders("tBTCUSD")
+        order_manager.get_by_cid(cid)
+
+    """
+
+    def __init__(self, max_closed=10000):
+        self.max_closed = max_closed
+        self._lock = threading.RLock()
+        self._by_id = {}
+        self._by_cid = {}
+        self._open = {}
+        self._open_by_symbol = {}
+        self._closed = deque()
+
+    def attach(self, client):
+        """Register the handlers of the manager on a ``WssClient`` as
+        listeners (see ``WssClient.add_auth_listener``), so the messages are
+        still passed to the ``authenticate`` callback.
+
+        Parameters
+        ----------
+        client : WssClient
+            The client used for the authenticated channel.
+        """
+        client.add_auth_listener("os", self.on_snapshot)
+        client.add_auth_listener("on", self.on_order)
+        client.add_auth_listener("ou", self.on_order)
+        client.add_auth_listener("oc", self.on_order_close)
+        client.add_auth_listener("n", self.on_notification)
+
+    # Message handlers
+
+    def on_snapshot(self, message):
+        """Handle an order snapshot (``os``) message. Open orders missing
+        from the snapshot are no longer open."""
+        with self._lock:
+            for order in list(self._open.values()):
+                order.state = CANCELED
+                self._close(order)
+            for data in message[2]:
+                self._apply(data)
+
+    def on_order(self, message):
+        """Handle new order (``on``) and order update (``ou``) messages"""
+        with self._lock:
+            self._apply(message[2])
+
+    def on_order_close(self, message):
+        """Handle order cancel (``oc``) messages, sent when an order is
+        either executed or canceled."""
+        with self._lock:
+            order = self._apply(message[2])
+            if order.is_open:
+                # Closed orders are either executed or canceled.
+                order.state = CANCELED
+                self._close(order)
+
+    def on_notification(self, message):
+        """Handle order request notifications (``n``). Rejected new orders
+        are recorded with the ``REJECTED`` state, accepted new orders are
+        recorded as ``PENDING`` until their ``on`` message arrives."""
+        notification = message[2]
+        if notification[1] != "on-req" or not isinstance(notification[4], list):
+            return
+        data = notification[4]
+        with self._lock:
+            if notification[6] == "SUCCESS":
+                if data[0] not in self._by_id:
+                    self._apply(data, PENDING)
+            else:
+                self._apply(data, REJECTED)
+
+    # Queries
+
+    def get(self, order_id):
+        """Returns the order with the given id or None"""
+        return self._by_id.get(order_id)
+
+    def get_by_cid(self, cid):
+        """Returns the order with the given client order id or None"""
+        return self._by_cid.get(cid)
+
+    def is_open(self, order_id):
+        """True if the order with the given id is open"""
+        return order_id in self._open
+
+    def open_orders(self, symbol=None):
+        """Returns a list of open orders, optionally for a single symbol"""
+        with self._lock:
+            if symbol is None:
+                return list(self._open.values())
+            return list(self._open_by_symbol.get(symbol, {}).values())
+
+    def open_count(self, symbol=None):
+        """Returns the number of open orders, optionally for a single symbol"""
+        if symbol is None:
+            return len(self._open)
+        return len(self._open_by_symbol.get(symbol, ()))
+
+    # Internals. Must be called with the lock held.
+
+    def _apply(self, data, state=None):
+        order = self._by_id.get(data[0]) if data[0] is not None else None
+        if order is None and data[2] is not None:
+            order = self._by_cid.get(data[2])
+        if order is None:
+            was_closed = False
+            order = Order(data, state)
+        else:
+            was_closed = not order.is_open
+            if order.id != data[0]:
+                self._by_id.pop(order.id, None)
+            order.update(data, state)
+        if order.id is not None:
+            self._by_id[order.id] = order
+        if order.cid is not None:
+            self._by_cid[order.cid] = order
+        if order.is_open:
+            self._open[order.id] = order
+            self._open_by_symbol.setdefault(order.symbol, {})[order.id] = order
+        elif not was_closed:
+            self._close(order)
+        return order
+
+    def _remove_open(self, order):
+        if self._open.pop(order.id, None) is not None:
+            symbol_orders = self._open_by_symbol[order.symbol]
+            del symbol_orders[order.id]
+            if not symbol_orders:
+                del self._open_by_symbol[order.symbol]
+
+    def _close(self, order):
+        self._remove_open(order)
+        self._closed.append(order)
+        while len(self._closed) > self.max_closed:
+            closed = self._closed.popleft()
+            if closed.is_open:
+                # Reopened by a later snapshot
+                continue
+            if self._by_id.get(closed.id) is closed:
+                del self._by_id[closed.id]
+            if self._by_cid.get(closed.cid) is closed:
+                del self._by_cid[closed.cid]
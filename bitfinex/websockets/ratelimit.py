@@ -0,0 +1,303 @@
+"""Send side rate limiting of websocket messages"""
+import threading
+import time
+from collections import Counter, deque
+
+CANCEL = "cancel"
+ORDER = "order"
+CALC = "calc"
+PING = "ping"
+OTHER = "other"
+
+PRIORITIES = (CANCEL, ORDER, CALC, PING, OTHER)
+"""Message classes, highest priority first. Cancels are always sent before
+new orders."""
+
+DEFAULT_BUDGETS = {
+    CANCEL: (50.0, 50),
+    ORDER: (30.0, 30),
+    CALC: (8.0, 8),
+    PING: (1.0, 5),
+    OTHER: (10.0, 10),
+}
+"""Default budgets of each message class as (messages per second, burst)"""
+
+ALL_ORDERS = "all"
+"""Targets of a message that affects every order, see ``order_targets``"""
+
+
+class SendQueueFull(Exception):
+    """Raised when a message is submitted while the send queue is full"""
+    pass
+
+
+def classify(data):
+    """Returns the message class of an outgoing message.
+
+    Parameters
+    ----------
+    data : list, dict
+        The message before serialization.
+
+    Returns
+    -------
+    str
+        One of ``CANCEL``, ``ORDER``, ``CALC``, ``PING`` or ``OTHER``.
+    """
+    if isinstance(data, dict):
+        return PING if data.get("event") == "ping" else OTHER
+    code = data[1]
+    if code in ("oc", "oc_multi"):
+        return CANCEL
+    if code == "ox_multi":
+        if all(operation[0] in ("oc", "oc_multi") for operation in data[3]):
+            return CANCEL
+        return ORDER
+    if code in ("on", "ou"):
+        return ORDER
+    if code == "calc":
+        return CALC
+    return OTHER
+
+
+def _operation_targets(code, params):
+    if code == "on":
+        return {("cid", params.get("cid"))}
+    if code in ("ou", "oc"):
+        if "id" in params:
+            return {("id", params["id"])}
+        return {("cid", params.get("cid"))}
+    if code == "oc_multi":
+        if "gid" in params or "all" in params:
+            return ALL_ORDERS
+        return set(("id", order_id) for order_id in params.get("id", ())) | set(
+            ("cid", cid[0]) for cid in params.get("cid", ()))
+    return set()
+
+
+def order_targets(data):
+    """Returns the orders an outgoing message creates, updates or cancels.
+
+    Parameters
+    ----------
+    data : list, dict
+        The message before serialization.
+
+    Returns
+    -------
+    set, str
+        ``("id", order_id)`` and ``("cid", cid)`` tuples, or ``ALL_ORDERS``
+        for cancels by group or of all orders.
+    """
+    if not isinstance(data, list) or len(data) < 4:
+        return set()
+    if data[1] == "ox_multi":
+        targets = set()
+        for code, params in data[3]:
+            operation = _operation_targets(code, params)
+            if operation == ALL_ORDERS:
+                return ALL_ORDERS
+            targets |= operation
+        return targets
+    return _operation_targets(data[1], data[3])
+
+
+class TokenBucket:
+    """Token bucket refilled at ``rate`` tokens per second, holding at most
+    ``burst`` tokens.
+
+    Parameters
+    ----------
+    rate : float
+        Tokens added per second.
+
+    burst : int
+        Size of the bucket.
+    """
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = burst
+        self.clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def consume(self, tokens=1):
+        """Take tokens from the bucket. Returns False if there are not
+        enough tokens."""
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def delay(self, tokens=1):
+        """Seconds until the given number of tokens are available"""
+        self._refill()
+        return max(0.0, (tokens - self._tokens) / self.rate)
+
+
+class SendGovernor:
+    """Schedules outgoing messages within a budget per message class.
+
+    Messages are sent immediately while their class has budget left, and
+    are queued otherwise. Queued messages are sent by priority (see
+    ``PRIORITIES``) as soon as their budget allows it, except that a cancel
+    targeting an order whose new order or update is still queued waits
+    behind it, so that it never reaches the exchange first.
+
+    Parameters
+    ----------
+    send : func
+        Called with each message that may be sent.
+
+    schedule : func
+        Called as ``schedule(delay, func)`` to run ``func`` after ``delay``
+        seconds.
+
+    budgets : Optional dict
+        Maps message classes to (messages per second, burst). Missing
+        classes use ``DEFAULT_BUDGETS``.
+
+    max_queued : int
+        Maximum number of queued messages. ``submit`` raises
+        ``SendQueueFull`` beyond it. Default: 1000
+
+    high_watermark : Optional int
+        Number of queued messages above which the governor is congested.
+        Default: half of ``max_queued``
+
+    on_backpressure : Optional func
+        Called with True when the governor becomes congested, and with False
+        when the queue drained below the watermark again. Called without
+        the lock of the governor held.
+    """
+
+    def __init__(self, send, schedule, budgets=None, max_queued=1000,
+                 high_watermark=None, on_backpressure=None, clock=time.monotonic):
+        self.send = send
+        self.schedule = schedule
+        self.max_queued = max_queued
+        self.high_watermark = max_queued // 2 if high_watermark is None else high_watermark
+        self.on_backpressure = on_backpressure
+        budgets = dict(DEFAULT_BUDGETS, **(budgets or {}))
+        self._buckets = {
+            message_class: TokenBucket(rate, burst, clock)
+            for message_class, (rate, burst) in budgets.items()
+        }
+        # Queued (message class, message, targets) entries
+        self._queues = {message_class: deque() for message_class in PRIORITIES}
+        self._order_targets = Counter()
+        self._queued = 0
+        self._congested = False
+        self._scheduled = False
+        self._lock = threading.RLock()
+
+    @property
+    def queued(self):
+        """Number of queued messages"""
+        return self._queued
+
+    @property
+    def congested(self):
+        """True while more than ``high_watermark`` messages are queued"""
+        return self._congested
+
+    def submit(self, message_class, message, targets=()):
+        """Send a message if the budget of its class allows it, queue it
+        otherwise.
+
+        Parameters
+        ----------
+        message_class : str
+            One of ``PRIORITIES``, see ``classify``.
+
+        message : object
+            Passed on to ``send``.
+
+        targets : set, str
+            Orders affected by the message, see ``order_targets``.
+
+        Returns
+        -------
+        bool
+            True if the message was sent immediately.
+        """
+        with self._lock:
+            queue = self._queues[message_class]
+            if message_class == CANCEL and self._waits_for_orders(targets):
+                # Keep the cancel behind the order operations it targets
+                queue = self._queues[ORDER]
+            if not queue and self._buckets[message_class].consume():
+                send_now = True
+            else:
+                if self._queued >= self.max_queued:
+                    raise SendQueueFull("%s messages are waiting to be sent" % self._queued)
+                send_now = False
+                queue.append((message_class, message, targets))
+                if queue is self._queues[ORDER] and targets != ALL_ORDERS:
+                    self._order_targets.update(targets)
+                self._queued += 1
+                backpressure = self._update_backpressure()
+                self._schedule_drain()
+        if send_now:
+            self.send(message)
+        else:
+            self._notify(backpressure)
+        return send_now
+
+    def _waits_for_orders(self, targets):
+        if not self._queues[ORDER]:
+            return False
+        if targets == ALL_ORDERS:
+            return True
+        return any(self._order_targets[target] for target in targets)
+
+    def drain(self):
+        """Send queued messages within their budget, by priority"""
+        ready = []
+        with self._lock:
+            self._scheduled = False
+            for message_class in PRIORITIES:
+                queue = self._queues[message_class]
+                while queue and self._buckets[queue[0][0]].consume():
+                    _, message, targets = queue.popleft()
+                    if message_class == ORDER and targets != ALL_ORDERS:
+                        self._order_targets.subtract(targets)
+                    ready.append(message)
+            self._order_targets += Counter()
+            self._queued -= len(ready)
+            backpressure = self._update_backpressure()
+            self._schedule_drain()
+        for message in ready:
+            self.send(message)
+        self._notify(backpressure)
+
+    def _schedule_drain(self):
+        """Schedule the next drain. Must be called with the lock held."""
+        if self._scheduled or not self._queued:
+            return
+        delay = min(
+            self._buckets[queue[0][0]].delay()
+            for queue in self._queues.values() if queue
+        )
+        self._scheduled = True
+        self.schedule(delay, self.drain)
+
+    def _update_backpressure(self):
+        """Returns the new congestion state when it changed, None otherwise.
+        Must be called with the lock held."""
+        congested = self._queued > self.high_watermark
+        if congested == self._congested:
+            return None
+        self._congested = congested
+        return congested
+
+    def _notify(self, backpressure):
+        if backpressure is not None and self.on_backpressure is not None:
+            self.on_backpressure(backpressure)
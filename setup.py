@@ -10,6 +10,7 @@ DEPENDENCIES = [
     "autobahn",
     "pyopenssl",
     "service_identity",
+    "numpy",
 ]
 
 setup(
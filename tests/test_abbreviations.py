@@ -0,0 +1,57 @@
+"""Tests for the websocket abbreviations"""
+import pytest
+from bitfinex.websockets import abbreviations
+
+# pylint: disable=W0621,C0111
+
+
+def test_get_notification_code():
+    assert abbreviations.get_notification_code("order new") == "on"
+    assert abbreviations.get_notification_code("order multi-op") == "ox_multi"
+
+
+def test_get_notification_code_unknown_description():
+    with pytest.raises(ValueError):
+        abbreviations.get_notification_code("not a description")
+
+
+def test_get_notification_description():
+    assert abbreviations.get_notification_description("oc") == "order cancel"
+
+
+def test_event_key():
+    assert abbreviations.event_key([0, "on", [1, 2]]) == "on"
+    assert abbreviations.event_key([0, "hb"]) == "hb"
+    assert abbreviations.event_key({"event": "auth", "status": "OK"}) == "auth"
+    assert abbreviations.event_key([12, [[1, 2, 3]]]) is None
+
+
+def test_build_dispatch_table_accepts_descriptions():
+    handler = lambda message: None
+    table = abbreviations.build_dispatch_table({
+        "order new": handler,
+        "on": [handler],
+        "auth": handler,
+    })
+    assert table == {"on": (handler, handler), "auth": (handler,)}
+
+
+def test_build_dispatch_table_rejects_unknown_types():
+    with pytest.raises(ValueError):
+        abbreviations.build_dispatch_table({"nope": print})
+
+
+def test_dispatch_routes_by_type():
+    received = []
+    table = abbreviations.build_dispatch_table({
+        "te": received.append,
+    })
+    assert abbreviations.dispatch(table, [0, "te", [1]])
+    assert not abbreviations.dispatch(table, [0, "tu", [1]])
+    assert received == [[0, "te", [1]]]
+
+
+def test_dispatch_calls_default():
+    received = []
+    assert not abbreviations.dispatch({}, [0, "hb"], received.append)
+    assert received == [[0, "hb"]]
@@ -0,0 +1,161 @@
+"""Tests for the candle aggregator"""
+import pytest
+from bitfinex.analytics import candles
+
+# pylint: disable=W0621,C0111
+
+MINUTE = 60000
+
+
+@pytest.fixture
+def closed():
+    return []
+
+
+@pytest.fixture
+def aggregator(closed):
+    return candles.CandleAggregator(
+        ["1s", "1m", "5m"],
+        on_close=lambda timeframe, candle: closed.append((timeframe, candle)))
+
+
+def test_timeframe_ms():
+    assert candles.timeframe_ms("1s") == 1000
+    assert candles.timeframe_ms("15m") == 15 * MINUTE
+    assert candles.timeframe_ms("1D") == 24 * 60 * MINUTE
+    assert candles.timeframe_ms("1M") is None
+    with pytest.raises(ValueError):
+        candles.timeframe_ms("1x")
+
+
+def test_bar_start():
+    assert candles.bar_start(5 * MINUTE + 1, "5m") == 5 * MINUTE
+    assert candles.bar_start(5 * MINUTE, "5m") == 5 * MINUTE
+    assert candles.bar_start(5 * MINUTE - 1, "5m") == 0
+    # 2020-02-15 -> 2020-02-01
+    assert candles.bar_start(1581724800000, "1M") == 1580515200000
+
+
+def test_bars_from_trades(aggregator, closed):
+    aggregator.add_trade(1, 100, 1.0, 10.0)
+    aggregator.add_trade(2, 30000, -2.0, 12.0)
+    aggregator.add_trade(3, 59999, 0.5, 9.0)
+    assert aggregator.current("1m") == [0, 10.0, 9.0, 12.0, 9.0, 3.5]
+    assert aggregator.candles("1s") == [
+        [0, 10.0, 10.0, 10.0, 10.0, 1.0],
+        [30000, 12.0, 12.0, 12.0, 12.0, 2.0],
+        [59000, 9.0, 9.0, 9.0, 9.0, 0.5],
+    ]
+    assert [timeframe for timeframe, _ in closed] == ["1s", "1s"]
+    aggregator.add_trade(4, MINUTE, 1.0, 11.0)
+    assert ("1m", [0, 10.0, 9.0, 12.0, 9.0, 3.5]) in closed
+    assert aggregator.current("1m") == [MINUTE, 11.0, 11.0, 11.0, 11.0, 1.0]
+    assert aggregator.current("5m") == [0, 10.0, 11.0, 12.0, 9.0, 4.5]
+
+
+def test_late_trade_updates_closed_bar(aggregator):
+    aggregator.add_trade(1, 1000, 1.0, 10.0)
+    aggregator.add_trade(3, MINUTE + 1000, 1.0, 11.0)
+    aggregator.add_trade(2, 50000, 1.0, 13.0)
+    assert aggregator.candles("1m")[0] == [0, 10.0, 13.0, 13.0, 10.0, 2.0]
+    assert aggregator.current("1m") == [MINUTE, 11.0, 11.0, 11.0, 11.0, 1.0]
+
+
+def test_repeated_and_corrected_trades(aggregator):
+    aggregator.on_trades_message([1, "te", [1, 1000, 1.0, 10.0]])
+    aggregator.on_trades_message([1, "tu", [1, 1000, 1.0, 10.0]])
+    assert aggregator.current("1m")[5] == 1.0
+    aggregator.on_trades_message([1, "tu", [1, 1000, 1.5, 10.0]])
+    assert aggregator.current("1m")[5] == 1.5
+
+
+def test_trades_snapshot_is_sorted(aggregator):
+    aggregator.on_trades_message([1, [[2, 2000, 1.0, 12.0], [1, 1000, 1.0, 10.0]]])
+    aggregator.on_trades_message([1, "hb"])
+    assert aggregator.current("1m") == [0, 10.0, 12.0, 12.0, 10.0, 2.0]
+
+
+def test_bars_from_candles(closed):
+    aggregator = candles.CandleAggregator(
+        ["5m"], on_close=lambda timeframe, candle: closed.append(candle))
+    aggregator.on_candles_message([1, [
+        [MINUTE, 11.0, 12.0, 13.0, 10.0, 2.0],
+        [0, 10.0, 11.0, 11.0, 9.0, 1.0],
+    ]])
+    assert aggregator.current("5m") == [0, 10.0, 12.0, 13.0, 9.0, 3.0]
+    # Revision of the candle in progress replaces its contribution
+    aggregator.on_candles_message([1, [MINUTE, 11.0, 14.0, 15.0, 10.0, 3.0]])
+    assert aggregator.current("5m") == [0, 10.0, 14.0, 15.0, 9.0, 4.0]
+    # Revision of an earlier candle of the bar
+    aggregator.on_candles_message([1, [0, 10.0, 11.0, 11.0, 8.0, 1.5]])
+    assert aggregator.current("5m") == [0, 10.0, 14.0, 15.0, 8.0, 4.5]
+    aggregator.on_candles_message([1, [5 * MINUTE, 14.0, 14.0, 14.0, 14.0, 1.0]])
+    assert closed == [[0, 10.0, 14.0, 15.0, 8.0, 4.5]]
+    assert len(aggregator.candles("5m")) == 2
+
+
+def test_single_source(aggregator):
+    aggregator.add_trade(1, 1000, 1.0, 10.0)
+    with pytest.raises(ValueError):
+        aggregator.add_candle([0, 1.0, 1.0, 1.0, 1.0, 1.0])
+
+
+def test_series_merges_snapshot_and_updates():
+    updates = []
+    series = candles.CandleSeries(
+        capacity=8, on_update=lambda series, appended: updates.append(appended))
+    series.on_message([1, [
+        [2 * MINUTE, 3.0, 3.0, 3.0, 3.0, 1.0],
+        [MINUTE, 2.0, 2.0, 2.0, 2.0, 1.0],
+        [0, 1.0, 1.0, 1.0, 1.0, 1.0],
+    ]])
+    series.on_message([1, [2 * MINUTE, 3.0, 4.0, 4.0, 3.0, 2.0]])
+    series.on_message([1, "hb"])
+    series.on_message([1, [3 * MINUTE, 4.0, 4.0, 4.0, 4.0, 1.0]])
+    assert updates == [True, False, True]
+    assert len(series) == 4
+    assert series.close.tolist() == [1.0, 2.0, 4.0, 4.0]
+    assert series.mts.tolist() == [0, MINUTE, 2 * MINUTE, 3 * MINUTE]
+    last = series.last(2)
+    assert last.mts.tolist() == [2 * MINUTE, 3 * MINUTE]
+    assert last.volume.tolist() == [2.0, 1.0]
+
+
+def test_series_views_are_not_copies():
+    series = candles.CandleSeries()
+    series.update([0, 1.0, 1.0, 1.0, 1.0, 1.0])
+    view = series.last(1).close
+    series.update([0, 1.0, 5.0, 5.0, 1.0, 1.0])
+    assert view[0] == 5.0
+
+
+def test_series_out_of_order_candle():
+    series = candles.CandleSeries()
+    series.extend([[0, 1.0, 1.0, 1.0, 1.0, 1.0], [2 * MINUTE, 3.0, 3.0, 3.0, 3.0, 1.0]])
+    assert not series.update([MINUTE, 2.0, 2.0, 2.0, 2.0, 1.0])
+    assert series.to_list() == [
+        [0, 1.0, 1.0, 1.0, 1.0, 1.0],
+        [MINUTE, 2.0, 2.0, 2.0, 2.0, 1.0],
+        [2 * MINUTE, 3.0, 3.0, 3.0, 3.0, 1.0],
+    ]
+
+
+def test_series_discards_oldest_half_when_full():
+    series = candles.CandleSeries(capacity=4)
+    series.extend([[i * MINUTE, i, i, i, i, 1.0] for i in range(5)])
+    assert series.mts.tolist() == [2 * MINUTE, 3 * MINUTE, 4 * MINUTE]
+    series.update([5 * MINUTE, 5.0, 5.0, 5.0, 5.0, 1.0])
+    # Older than all the candles of a full series
+    series.update([0, 0.0, 0.0, 0.0, 0.0, 1.0])
+    assert series.mts.tolist() == [2 * MINUTE, 3 * MINUTE, 4 * MINUTE, 5 * MINUTE]
+
+
+def test_series_out_of_order_candle_when_full():
+    series = candles.CandleSeries(capacity=4)
+    series.extend([[i * 10, i, i, i, i, 1.0] for i in (0, 2, 3, 4)])
+    # Falls within the half discarded to make room
+    assert not series.update([15, 9, 9, 9, 9, 9])
+    assert series.mts.tolist() == [30, 40]
+    assert not series.update([35, 9, 9, 9, 9, 9])
+    assert series.mts.tolist() == [30, 35, 40]
+    assert series.close.tolist() == [3, 9, 4]
@@ -0,0 +1,111 @@
+"""Tests for the incremental indicators"""
+import numpy as np
+import pytest
+from bitfinex.analytics import candles, indicators
+
+# pylint: disable=W0621,C0111
+
+
+@pytest.fixture
+def history():
+    rng = np.random.default_rng(1)
+    close = 100 + np.cumsum(rng.normal(size=300))
+    high = close + rng.uniform(0, 1, size=300)
+    low = close - rng.uniform(0, 1, size=300)
+    return [
+        [i * 60000, close[i - 1] if i else close[0], close[i], high[i], low[i], 1.0]
+        for i in range(300)
+    ]
+
+
+INDICATORS = [
+    lambda: indicators.EMA(10),
+    lambda: indicators.RSI(14),
+    lambda: indicators.ATR(14),
+    lambda: indicators.Bollinger(20),
+]
+
+
+def _as_array(value):
+    return np.array(np.nan if value is None else value, dtype=np.float64)
+
+
+def test_ema_vector():
+    values = np.arange(1000, dtype=np.float64)
+    expected = np.empty_like(values)
+    average = values[0]
+    for i, value in enumerate(values):
+        average += 0.01 * (value - average)
+        expected[i] = average
+    np.testing.assert_allclose(indicators.ema(values, 0.01), expected)
+    np.testing.assert_allclose(indicators.ema(values, 1.0), values)
+
+
+@pytest.mark.parametrize("factory", INDICATORS)
+def test_backfill_matches_updates(factory, history):
+    incremental = factory()
+    backfilled = factory().backfill(list(reversed(history)))
+    assert len(backfilled) == len(history)
+    for row, candle in zip(backfilled, history):
+        value = incremental.update(candle)
+        if value is None:
+            assert np.isnan(row).all()
+        else:
+            np.testing.assert_allclose(row, value)
+
+
+@pytest.mark.parametrize("factory", INDICATORS)
+def test_revisions_replace_the_bar_in_progress(factory, history):
+    revised = factory()
+    for candle in history[:-1]:
+        revised.update(candle)
+    last = history[-1]
+    revised.update([last[0], last[1], last[2] + 5, last[3] + 5, last[4], 1.0])
+    revised.update(last)
+    direct = factory()
+    for candle in history:
+        direct.update(candle)
+    np.testing.assert_allclose(_as_array(revised.value), _as_array(direct.value))
+
+
+@pytest.mark.parametrize("factory", INDICATORS)
+def test_updates_continue_after_backfill(factory, history):
+    backfilled = factory()
+    backfilled.backfill(history[:200])
+    direct = factory()
+    for candle in history[:200]:
+        direct.update(candle)
+    for candle in history[199:]:
+        np.testing.assert_allclose(
+            _as_array(backfilled.update(candle)), _as_array(direct.update(candle)))
+
+
+def test_backfill_from_candle_series(history):
+    series = candles.CandleSeries()
+    series.extend(history)
+    np.testing.assert_allclose(
+        indicators.EMA(10).backfill(series.last()),
+        indicators.EMA(10).backfill(history))
+
+
+def test_channel_messages(history):
+    ema = indicators.EMA(3)
+    ema.on_message([1, list(reversed(history[:10]))])
+    ema.on_message([1, "hb"])
+    ema.on_message([1, history[10]])
+    direct = indicators.EMA(3)
+    for candle in history[:11]:
+        direct.update(candle)
+    assert ema.value == pytest.approx(direct.value)
+
+
+def test_undefined_values():
+    rsi = indicators.RSI()
+    assert rsi.update([0, 1.0, 1.0, 1.0, 1.0, 1.0]) is None
+    assert rsi.update([1, 1.0, 1.0, 1.0, 1.0, 1.0]) == 50.0
+    assert rsi.update([2, 1.0, 2.0, 2.0, 1.0, 1.0]) == 100.0
+    bands = indicators.Bollinger(period=2)
+    assert bands.update([0, 1.0, 1.0, 1.0, 1.0, 1.0]) is None
+    assert bands.update([1, 1.0, 3.0, 3.0, 1.0, 1.0]) == (2.0, 4.0, 0.0)
+    # Older candles are ignored
+    assert bands.update([0, 1.0, 9.0, 9.0, 1.0, 1.0]) == (2.0, 4.0, 0.0)
@@ -0,0 +1,74 @@
+"""Tests for the trade tape"""
+import math
+import pytest
+from bitfinex.analytics import tape
+
+# pylint: disable=W0621,C0111
+
+
+def test_stats_of_a_window():
+    trade_tape = tape.TradeTape(windows=(1000,))
+    trade_tape.add(0, 1.0, 100.0)
+    trade_tape.add(500, -3.0, 200.0)
+    stats = trade_tape.stats(1000)
+    assert stats.count == 2
+    assert stats.volume == 4.0
+    assert stats.vwap == pytest.approx(700.0 / 4)
+    assert stats.buy_volume == 1.0
+    assert stats.sell_volume == 3.0
+    assert stats.imbalance == pytest.approx(-0.5)
+
+
+def test_old_trades_leave_the_window():
+    trade_tape = tape.TradeTape(windows=(1000, 10000))
+    trade_tape.add(0, 1.0, 100.0)
+    trade_tape.add(1500, 2.0, 110.0)
+    assert trade_tape.stats(1000).count == 1
+    assert trade_tape.stats(1000).vwap == pytest.approx(110.0)
+    assert trade_tape.stats(10000).count == 2
+
+
+def test_stats_expire_to_now():
+    trade_tape = tape.TradeTape(windows=(1000,))
+    trade_tape.add(0, 1.0, 100.0)
+    stats = trade_tape.stats(1000, now=5000)
+    assert stats.count == 0
+    assert stats.volume == 0.0
+    assert math.isnan(stats.vwap)
+
+
+def test_overwritten_trades_leave_the_window():
+    trade_tape = tape.TradeTape(windows=(10000,), capacity=3)
+    for mts in range(5):
+        trade_tape.add(mts, 1.0, 100.0 + mts)
+    stats = trade_tape.stats(10000)
+    assert stats.count == 3
+    assert stats.vwap == pytest.approx(103.0)
+    mts, amount, price = trade_tape.trades()
+    assert list(mts) == [2, 3, 4]
+    assert list(price) == [102.0, 103.0, 104.0]
+
+
+def test_matches_brute_force():
+    trade_tape = tape.TradeTape(windows=(50,), capacity=64)
+    trades = [(mts * 7, (-1) ** mts * (mts % 5 + 1), 100.0 + mts % 11) for mts in range(200)]
+    for trade in trades:
+        trade_tape.add(*trade)
+    in_window = [trade for trade in trades if trade[0] >= trades[-1][0] - 50]
+    volume = sum(abs(amount) for _, amount, _ in in_window)
+    notional = sum(abs(amount) * price for _, amount, price in in_window)
+    stats = trade_tape.stats(50)
+    assert stats.count == len(in_window)
+    assert stats.volume == pytest.approx(volume)
+    assert stats.vwap == pytest.approx(notional / volume)
+
+
+def test_on_message():
+    trade_tape = tape.TradeTape()
+    trade_tape.on_message([1, [[2, 1001, -1.0, 101.0], [1, 1000, 1.0, 100.0]]])
+    trade_tape.on_message([1, "te", [3, 1002, 1.0, 102.0]])
+    trade_tape.on_message([1, "tu", [3, 1002, 1.0, 102.0]])
+    trade_tape.on_message([1, "hb"])
+    assert trade_tape.stats(60000).count == 3
+    assert trade_tape.last_mts == 1002
+    assert len(trade_tape) == 3
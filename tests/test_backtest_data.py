@@ -0,0 +1,69 @@
+"""Tests for the CSV data source"""
+import numpy as np
+import pandas as pd
+import pytest
+from bitfinex.backtest import data
+
+# pylint: disable=W0621,C0111
+
+FIELDS = ["id", "mts", "amount", "price"]
+START = 1546300800000  # 2019-01-01
+
+
+@pytest.fixture
+def csv_file(tmpdir):
+    path = tmpdir.join("trades.csv")
+    path.write("".join(
+        "{},{},{},{}\n".format(i, START + i * 60000, 1.0, 100.0 + i) for i in range(100)
+    ))
+    return str(path)
+
+
+def test_data_is_loaded_lazily(csv_file):
+    source = data.CSVDataSource(csv_file, FIELDS)
+    assert source._data is None  # pylint: disable=W0212
+    assert len(source.data) == 100
+    assert source.data["mts"].iloc[0] == START
+
+
+def test_timestamp_is_parsed_while_reading(csv_file):
+    source = data.CSVDataSource(csv_file, FIELDS, timestamp="mts", chunksize=7)
+    assert pd.api.types.is_datetime64_any_dtype(source.data["mts"])
+    assert source.data["mts"].iloc[1] == pd.Timestamp("2019-01-01 00:01:00")
+    assert source.data.index.tolist() == list(range(100))
+
+
+def test_time_range(csv_file):
+    source = data.CSVDataSource(
+        csv_file, FIELDS, timestamp="mts", start="2019-01-01 00:10",
+        end=START + 20 * 60000, chunksize=6, set_index=True)
+    assert source.data["id"].tolist() == list(range(10, 20))
+    assert source.data.index[0] == pd.Timestamp("2019-01-01 00:10")
+
+
+def test_empty_time_range(csv_file):
+    source = data.CSVDataSource(csv_file, FIELDS, timestamp="mts", start="2020-01-01")
+    assert source.data.empty
+    assert list(source.data.columns) == FIELDS
+
+
+def test_iter_chunks(csv_file):
+    source = data.CSVDataSource(
+        csv_file, FIELDS, dtype={"price": np.float32}, timestamp="mts", start=START + 50 * 60000)
+    chunks = list(source.iter_chunks(chunksize=20))
+    assert [len(chunk) for chunk in chunks] == [10, 20, 20]
+    assert chunks[0]["price"].dtype == np.float32
+
+
+def test_time_range_requires_timestamp(csv_file):
+    with pytest.raises(ValueError):
+        data.CSVDataSource(csv_file, FIELDS, start=START)
+
+
+def test_parse_timestamp_column(csv_file):
+    source = data.CSVDataSource(csv_file, FIELDS)
+    source.parse_timestamp_column("mts", "ms")
+    assert source.data.index[0] == pd.Timestamp("2019-01-01")
+    source = data.CSVDataSource(csv_file, FIELDS, timestamp="mts")
+    source.parse_timestamp_column("mts", "ms", set_index=False)
+    assert source.data["mts"].iloc[0] == pd.Timestamp("2019-01-01")
@@ -0,0 +1,225 @@
+"""Tests for the event driven backtest engine"""
+import numpy as np
+import pytest
+from bitfinex.backtest import engine
+from bitfinex.websockets import orders
+
+# pylint: disable=W0621,C0111
+
+
+class Recorder(engine.Strategy):
+    """Places the orders of ``actions`` (mts -> callable) and records
+    everything it sees"""
+
+    def __init__(self, actions=None):
+        self.actions = actions or {}
+        self.seen = []
+        self.updates = []
+
+    def on_trade(self, symbol, trade):
+        self.seen.append((engine.TRADE, trade[1]))
+        self._act(trade[1])
+
+    def on_candle(self, symbol, candle):
+        self.seen.append((engine.CANDLE, self.engine.mts))
+        self._act(self.engine.mts)
+
+    def on_order(self, order):
+        self.updates.append((order.cid, order.state))
+
+    def _act(self, mts):
+        action = self.actions.pop(mts, None)
+        if action is not None:
+            action(self)
+
+
+def trades(*rows):
+    return engine.trade_events("BTCUSD", [
+        [i, mts, 1.0, price] for i, (mts, price) in enumerate(rows)
+    ])
+
+
+def test_events_are_replayed_in_order():
+    strategy = Recorder()
+    candles = [[60000, 1, 1, 1, 1, 1], [0, 1, 1, 1, 1, 1]]
+    result = engine.BacktestEngine(strategy, [
+        engine.candle_events("BTCUSD", candles, "1m"),
+        trades((30000, 100.0), (90000, 101.0), (150000, 102.0)),
+    ]).run()
+    assert strategy.seen == [
+        (engine.TRADE, 30000), (engine.CANDLE, 60000), (engine.TRADE, 90000),
+        (engine.CANDLE, 120000), (engine.TRADE, 150000),
+    ]
+    assert result.events == 5
+
+
+def test_event_kinds_are_compared_by_value():
+    strategy = Recorder()
+    kind = "".join(["tra", "de"])
+    assert kind is not engine.TRADE
+    engine.BacktestEngine(strategy, [[(1, kind, "tBTCUSD", [0, 1, 1.0, 100.0])]]).run()
+    assert strategy.seen == [(engine.TRADE, 1)]
+
+
+def test_market_order_fills_at_last_price():
+    strategy = Recorder({1: lambda s: s.new_order("MARKET", "BTCUSD", 2, None)})
+    result = engine.BacktestEngine(
+        strategy, [trades((1, 100.0), (2, 110.0))], cash=1000.0).run()
+    fill, = result.fills
+    assert (fill.amount, fill.price, fill.maker) == (2.0, 100.0, False)
+    assert fill.fee == pytest.approx(2 * 100.0 * 0.002)
+    assert result.portfolio.position("BTCUSD") == 2.0
+    assert result.portfolio.cash == pytest.approx(1000.0 - 200.0 - 0.4)
+    assert result.equity[-1, 1] == pytest.approx(1000.0 - 0.4 + 20.0)
+    assert strategy.updates[-1][1] == orders.EXECUTED
+
+
+def test_market_order_without_price_is_rejected():
+    backtest = engine.BacktestEngine(Recorder(), [])
+    cid = backtest.new_order("MARKET", "BTCUSD", 1, None)
+    assert backtest.strategy.updates == [(cid, orders.REJECTED)]
+
+
+def test_limit_order_fills_when_traded_through():
+    strategy = Recorder({1: lambda s: s.new_order("LIMIT", "BTCUSD", 1, 99.0)})
+    backtest = engine.BacktestEngine(
+        strategy, [trades((1, 100.0), (2, 99.0), (3, 98.5), (4, 97.0))])
+    result = backtest.run()
+    fill, = result.fills
+    assert (fill.mts, fill.price, fill.maker) == (3, 99.0, True)
+    assert fill.fee == pytest.approx(99.0 * 0.001)
+
+
+def test_limit_order_fills_on_touch():
+    strategy = Recorder({1: lambda s: s.new_order("LIMIT", "BTCUSD", -1, 101.0)})
+    result = engine.BacktestEngine(
+        strategy, [trades((1, 100.0), (2, 101.0))], fill_on_touch=True).run()
+    assert [(fill.mts, fill.amount) for fill in result.fills] == [(2, -1.0)]
+
+
+def test_marketable_limit_order_fills_as_taker():
+    strategy = Recorder({1: lambda s: s.new_order("EXCHANGE LIMIT", "BTCUSD", 1, 105.0)})
+    result = engine.BacktestEngine(strategy, [trades((1, 100.0))]).run()
+    fill, = result.fills
+    assert (fill.price, fill.maker) == (100.0, False)
+
+
+def test_candles_fill_resting_orders():
+    strategy = Recorder({60000: lambda s: s.new_order("LIMIT", "BTCUSD", 1, 95.0)})
+    candles = [[0, 100, 100, 101, 99, 10], [60000, 100, 97, 100, 94, 10]]
+    result = engine.BacktestEngine(
+        strategy, [engine.candle_events("BTCUSD", candles, "1m")]).run()
+    fill, = result.fills
+    assert (fill.mts, fill.price) == (120000, 95.0)
+
+
+def test_stop_order():
+    strategy = Recorder({1: lambda s: s.new_order("STOP", "BTCUSD", -1, 95.0)})
+    result = engine.BacktestEngine(
+        strategy, [trades((1, 100.0), (2, 96.0), (3, 94.0))]).run()
+    fill, = result.fills
+    assert (fill.mts, fill.price, fill.maker) == (3, 94.0, False)
+
+
+def test_cancel_orders():
+    def place(strategy):
+        strategy.first = strategy.new_order("LIMIT", "BTCUSD", 1, 90.0)
+        strategy.second = strategy.new_order("LIMIT", "BTCUSD", 1, 91.0)
+
+    def cancel(strategy):
+        order = strategy.engine.open_orders("BTCUSD")[0]
+        strategy.cancel_order(order.id)
+        strategy.cancel_order_cid(strategy.second, "2018-01-01")
+
+    strategy = Recorder({1: place, 2: cancel})
+    result = engine.BacktestEngine(
+        strategy, [trades((1, 100.0), (2, 100.0), (3, 80.0))]).run()
+    assert result.fills == []
+    assert [order.state for order in result.orders.values()] == [orders.CANCELED] * 2
+
+
+def test_update_order():
+    def update(strategy):
+        order, = strategy.engine.open_orders()
+        strategy.update_order(id=order.id, price=99.5, delta=1)
+
+    strategy = Recorder({1: lambda s: s.new_order("LIMIT", "BTCUSD", 1, 90.0), 2: update})
+    result = engine.BacktestEngine(
+        strategy, [trades((1, 100.0), (2, 100.0), (3, 99.0))]).run()
+    fill, = result.fills
+    assert (fill.amount, fill.price) == (2.0, 99.5)
+    order, = result.orders.values()
+    assert (order.amount_orig, order.price_avg) == (2.0, 99.5)
+
+
+def test_update_order_amount_after_partial_fill():
+    def update(strategy):
+        order, = strategy.engine.open_orders()
+        strategy.update_order(id=order.id, amount=2)
+
+    strategy = Recorder({1: lambda s: s.new_order("LIMIT", "BTCUSD", 2, 99.0), 3: update})
+    result = engine.BacktestEngine(
+        strategy, [trades((1, 100.0), (2, 98.0), (3, 100.0), (4, 98.0), (5, 97.0))],
+        volume_limit=True).run()
+    assert [fill.amount for fill in result.fills] == [1.0, 1.0, 1.0]
+    order, = result.orders.values()
+    assert (order.amount_orig, order.price_avg) == (3.0, 99.0)
+    assert order.state == orders.EXECUTED
+
+
+def test_latency_delays_orders():
+    strategy = Recorder({1: lambda s: s.new_order("MARKET", "BTCUSD", 1, None)})
+    result = engine.BacktestEngine(
+        strategy, [trades((1, 100.0), (5, 101.0), (20, 102.0))], latency=10).run()
+    fill, = result.fills
+    assert (fill.mts, fill.price) == (20, 101.0)
+
+
+def test_volume_limit_partially_fills():
+    strategy = Recorder({1: lambda s: s.new_order("LIMIT", "BTCUSD", 3, 99.0)})
+    result = engine.BacktestEngine(
+        strategy, [trades((1, 100.0), (2, 98.0), (3, 98.0))], volume_limit=True).run()
+    assert [fill.amount for fill in result.fills] == [1.0, 1.0]
+    order, = result.orders.values()
+    assert order.state == orders.PARTIALLY_FILLED
+    assert order.amount == 1.0
+
+
+class BookStrategy(engine.Strategy):
+
+    def on_book(self, symbol, update):
+        if self.engine.mts == 2 and not self.engine.orders:
+            self.new_order("LIMIT", symbol, 1, 101.5)
+            self.new_order("LIMIT", symbol, 1, 99.5)
+
+
+def test_book_events():
+    updates = [
+        [1, 100.0, 1, 1.0], [1, 101.0, 1, -1.0], [1, 102.0, 1, -1.0],
+        [2, 100.0, 1, 2.0], [3, 101.0, 0, -1.0], [4, 99.5, 1, -1.0],
+    ]
+    backtest = engine.BacktestEngine(
+        BookStrategy(), [engine.book_events("BTCUSD", updates)])
+    result = backtest.run()
+    assert backtest.best_bid_ask("BTCUSD") == (100.0, 99.5)
+    first, second = result.fills
+    assert (first.price, first.maker) == (101.0, False)
+    assert (second.mts, second.price, second.maker) == (4, 99.5, True)
+
+
+def test_portfolio_realizes_profit():
+    portfolio = engine.Portfolio(cash=0.0)
+    portfolio.apply(engine.Fill(0, 1, 1, "tBTCUSD", 2.0, 100.0, 0.0, True))
+    portfolio.apply(engine.Fill(0, 2, 2, "tBTCUSD", -3.0, 110.0, 1.0, True))
+    assert portfolio.realized == pytest.approx(20.0)
+    assert portfolio.position("BTCUSD") == -1.0
+    assert portfolio.base_prices["tBTCUSD"] == 110.0
+    assert portfolio.fees == 1.0
+    assert portfolio.equity({"tBTCUSD": 100.0}) == pytest.approx(20.0 + 10.0 - 1.0)
+
+
+def test_numpy_events():
+    data = np.array([[1, 2, 1.0, 100.0], [0, 1, -1.0, 99.0]])
+    events = list(engine.trade_events("BTCUSD", data))
+    assert [event[0] for event in events] == [1, 2]
+    assert events[0][2] == "tBTCUSD"
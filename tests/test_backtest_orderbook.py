@@ -0,0 +1,35 @@
+"""Tests for the order book"""
+from bitfinex.backtest import orderbook
+
+# pylint: disable=W0621,C0111
+
+
+def test_aggregated_book():
+    book = orderbook.OrderBook()
+    book.on_message([1, [[100.0, 1, 2.0], [99.0, 2, 1.0], [101.0, 1, -1.0], [102.0, 3, -4.0]]])
+    assert (book.best_bid, book.best_ask, book.mid) == (100.0, 101.0, 100.5)
+    book.on_message([1, [100.5, 1, 0.5]])
+    book.on_message([1, "hb"])
+    book.on_message([1, [101.0, 0, -1]])
+    assert book.bids(2) == [(100.5, 1, 0.5), (100.0, 1, 2.0)]
+    assert book.asks() == [(102.0, 3, 4.0)]
+    assert book.amount(True, 99.0) == 1.0
+    assert book.amount(False, 101.0) == 0.0
+    assert len(book) == 4
+    book.on_message([1, [[10.0, 1, 1.0]]])
+    assert (book.best_bid, book.best_ask, book.mid) == (10.0, None, None)
+
+
+def test_raw_book():
+    book = orderbook.OrderBook(raw=True)
+    book.snapshot([[1, 100.0, 1.0], [2, 100.0, 0.5], [3, 101.0, -2.0]])
+    assert book.bids() == [(100.0, 2, 1.5)]
+    # An order changing price
+    book.update([2, 99.0, 0.5])
+    assert book.bids() == [(100.0, 1, 1.0), (99.0, 1, 0.5)]
+    # Order removals
+    book.update([1, 0, 1])
+    book.update([3, 0, -1])
+    assert book.bids() == [(99.0, 1, 0.5)]
+    assert book.best_ask is None
+    assert book.orders == {2: (99.0, 0.5)}
@@ -0,0 +1,112 @@
+"""Tests for the queue position fill simulation"""
+import pytest
+from bitfinex.backtest import engine, replay
+
+# pylint: disable=W0621,C0111
+
+
+@pytest.fixture
+def simulator():
+    simulator = replay.QueueSimulator(maker_fee=0.0)
+    simulator.book.snapshot([[100.0, 2, 5.0], [99.0, 1, 1.0], [101.0, 1, -3.0]])
+    return simulator
+
+
+def test_orders_join_the_back_of_the_queue(simulator):
+    order_id = simulator.new_order(1.0, 100.0)
+    assert simulator.orders[order_id].queue_ahead == 5.0
+    assert simulator.orders[simulator.new_order(1.0, 100.5)].queue_ahead == 0.0
+
+
+def test_post_only(simulator):
+    assert simulator.new_order(1.0, 101.0) is None
+    assert simulator.new_order(-1.0, 100.0) is None
+
+
+def test_trades_consume_the_queue_before_filling(simulator):
+    order_id = simulator.new_order(2.0, 100.0)
+    simulator.on_trade([1, 10, -4.0, 100.0])
+    assert simulator.orders[order_id].queue_ahead == 1.0
+    assert simulator.fills == []
+    simulator.on_trade([2, 20, -2.0, 100.0])
+    fill, = simulator.fills
+    assert (fill.mts, fill.amount, fill.price, fill.maker) == (20, 1.0, 100.0, True)
+    assert simulator.orders[order_id].amount == 1.0
+
+
+def test_book_decreases_after_trades_are_not_counted_twice(simulator):
+    order_id = simulator.new_order(1.0, 100.0)
+    simulator.on_trade([1, 10, -2.0, 100.0])
+    simulator.on_book([100.0, 1, 3.0])
+    assert simulator.orders[order_id].queue_ahead == 3.0
+
+
+def test_cancellations_shorten_the_queue_proportionally(simulator):
+    order_id = simulator.new_order(1.0, 100.0)
+    simulator.on_book([100.0, 3, 7.0])
+    simulator.on_book([100.0, 2, 3.5])
+    assert simulator.orders[order_id].queue_ahead == pytest.approx(5.0 - 3.5 * 5.0 / 7.0)
+    simulator.on_book([100.0, 0, 1])
+    assert simulator.orders[order_id].queue_ahead == 0.0
+
+
+def test_trades_through_the_price_fill_entirely(simulator):
+    bid = simulator.new_order(1.0, 99.0)
+    ask = simulator.new_order(-2.0, 102.0)
+    simulator.on_trade([1, 10, -1.0, 98.0])
+    simulator.on_trade([2, 11, 1.0, 102.5])
+    assert [(fill.order_id, fill.amount) for fill in simulator.fills] == [(bid, 1.0), (ask, -2.0)]
+    assert simulator.orders == {}
+
+
+def test_cancel_order(simulator):
+    order_id = simulator.new_order(1.0, 100.0)
+    assert simulator.cancel_order(order_id)
+    assert not simulator.cancel_order(order_id)
+    simulator.on_trade([1, 10, -10.0, 99.0])
+    assert simulator.fills == []
+
+
+def test_raw_book_queue():
+    simulator = replay.QueueSimulator(raw=True, maker_fee=0.0)
+    simulator.book.snapshot([[1, 100.0, 1.0], [2, 100.0, 1.0], [3, 101.0, -1.0]])
+    order_id = simulator.new_order(1.0, 100.0)
+    # The first order of the level moves away
+    simulator.on_book([1, 99.0, 1.0])
+    assert simulator.orders[order_id].queue_ahead == pytest.approx(1.0)
+
+
+def test_replay():
+    book = [[1, 100.0, 1, 2.0], [1, 101.0, 1, -2.0], [5, 100.0, 1, 1.0]]
+    trades = [[1, 4, -1.0, 100.0], [2, 6, -2.0, 100.0]]
+    placed = []
+
+    def quote(simulator, mts, kind, data):
+        if not placed and simulator.book.best_bid is not None and kind == engine.BOOK:
+            placed.append(simulator.new_order(1.0, simulator.book.best_bid))
+
+    fills = replay.QueueSimulator(maker_fee=0.001).replay([
+        engine.book_events("BTCUSD", book),
+        engine.trade_events("BTCUSD", trades),
+    ], quote)
+    assert len(placed) == 1
+    fill, = fills
+    assert (fill.mts, fill.amount, fill.price) == (6, 1.0, 100.0)
+    assert fill.fee == pytest.approx(0.1)
+
+
+def test_event_kinds_are_compared_by_value():
+    simulator = replay.QueueSimulator()
+    kind = "".join(["bo", "ok"])
+    assert kind is not engine.BOOK
+    simulator.replay([[(1, kind, "tBTCUSD", [100.0, 1, 2.0])]])
+    assert simulator.book.best_bid == 100.0
+
+
+def test_raw_order_amount_change_in_place():
+    simulator = replay.QueueSimulator(raw=True, maker_fee=0.0)
+    simulator.book.snapshot([[1, 100.0, 2.0], [2, 100.0, 2.0], [3, 101.0, -1.0]])
+    order_id = simulator.new_order(1.0, 100.0)
+    assert simulator.orders[order_id].queue_ahead == 4.0
+    simulator.on_book([1, 100.0, 1.0])
+    assert simulator.orders[order_id].queue_ahead == pytest.approx(3.0)
@@ -0,0 +1,150 @@
+"""Tests for the columnar market data store"""
+import json
+import numpy as np
+import pytest
+from bitfinex.backtest import engine, replay, store
+
+# pylint: disable=W0621,C0111
+
+DAY = store.DAY
+START = 1546300800000  # 2019-01-01
+
+
+@pytest.fixture
+def column_store(tmpdir):
+    return store.ColumnStore(str(tmpdir.join("store")))
+
+
+def test_append_and_read(column_store):
+    column_store.append("BTCUSD", "trades", [
+        [2, START + 2000, -1.0, 101.0],
+        [1, START + 1000, 1.0, 100.0],
+        [3, START + DAY + 1000, 2.0, 102.0],
+    ])
+    assert column_store.days("BTCUSD", "trades") == ["2019-01-01", "2019-01-02"]
+    assert column_store.symbols() == ["BTCUSD"]
+    trades = column_store.read("BTCUSD", "trades")
+    assert trades["id"].tolist() == [1, 2, 3]
+    assert trades["price"].tolist() == [100.0, 101.0, 102.0]
+    assert trades["mts"].dtype == np.int64
+
+
+def test_time_range_is_memory_mapped(column_store):
+    column_store.append("BTCUSD", "trades", [
+        [i, START + i * 1000, 1.0, float(i)] for i in range(100)
+    ])
+    trades = column_store.read("BTCUSD", "trades", start=START + 10000, end=START + 20000)
+    assert trades["id"].tolist() == list(range(10, 20))
+    assert isinstance(trades["price"], np.memmap)
+    assert not trades["price"].flags.writeable
+    assert len(column_store.read("BTCUSD", "trades", start=START + DAY)["id"]) == 0
+
+
+def test_appends_newer_rows(column_store):
+    column_store.append("BTCUSD", "trades", [[1, START, 1.0, 100.0]])
+    column_store.append("BTCUSD", "trades", [[2, START, 1.0, 101.0], [3, START + 1, 1.0, 102.0]])
+    assert column_store.read("BTCUSD", "trades")["id"].tolist() == [1, 2, 3]
+
+
+def test_older_and_repeated_rows_rewrite_the_day(column_store):
+    column_store.append("BTCUSD", "trades", [[2, START + 10, 1.0, 100.0], [4, START + 30, 1.0, 100.0]])
+    before = column_store.read("BTCUSD", "trades")
+    column_store.append("BTCUSD", "trades", [[3, START + 20, 1.0, 100.0], [4, START + 30, 2.0, 100.0]])
+    trades = column_store.read("BTCUSD", "trades")
+    assert trades["id"].tolist() == [2, 3, 4]
+    assert trades["amount"].tolist() == [1.0, 1.0, 2.0]
+    # Arrays read before keep their data
+    assert before["id"].tolist() == [2, 4]
+
+
+def test_rows_are_published_by_meta(column_store, tmpdir):
+    column_store.append("BTCUSD", "trades", [[1, START, 1.0, 100.0]])
+    day = tmpdir.join("store", "BTCUSD", "trades", "2019-01-01")
+    assert json.loads(day.join("meta.json").read())["rows"] == 1
+    # Columns written after the last published meta.json are not read
+    with open(str(day.join("id.bin")), "ab") as column_file:
+        np.array([2], dtype=np.int64).tofile(column_file)
+    assert column_store.read("BTCUSD", "trades")["id"].tolist() == [1]
+    # and are overwritten by the next append
+    column_store.append("BTCUSD", "trades", [[3, START + 1, 1.0, 100.0]])
+    assert column_store.read("BTCUSD", "trades")["id"].tolist() == [1, 3]
+
+
+def test_newer_rows_are_appended_in_place(column_store, tmpdir):
+    column_store.append("BTCUSD", "trades", [[1, START + 10, 1.0, 100.0]])
+    column = tmpdir.join("store", "BTCUSD", "trades", "2019-01-01", "price.bin")
+    inode = column.stat().ino
+    column_store.append("BTCUSD", "trades", [[2, START + 20, 1.0, 101.0]])
+    assert column.stat().ino == inode
+    column_store.append("BTCUSD", "trades", [[0, START, 1.0, 99.0]])
+    assert column.stat().ino != inode
+    assert column_store.read("BTCUSD", "trades")["price"].tolist() == [99.0, 100.0, 101.0]
+
+
+def test_meta_is_validated(column_store, tmpdir):
+    column_store.append("BTCUSD", "trades", [[1, START, 1.0, 100.0]])
+    day = tmpdir.join("store", "BTCUSD", "trades", "2019-01-01")
+    meta = json.loads(day.join("meta.json").read())
+    day.join("meta.json").write(json.dumps(dict(meta, rows=2)))
+    with pytest.raises(ValueError):
+        column_store.read("BTCUSD", "trades")
+    day.join("meta.json").write(json.dumps(dict(meta, columns=meta["columns"][::-1])))
+    with pytest.raises(ValueError):
+        column_store.read("BTCUSD", "trades")
+
+
+def test_candles_are_replaced_by_timestamp(column_store):
+    column_store.append("BTCUSD", "candles_1m", [[START, 1, 1, 1, 1, 1]])
+    column_store.append("BTCUSD", "candles_1m", [[START, 1, 2, 2, 1, 3], [START + 60000, 2, 2, 2, 2, 1]])
+    candles = column_store.rows("BTCUSD", "candles_1m")
+    assert candles.tolist() == [
+        [START, 1, 2, 2, 1, 3],
+        [START + 60000, 2, 2, 2, 2, 1],
+    ]
+
+
+def test_unknown_dataset(column_store):
+    with pytest.raises(ValueError):
+        column_store.append("BTCUSD", "ticker", [[1, 2]])
+
+
+def test_trades_recorder(column_store):
+    recorder = column_store.recorder("BTCUSD", "trades", flush_size=3)
+    recorder([1, [[2, START + 2, 1.0, 101.0], [1, START + 1, 1.0, 100.0]]])
+    recorder([1, "hb"])
+    recorder([1, "te", [3, START + 3, 1.0, 102.0]])
+    recorder([1, "tu", [3, START + 3, 1.0, 102.0, 0]])
+    assert column_store.read("BTCUSD", "trades")["id"].tolist() == [1, 2, 3]
+
+
+def test_candles_recorder_writes_closed_candles(column_store):
+    recorder = column_store.recorder("BTCUSD", "candles_1m")
+    recorder([1, [[START + 60000, 2, 2, 2, 2, 1], [START, 1, 1, 1, 1, 1]]])
+    recorder([1, [START + 60000, 2, 3, 3, 2, 2]])
+    recorder([1, [START + 120000, 3, 3, 3, 3, 1]])
+    recorder.flush()
+    assert column_store.read("BTCUSD", "candles_1m")["close"].tolist() == [1, 3]
+
+
+def test_book_recorder_stamps_updates(column_store):
+    recorder = column_store.recorder("BTCUSD", "book", clock=lambda: (START + 5) / 1000.0)
+    recorder([1, [[100.0, 1, 1.0], [101.0, 2, -3.0]]])
+    recorder([1, [100.0, 0, 1.0]])
+    recorder.flush()
+    rows = column_store.rows("BTCUSD", "book")
+    assert rows.tolist() == [
+        [START + 5, 100.0, 1, 1.0],
+        [START + 5, 101.0, 2, -3.0],
+        [START + 5, 100.0, 0, 1.0],
+    ]
+    assert [event[3] for event in engine.book_events("BTCUSD", rows)][2] == [100.0, 0, 1.0]
+
+
+def test_raw_book_recorder_keeps_prices(column_store):
+    recorder = column_store.recorder("BTCUSD", "rawbook", clock=lambda: (START + 5) / 1000.0)
+    recorder([1, [[11, 3650.5, 1.0], [12, 3651.25, -2.0]]])
+    recorder.flush()
+    simulator = replay.QueueSimulator(raw=True)
+    simulator.replay([engine.book_events("BTCUSD", column_store.rows("BTCUSD", "rawbook"))])
+    assert simulator.book.best_bid == 3650.5
+    assert simulator.book.best_ask == 3651.25
@@ -0,0 +1,71 @@
+"""Tests for the parameter sweep runner"""
+import os
+import numpy as np
+import pytest
+from bitfinex.analytics.indicators import ema
+from bitfinex.backtest import sweep, vectorized
+
+# pylint: disable=W0621,C0111
+
+
+def crossover(data, fast, slow):
+    close = data["close"]
+    signals = np.where(ema(close, 2.0 / (fast + 1)) > ema(close, 2.0 / (slow + 1)), 1.0, -1.0)
+    return vectorized.metrics(vectorized.backtest(close, signals))
+
+
+def describe(data, scale):
+    return {
+        "total": float(data["close"].sum()) * scale,
+        "writeable": data["close"].flags.writeable,
+        "pid": os.getpid(),
+    }
+
+
+@pytest.fixture
+def close():
+    rng = np.random.default_rng(5)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.01, size=2000)))
+
+
+def test_parameter_grid():
+    assert sweep.parameter_grid(a=[1, 2], b="xy") == [
+        {"a": 1, "b": "x"}, {"a": 1, "b": "y"}, {"a": 2, "b": "x"}, {"a": 2, "b": "y"},
+    ]
+
+
+def test_shared_arrays(close):
+    with sweep.SharedArrays({"close": close}) as shared:
+        arrays = sweep.SharedArrays.attach(shared.spec)
+        np.testing.assert_array_equal(arrays["close"], close)
+        assert not arrays["close"].flags.writeable
+
+
+def test_memory_mapped_arrays_are_not_copied(tmpdir, close):
+    path = str(tmpdir.join("close.bin"))
+    mapped = np.memmap(path, dtype=np.float64, mode="w+", shape=close.shape)
+    mapped[:] = close
+    mapped.flush()
+    with sweep.SharedArrays({"close": np.memmap(path, dtype=np.float64, mode="r")}) as shared:
+        assert shared.spec["close"][0] == "file"
+        np.testing.assert_array_equal(sweep.SharedArrays.attach(shared.spec)["close"], close)
+
+
+def test_run_sweep(close):
+    grid = sweep.parameter_grid(fast=[5, 10], slow=[20, 50, 100])
+    results = sweep.run_sweep(crossover, {"close": close}, grid, processes=2)
+    assert [(row["fast"], row["slow"]) for row in results] == [
+        (5, 20), (5, 50), (5, 100), (10, 20), (10, 50), (10, 100),
+    ]
+    expected = crossover({"close": close}, 10, 50)
+    assert results[4]["total_return"] == pytest.approx(float(expected.total_return))
+    assert isinstance(results[4]["sharpe"], float)
+
+
+def test_workers_read_shared_data(close):
+    results = sweep.run_sweep(
+        describe, {"close": close}, [{"scale": 1}, {"scale": 2}], processes=2, chunksize=1)
+    assert results[0]["total"] == pytest.approx(close.sum())
+    assert results[1]["total"] == pytest.approx(2 * close.sum())
+    assert not results[0]["writeable"]
+    assert os.getpid() not in {row["pid"] for row in results}
@@ -0,0 +1,71 @@
+"""Tests for the vectorized backtests"""
+import numpy as np
+import pytest
+from bitfinex.backtest import vectorized
+
+# pylint: disable=W0621,C0111
+
+
+@pytest.fixture
+def prices():
+    rng = np.random.default_rng(3)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.01, size=500)))
+
+
+def loop_backtest(prices, signals, fee, delay):
+    equity, position, curve = 1.0, 0.0, []
+    for i, price in enumerate(prices):
+        if i:
+            equity *= 1 + position * (price / prices[i - 1] - 1)
+        target = signals[i - delay] if i >= delay else 0.0
+        equity -= equity * fee * abs(target - position)
+        position = target
+        curve.append(equity)
+    return np.array(curve)
+
+
+def test_matches_a_loop(prices):
+    signals = np.sign(np.sin(np.arange(500) / 7.0))
+    result = vectorized.backtest(prices, signals, fee=0.001)
+    np.testing.assert_allclose(result.equity, loop_backtest(prices, signals, 0.001, 1))
+    assert result.positions[0] == 0.0
+    assert result.positions[1] == signals[0]
+
+
+def test_runs_in_columns(prices):
+    signals = np.column_stack([
+        np.sign(np.sin(np.arange(500) / period)) for period in (3.0, 7.0, 11.0)
+    ])
+    result = vectorized.backtest(prices, signals, fee=0.001, delay=2)
+    assert result.equity.shape == (500, 3)
+    for column in range(3):
+        np.testing.assert_allclose(
+            result.equity[:, column],
+            loop_backtest(prices, signals[:, column], 0.001, 2))
+
+
+def test_drawdown_and_metrics():
+    prices = np.array([100.0, 110.0, 99.0, 121.0])
+    result = vectorized.backtest(prices, np.ones(4), fee=0.0, delay=0)
+    np.testing.assert_allclose(result.equity, [1.0, 1.1, 0.99, 1.21])
+    np.testing.assert_allclose(result.drawdown, [0.0, 0.0, -0.1, 0.0])
+    summary = vectorized.metrics(result)
+    assert summary.total_return == pytest.approx(0.21)
+    assert summary.max_drawdown == pytest.approx(-0.1)
+    assert summary.trades == 1
+
+
+def test_fees():
+    prices = np.array([100.0, 110.0, 121.0])
+    result = vectorized.backtest(prices, [1.0, -1.0, -1.0], fee=0.01, cash=100.0, delay=0)
+    # Buy 100, then sell 2 * 110 * 0.99 of notional
+    np.testing.assert_allclose(result.fees, [1.0, 2.0 * 0.01 * 99.0 * 1.1, 0.0])
+    assert result.equity[1] == pytest.approx(99.0 * 1.1 * 0.98)
+    assert vectorized.metrics(result).fees == pytest.approx(result.fees.sum())
+
+
+def test_closes_of_candles():
+    candles = [[60000, 1, 3.0, 1, 1, 1], [0, 1, 2.0, 1, 1, 1]]
+    np.testing.assert_array_equal(vectorized.closes(candles), [2.0, 3.0])
+    with pytest.raises(ValueError):
+        vectorized.backtest([1.0, 2.0], [1.0])
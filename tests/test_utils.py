@@ -1,5 +1,13 @@
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+import time
+from datetime import datetime
 import pytest
 from bitfinex import utils
+from bitfinex.rest import ClientV2
 
 def test_order_symbol_adds_t_to_symbol():
     assert utils.order_symbol("BTCUSD") == "tBTCUSD"
@@ -24,3 +32,147 @@ def test_order_symbol_capital_letters():
 
 def test_order_symbol_passes_on_unknown_symbols_unchanged():
     assert utils.order_symbol("custom_sym") == "custom_sym"
+
+def test_create_cid_is_increasing():
+    cids = [utils.create_cid() for _ in range(1000)]
+    assert cids == sorted(set(cids))
+
+def test_create_cid_can_be_decoded():
+    assert utils.cid_to_date(utils.create_cid()) == (
+        datetime.utcfromtimestamp(time.time()).strftime("%Y-%m-%d")
+    )
+
+def test_cid_generator_is_unique_across_threads():
+    generator = utils.CidGenerator(worker_id=1)
+    results = []
+
+    def worker():
+        results.extend(generator() for _ in range(2000))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(results)) == 8000
+
+def test_cid_generator_keeps_worker_slot():
+    first = utils.CidGenerator(worker_id=1, workers=4)
+    second = utils.CidGenerator(worker_id=2, workers=4)
+    first_cids = {first() for _ in range(500)}
+    second_cids = {second() for _ in range(500)}
+    assert all(cid % 4 == 1 for cid in first_cids)
+    assert not first_cids & second_cids
+
+def test_cid_generator_claims_free_slots(tmpdir):
+    slot_dir = str(tmpdir)
+    first = utils.CidGenerator(workers=2, slot_dir=slot_dir)
+    second = utils.CidGenerator(workers=2, slot_dir=slot_dir)
+    assert first() % 2 != second() % 2
+    # No free slot left: falls back to the process id
+    assert utils.CidGenerator(workers=2, slot_dir=slot_dir)() % 2 == os.getpid() % 2
+
+def test_cid_generator_skips_slots_it_can_not_open(tmpdir, monkeypatch):
+    real_open = os.open
+
+    def fake_open(path, *args):
+        if path.endswith("cid-slot-0.lock"):
+            raise PermissionError(path)
+        return real_open(path, *args)
+
+    monkeypatch.setattr(os, "open", fake_open)
+    assert utils.CidGenerator(workers=4, slot_dir=str(tmpdir))() % 4 == 1
+
+def _child_slot(generator, queue):
+    queue.put(generator() % generator.workers)
+
+def test_cid_generator_forked_child_claims_its_own_slot(tmpdir):
+    context = multiprocessing.get_context("fork")
+    generator = utils.CidGenerator(workers=4, slot_dir=str(tmpdir))
+    parent_slot = generator() % 4
+    queue = context.Queue()
+    child = context.Process(target=_child_slot, args=(generator, queue))
+    child.start()
+    child_slot = queue.get(timeout=10)
+    child.join(10)
+    assert child_slot != parent_slot
+    assert generator() % 4 == parent_slot
+
+def test_cid_generator_rejects_invalid_worker_id():
+    with pytest.raises(ValueError):
+        utils.CidGenerator(worker_id=16, workers=16)
+
+def _nonce_value(nonce):
+    assert nonce.isdigit()
+    return int(nonce)
+
+def test_get_nonce_is_strictly_increasing():
+    nonces = [_nonce_value(utils.get_nonce(1.0)) for _ in range(1000)]
+    assert nonces == sorted(set(nonces))
+
+def test_get_nonce_is_in_microseconds_times_multiplier():
+    assert abs(_nonce_value(utils.get_nonce(2.0)) - time.time() * 2 * 1000000) < 10 ** 9
+
+def test_nonce_multipliers_overflowing_are_rejected():
+    for multiplier in (1000.0, 0.0):
+        with pytest.raises(ValueError):
+            utils.NonceProvider(multiplier)
+    assert _nonce_value(utils.NonceProvider(1.0)()) <= utils.nonce.MAX_NONCE
+
+def test_nonce_provider_is_unique_across_threads():
+    provider = utils.NonceProvider()
+    results = []
+
+    def worker():
+        results.extend(provider() for _ in range(2000))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(results)) == 8000
+
+def _file_nonces(path, queue):
+    provider = utils.FileNonceProvider(path)
+    queue.put([provider() for _ in range(500)])
+    provider.close()
+
+def test_file_nonce_provider_is_unique_across_processes(tmpdir):
+    path = str(tmpdir.join("nonce"))
+    queue = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=_file_nonces, args=(path, queue))
+        for _ in range(3)
+    ]
+    for process in processes:
+        process.start()
+    results = [queue.get(timeout=30) for _ in processes]
+    for process in processes:
+        process.join()
+    nonces = [_nonce_value(nonce) for result in results for nonce in result]
+    assert len(set(nonces)) == 1500
+    for result in results:
+        values = [_nonce_value(nonce) for nonce in result]
+        assert values == sorted(values)
+
+def test_clients_share_default_nonce_provider():
+    first = ClientV2("key", "secret")
+    second = ClientV2("key", "secret")
+    assert first.nonce_provider is second.nonce_provider
+
+def test_client_uses_given_nonce_provider():
+    client = ClientV2("key", "secret", nonce_provider=lambda: "42")
+    assert client._nonce() == "42"
+
+def test_hmac_signer_matches_hmac_new():
+    message = "/api/v2/auth/r/wallets1539.123{}"
+    expected = hmac.new(b"secret", message.encode('utf8'), hashlib.sha384).hexdigest()
+    signer = utils.HmacSigner("secret")
+    assert signer.sign(message) == expected
+    assert signer.sign(message.encode('utf8')) == expected
+
+def test_hmac_signer_is_reusable():
+    signer = utils.HmacSigner("secret")
+    assert signer.sign("first") == signer.sign("first")
+    assert signer.sign("first") != signer.sign("second")
@@ -0,0 +1,83 @@
+"""Tests for the websocket wallet and position store"""
+import pytest
+from bitfinex import WssClient
+from bitfinex.websockets import account
+from bitfinex.websockets import client as client_module
+
+# pylint: disable=W0621,C0111
+
+
+class FakeRestClient:
+
+    def wallets_balance(self):
+        return [["exchange", "USD", 100.0, 0, None]]
+
+    def active_positions(self):
+        return [["tBTCUSD", "ACTIVE", 0.5, 6000.0, 0, 0, 1.0, 0.1, 0, 1]]
+
+
+@pytest.fixture
+def store():
+    return account.AccountStore()
+
+
+def test_wallet_snapshot_and_update(store):
+    store.on_wallet_snapshot([0, "ws", [
+        ["exchange", "USD", 100.0, 0, None],
+        ["margin", "BTC", 1.0, 0, None],
+    ]])
+    store.on_wallet_update([0, "wu", ["exchange", "USD", 90.0, 0, 80.0]])
+    assert store.wallet("exchange", "USD").balance_available == 80.0
+    assert store.wallet("margin", "BTC").balance == 1.0
+
+
+def test_positions(store):
+    store.on_position_snapshot([0, "ps", [
+        ["tBTCUSD", "ACTIVE", 0.5, 6000.0, 0, 0],
+    ]])
+    store.on_position_update([0, "pn", ["tETHUSD", "ACTIVE", 2.0, 200.0, 0, 0]])
+    store.on_position_close([0, "pc", ["tBTCUSD", "CLOSED", 0, 6000.0, 0, 0]])
+    assert store.position("tBTCUSD") is None
+    assert store.position("tETHUSD").amount == 2.0
+
+
+def test_snapshots_are_not_modified(store):
+    store.on_wallet_update([0, "wu", ["exchange", "USD", 90.0, 0, None]])
+    snapshot = store.snapshot()
+    store.on_wallet_update([0, "wu", ["exchange", "USD", 10.0, 0, None]])
+    assert snapshot.wallets[("exchange", "USD")].balance == 90.0
+    assert store.wallet("exchange", "USD").balance == 10.0
+
+
+def test_bootstrap_from_rest():
+    store = account.AccountStore(rest_client=FakeRestClient())
+    store.bootstrap()
+    assert store.wallet("exchange", "USD").balance == 100.0
+    assert store.position("tBTCUSD").amount == 0.5
+
+
+def test_bootstrap_does_not_overwrite_streamed_data():
+    store = account.AccountStore(rest_client=FakeRestClient())
+    store.on_wallet_snapshot([0, "ws", [["exchange", "USD", 5.0, 0, None]]])
+    store.bootstrap()
+    assert store.wallet("exchange", "USD").balance == 5.0
+    assert store.position("tBTCUSD").amount == 0.5
+
+
+def test_attach_registers_handlers():
+    client = WssClient("key", "secret")
+    store = account.AccountStore()
+    store.attach(client)
+    client._handle_auth_message([0, "wu", ["funding", "USD", 1.0, 0, None]])
+    assert store.wallet("funding", "USD").balance == 1.0
+
+
+def test_attach_keeps_the_auth_event_for_the_callback(monkeypatch):
+    monkeypatch.setattr(client_module.reactor, "callFromThread", lambda func, *args: None)
+    client = WssClient("key", "secret")
+    store = account.AccountStore(rest_client=FakeRestClient())
+    store.attach(client)
+    received = []
+    client._auth_callback = received.append
+    client._handle_auth_message({"event": "auth", "status": "OK"})
+    assert received == [{"event": "auth", "status": "OK"}]
@@ -0,0 +1,58 @@
+"""Tests for the batching of websocket order operations"""
+import pytest
+from bitfinex.websockets import batching
+
+# pylint: disable=W0621,C0111
+
+
+class FakeScheduler:
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, delay, func):
+        self.calls.append((delay, func))
+
+    def run(self):
+        calls, self.calls = self.calls, []
+        for _, func in calls:
+            func()
+
+
+@pytest.fixture
+def scheduler():
+    return FakeScheduler()
+
+
+def test_batch_is_sent_after_window(scheduler):
+    batches = []
+    batcher = batching.OrderBatcher(batches.append, scheduler, window=0.01)
+    batcher.add(["oc", {"id": 1}])
+    batcher.add(["oc", {"id": 2}])
+    assert batches == []
+    assert [delay for delay, _ in scheduler.calls] == [0.01]
+    scheduler.run()
+    assert batches == [[["oc", {"id": 1}], ["oc", {"id": 2}]]]
+    assert len(batcher) == 0
+
+
+def test_full_batch_is_sent_immediately(scheduler):
+    batches = []
+    batcher = batching.OrderBatcher(batches.append, scheduler, max_operations=2)
+    batcher.add(["oc", {"id": 1}])
+    batcher.add(["oc", {"id": 2}])
+    batcher.add(["oc", {"id": 3}])
+    assert batches == [[["oc", {"id": 1}], ["oc", {"id": 2}]]]
+    scheduler.run()
+    assert batches[1] == [["oc", {"id": 3}]]
+
+
+def test_empty_flush_sends_nothing(scheduler):
+    batches = []
+    batching.OrderBatcher(batches.append, scheduler).flush()
+    assert batches == []
+
+
+def test_max_operations_is_limited(scheduler):
+    with pytest.raises(ValueError):
+        batching.OrderBatcher(print, scheduler, max_operations=100)
@@ -0,0 +1,77 @@
+"""Tests for the coalescing of websocket calc requests"""
+import pytest
+from bitfinex.websockets import calculations
+
+# pylint: disable=W0621,C0111
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def make_scheduler(clock, **kwargs):
+    batches, scheduled = [], []
+    scheduler = calculations.CalcScheduler(
+        batches.append,
+        lambda delay, func: scheduled.append(delay),
+        clock=clock,
+        **kwargs
+    )
+    return scheduler, batches, scheduled
+
+
+def test_calculation_keys():
+    assert calculations.calculation_keys(
+        ["position_tBTCUSD", ["margin_sym_tBTCUSD", "wallet_margin_USD"]]
+    ) == ["position_tBTCUSD", "margin_sym_tBTCUSD", "wallet_margin_USD"]
+
+
+def test_pending_keys_are_deduplicated(clock):
+    scheduler, batches, scheduled = make_scheduler(clock)
+    scheduler.request(["margin_sym_tBTCUSD"])
+    scheduler.request("margin_sym_tBTCUSD", "position_tBTCUSD")
+    assert scheduled == [0.0]
+    scheduler.drain()
+    assert batches == [[["margin_sym_tBTCUSD"], ["position_tBTCUSD"]]]
+    assert scheduler.pending == []
+
+
+def test_batches_are_limited_and_paced(clock):
+    scheduler, batches, scheduled = make_scheduler(clock, rate=2.0, max_batch=2)
+    scheduler.request("a", "b", "c")
+    scheduler.drain()
+    assert batches == [[["a"], ["b"]]]
+    assert scheduled[-1] == pytest.approx(0.5)
+    scheduler.drain()
+    assert len(batches) == 1
+    clock.now = 0.5
+    scheduler.drain()
+    assert batches[1] == [["c"]]
+
+
+def test_pacing_counts_calculations(clock):
+    scheduler, batches, scheduled = make_scheduler(clock)
+    scheduler.request(*["position_%d" % index for index in range(20)])
+    scheduler.drain()
+    assert len(batches[0]) == 8
+    assert scheduled[-1] == pytest.approx(1.0)
+    clock.now = 1.0
+    scheduler.drain()
+    assert len(batches[1]) == 8
+    # The last 4 keys only need half a second of budget
+    assert scheduled[-1] == pytest.approx(0.5)
+
+
+def test_max_batch_is_limited(clock):
+    with pytest.raises(ValueError):
+        make_scheduler(clock, max_batch=31)
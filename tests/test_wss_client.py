@@ -0,0 +1,365 @@
+"""Tests for the v2 websocket client"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+import pytest
+from bitfinex import WssClient
+from bitfinex.websockets import client as client_module
+from bitfinex.websockets import correlation, ratelimit
+
+# pylint: disable=W0621,C0111
+
+
+@pytest.fixture
+def client():
+    return WssClient("key", "secret")
+
+
+def test_auth_handlers_receive_their_message_type(client):
+    orders, trades, other = [], [], []
+    client.add_auth_handler("on", orders.append)
+    client.add_auth_handler("trade executed", trades.append)
+    client._auth_callback = other.append
+    client._handle_auth_message([0, "on", [1]])
+    client._handle_auth_message([0, "te", [2]])
+    client._handle_auth_message([0, "hb"])
+    assert orders == [[0, "on", [1]]]
+    assert trades == [[0, "te", [2]]]
+    assert other == [[0, "hb"]]
+
+
+def test_auth_callback_receives_everything_without_handlers(client):
+    received = []
+    client._auth_callback = received.append
+    client._handle_auth_message({"event": "auth", "status": "OK"})
+    client._handle_auth_message([0, "on", [1]])
+    assert len(received) == 2
+
+
+def test_remove_auth_handler(client):
+    received = []
+    client.add_auth_handler("on", received.append)
+    client.remove_auth_handler("on", received.append)
+    client._handle_auth_message([0, "on", [1]])
+    assert received == []
+
+
+def test_auth_listeners_do_not_consume_messages(client):
+    listened, handled, other = [], [], []
+    client.add_auth_listener("on", listened.append)
+    client.add_auth_listener("n", listened.append)
+    client.add_auth_handler("on", handled.append)
+    client._auth_callback = other.append
+    client._handle_auth_message([0, "on", [1]])
+    client._handle_auth_message([0, "n", [2]])
+    assert listened == [[0, "on", [1]], [0, "n", [2]]]
+    assert handled == [[0, "on", [1]]]
+    assert other == [[0, "n", [2]]]
+    client.remove_auth_listener("n", listened.append)
+    client._handle_auth_message([0, "n", [3]])
+    assert len(listened) == 2
+
+
+def test_add_auth_handler_rejects_unknown_types(client):
+    with pytest.raises(ValueError):
+        client.add_auth_handler("unknown", print)
+    assert client._auth_handlers == {}
+
+
+class FakeProtocol:
+
+    def __init__(self):
+        self.sent = []
+
+    def sendMessage(self, payload, isBinary=False):
+        self.sent.append(json.loads(payload.decode('utf8')))
+
+
+class FakeFactory:
+
+    def __init__(self, protocol=None):
+        self.protocol_instance = protocol
+        self.unsent = deque()
+        self.unsent_orders = deque()
+        self.authenticated = protocol is not None
+        self.callback = None
+
+
+@pytest.fixture
+def call_from_thread(monkeypatch):
+    calls = []
+    monkeypatch.setattr(client_module.reactor, "callFromThread",
+                        lambda func, *args: calls.append((func, args)))
+    return calls
+
+
+def run_reactor_calls(calls):
+    while calls:
+        func, args = calls.pop(0)
+        func(*args)
+
+
+@pytest.fixture
+def connected_client(client, monkeypatch):
+    monkeypatch.setattr(client_module.reactor, "callFromThread",
+                        lambda func, *args: func(*args))
+    monkeypatch.setattr(client_module.reactor, "callLater", lambda *args: None)
+    client.factories["auth"] = FakeFactory(FakeProtocol())
+    return client
+
+
+def sent_messages(client):
+    return client.factories["auth"].protocol_instance.sent
+
+
+def notification(request_type, data, status="SUCCESS", text=""):
+    return [0, "n", [1, request_type, None, None, data, None, status, text]]
+
+
+def test_new_order_returns_cid(connected_client):
+    cid = connected_client.new_order("LIMIT", "BTCUSD", "1", "100")
+    assert sent_messages(connected_client)[0][1] == "on"
+    assert sent_messages(connected_client)[0][3]["cid"] == cid
+
+
+def test_new_order_future_resolves_on_notification(connected_client):
+    future = connected_client.new_order("LIMIT", "BTCUSD", "1", "100", future=True)
+    cid = sent_messages(connected_client)[0][3]["cid"]
+    connected_client._handle_auth_message(notification("on-req", [1, None, cid]))
+    assert future.result(timeout=0) == [1, None, cid]
+
+
+def test_new_order_future_fails_on_error(connected_client):
+    future = connected_client.new_order("LIMIT", "BTCUSD", "1", "100", future=True)
+    cid = sent_messages(connected_client)[0][3]["cid"]
+    connected_client._handle_auth_message(
+        notification("on-req", [None, None, cid], "ERROR", "not enough balance")
+    )
+    with pytest.raises(correlation.OrderRequestError):
+        future.result(timeout=0)
+
+
+def test_futures_are_discarded_when_sending_fails(connected_client, monkeypatch):
+    def fail(*args):
+        raise ratelimit.SendQueueFull("full")
+
+    monkeypatch.setattr(connected_client, "_send", fail)
+    with pytest.raises(ratelimit.SendQueueFull):
+        connected_client.cancel_order(5, future=True)
+    with pytest.raises(ratelimit.SendQueueFull):
+        connected_client.multi_order([["oc", {"id": 6}], ["oc", {"id": 7}]], future=True)
+    assert len(connected_client._requests) == 0
+
+
+def test_cancel_order_futures(connected_client):
+    by_id = connected_client.cancel_order(5, future=True)
+    by_cid = connected_client.cancel_order_cid(7, "2018-10-01", future=True)
+    connected_client._handle_auth_message(notification("oc-req", [6, None, 7]))
+    connected_client._handle_auth_message(notification("oc-req", [5, None, 8]))
+    assert by_id.result(timeout=0)[0] == 5
+    assert by_cid.result(timeout=0)[2] == 7
+
+
+def test_update_order_future(connected_client):
+    future = connected_client.update_order(id=5, price="10", future=True)
+    assert sent_messages(connected_client)[0][3] == {"id": 5, "price": "10"}
+    connected_client._handle_auth_message(notification("ou-req", [5, None, 8]))
+    assert future.result(timeout=0)[0] == 5
+
+
+def test_multi_order_futures(connected_client):
+    operation = connected_client.new_order_op("LIMIT", "BTCUSD", "1", "100")
+    futures = connected_client.multi_order(
+        [["on", operation], ["oc", {"id": 5}], ["oc_multi", {"all": 1}]],
+        future=True
+    )
+    assert futures[2] is None
+    connected_client._handle_auth_message(notification("ox_multi-req", [
+        [1, "on-req", None, None, [1, None, operation["cid"]], None, "SUCCESS", ""],
+        [1, "oc-req", None, None, [5, None, 3], None, "ERROR", "not found"],
+    ]))
+    assert futures[0].result(timeout=0)[2] == operation["cid"]
+    with pytest.raises(correlation.OrderRequestError):
+        futures[1].result(timeout=0)
+
+
+def test_asyncio_future(connected_client):
+    async def place_order():
+        future = connected_client.new_order(
+            "LIMIT", "BTCUSD", "1", "100", future="asyncio"
+        )
+        cid = sent_messages(connected_client)[0][3]["cid"]
+        connected_client._handle_auth_message(notification("on-req", [1, None, cid]))
+        return await future
+
+    assert asyncio.run(place_order())[0] == 1
+
+
+def test_request_tracker_expires_futures():
+    tracker = correlation.RequestTracker()
+    future = tracker.register(correlation.new_order_key(1), timeout=5)
+    tracker.expire(time.monotonic() + 10)
+    with pytest.raises(TimeoutError):
+        future.result(timeout=0)
+    assert len(tracker) == 0
+
+
+def test_batched_order_operations(connected_client):
+    connected_client.enable_batching()
+    scheduled = []
+    connected_client._batcher.schedule = lambda delay, func: scheduled.append(func)
+    new_order = connected_client.new_order("LIMIT", "BTCUSD", "1", "100", future=True)
+    cancel = connected_client.cancel_order(5, future=True)
+    assert sent_messages(connected_client) == []
+    scheduled[0]()
+    frame = sent_messages(connected_client)[0]
+    assert frame[1] == "ox_multi"
+    assert [operation[0] for operation in frame[3]] == ["on", "oc"]
+    connected_client._handle_auth_message(notification("ox_multi-req", [
+        [1, "on-req", None, None, [1, None, frame[3][0][1]["cid"]], None, "SUCCESS", ""],
+        [1, "oc-req", None, None, [5, None, 3], None, "SUCCESS", ""],
+    ]))
+    assert new_order.result(timeout=0)[0] == 1
+    assert cancel.result(timeout=0)[0] == 5
+
+
+def test_disable_batching_sends_pending_operations(connected_client):
+    connected_client.enable_batching()
+    connected_client._batcher.schedule = lambda delay, func: None
+    connected_client.cancel_order(5)
+    connected_client.disable_batching()
+    assert sent_messages(connected_client) == [[0, "oc", None, {"id": 5}]]
+
+
+def test_rate_limited_client_sends_cancels_first(connected_client):
+    connected_client.enable_rate_limit(budgets={
+        ratelimit.ORDER: (1.0, 1), ratelimit.CANCEL: (1.0, 1)
+    })
+    connected_client._governor.schedule = lambda delay, func: None
+    connected_client.new_order("LIMIT", "BTCUSD", "1", "100")
+    connected_client.new_order("LIMIT", "BTCUSD", "1", "101")
+    connected_client.cancel_order(1)
+    connected_client.cancel_order(2)
+    assert [frame[1] for frame in sent_messages(connected_client)] == ["on", "oc"]
+    connected_client._governor._buckets[ratelimit.ORDER]._tokens = 1
+    connected_client._governor._buckets[ratelimit.CANCEL]._tokens = 1
+    connected_client._governor.drain()
+    assert [frame[1] for frame in sent_messages(connected_client)] == [
+        "on", "oc", "oc", "on"
+    ]
+
+
+def test_calc_without_scheduler(connected_client):
+    connected_client.calc(["position_tBTCUSD"])
+    assert sent_messages(connected_client) == [[0, "calc", None, [["position_tBTCUSD"]]]]
+
+
+def test_calc_with_scheduler(connected_client):
+    connected_client.enable_calc_scheduler()
+    scheduled = []
+    connected_client._calc_scheduler.schedule = lambda delay, func: scheduled.append(func)
+    connected_client.calc(["position_tBTCUSD"])
+    connected_client.calc(["position_tBTCUSD", "wallet_margin_USD"])
+    scheduled[0]()
+    assert sent_messages(connected_client) == [
+        [0, "calc", None, [["position_tBTCUSD"], ["wallet_margin_USD"]]]
+    ]
+
+
+def test_messages_are_sent_from_the_reactor_thread(client, call_from_thread):
+    protocol = FakeProtocol()
+    client.factories["auth"] = FakeFactory(protocol)
+    client.cancel_order(1)
+    client.cancel_order(2)
+    assert protocol.sent == []
+    # A single reactor call writes every queued message
+    assert len(call_from_thread) == 1
+    run_reactor_calls(call_from_thread)
+    assert [frame[3]["id"] for frame in protocol.sent] == [1, 2]
+
+
+def test_messages_are_kept_until_connected(client, call_from_thread):
+    factory = FakeFactory()
+    client.factories["auth"] = factory
+    client.calc(["wallet_margin_USD"])
+    run_reactor_calls(call_from_thread)
+    assert len(factory.unsent) == 1
+    protocol = FakeProtocol()
+    protocol.factory = factory
+    client_module.BitfinexClientProtocol.onOpen(protocol)
+    assert factory.protocol_instance is protocol
+    assert protocol.sent == [[0, "calc", None, [["wallet_margin_USD"]]]]
+
+
+def test_order_ops_wait_for_authentication(client, call_from_thread):
+    factory = FakeFactory()
+    client.factories["auth"] = factory
+    client.cancel_order(1)
+    run_reactor_calls(call_from_thread)
+    protocol = FakeProtocol()
+    protocol.factory = factory
+    client_module.BitfinexClientProtocol.onOpen(protocol)
+    assert protocol.sent == []
+    client._handle_auth_message({"event": "auth", "status": "OK"})
+    run_reactor_calls(call_from_thread)
+    assert protocol.sent == [[0, "oc", None, {"id": 1}]]
+
+
+def test_order_ops_are_not_replayed_after_a_disconnect(client, call_from_thread):
+    protocol = FakeProtocol()
+    factory = FakeFactory(protocol)
+    factory.base_client = client
+    factory.callback = client._handle_auth_message
+    notifications = []
+    client.add_auth_handler("n", notifications.append)
+    client.factories["auth"] = factory
+    protocol.factory = factory
+    client_module.BitfinexClientProtocol.onClose(protocol, False, None, None)
+    future = client.new_order("LIMIT", "BTCUSD", "1", "100", future=True)
+    run_reactor_calls(call_from_thread)
+    # Disconnected: waits for the next session, and fails if it is lost too
+    assert len(factory.unsent_orders) == 1
+    client_module.BitfinexClientProtocol.onOpen(protocol)
+    client_module.BitfinexClientProtocol.onClose(protocol, False, None, None)
+    assert not factory.unsent_orders
+    with pytest.raises(correlation.OrderNotSentError):
+        future.result(timeout=0)
+    assert notifications[0][2][1] == "on-req"
+    assert notifications[0][2][6] == "ERROR"
+
+
+def test_stale_order_ops_are_not_sent(client, call_from_thread, monkeypatch):
+    factory = FakeFactory()
+    factory.callback = lambda message: None
+    client.factories["auth"] = factory
+    future = client.cancel_order(1, future=True)
+    run_reactor_calls(call_from_thread)
+    protocol = FakeProtocol()
+    protocol.factory = factory
+    client_module.BitfinexClientProtocol.onOpen(protocol)
+    now = client_module.time.monotonic() + client.ORDER_SEND_TIMEOUT + 1
+    monkeypatch.setattr(client_module.time, "monotonic", lambda: now)
+    client._handle_auth_message({"event": "auth", "status": "OK"})
+    run_reactor_calls(call_from_thread)
+    assert protocol.sent == []
+    with pytest.raises(correlation.OrderNotSentError):
+        future.result(timeout=0)
+
+
+def test_messages_are_sent_concurrently(client, call_from_thread):
+    protocol = FakeProtocol()
+    client.factories["auth"] = FakeFactory(protocol)
+
+    def worker(offset):
+        for order_id in range(offset, offset + 500):
+            client.cancel_order(order_id)
+
+    threads = [threading.Thread(target=worker, args=(offset,)) for offset in (0, 500)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    run_reactor_calls(call_from_thread)
+    assert sorted(frame[3]["id"] for frame in protocol.sent) == list(range(1000))
@@ -0,0 +1,199 @@
+"""Tests for the delivery queues of websocket messages"""
+import threading
+import time
+import pytest
+from bitfinex import WssClient
+from bitfinex.websockets import client as client_module
+from bitfinex.websockets import delivery
+
+# pylint: disable=W0621,C0111
+
+
+class BlockedCallback:
+    """Callback that waits until it is released"""
+
+    def __init__(self):
+        self.received = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, message):
+        self.started.set()
+        self.release.wait(5)
+        self.received.append(message)
+
+
+def test_messages_are_delivered_in_order():
+    received = []
+    queue = delivery.DeliveryQueue(received.append)
+    for message in range(100):
+        queue.put(message)
+    queue.close(timeout=5)
+    assert received == list(range(100))
+    assert queue.delivered == 100
+    assert queue.dropped == 0
+
+
+def test_drop_oldest():
+    callback = BlockedCallback()
+    queue = delivery.DeliveryQueue(callback, maxsize=2, policy=delivery.DROP_OLDEST)
+    queue.put(0)
+    callback.started.wait(5)
+    for message in range(1, 5):
+        queue.put(message)
+    assert queue.dropped == 2
+    assert queue.max_depth == 2
+    callback.release.set()
+    queue.close(timeout=5)
+    assert callback.received == [0, 3, 4]
+
+
+def test_conflate_keeps_latest_data():
+    callback = BlockedCallback()
+    queue = delivery.DeliveryQueue(callback, policy=delivery.CONFLATE)
+    queue.put([1, [0]])
+    callback.started.wait(5)
+    queue.put([1, [1]])
+    queue.put([1, [2]])
+    queue.put([1, "hb"])
+    callback.release.set()
+    queue.close(timeout=5)
+    assert callback.received == [[1, [0]], [1, [2]]]
+    assert queue.dropped == 2
+
+
+def test_pause_never_waits_nor_drops():
+    callback = BlockedCallback()
+    events = []
+    queue = delivery.DeliveryQueue(
+        callback, maxsize=2, policy=delivery.PAUSE,
+        on_full=lambda: events.append("full"), on_drain=lambda: events.append("drain"))
+    queue.put(0)
+    callback.started.wait(5)
+    for message in (1, 2, 3):
+        queue.put(message)
+    assert events == ["full"]
+    assert queue.depth == 3
+    callback.release.set()
+    queue.close(timeout=5)
+    assert callback.received == [0, 1, 2, 3]
+    assert events == ["full", "drain"]
+    assert queue.dropped == 0
+
+
+class FakeTransport:
+
+    def __init__(self):
+        self.calls = []
+
+    def pauseProducing(self):
+        self.calls.append("pause")
+
+    def resumeProducing(self):
+        self.calls.append("resume")
+
+
+def test_pause_stops_reading_the_socket(monkeypatch):
+    calls = []
+    monkeypatch.setattr(client_module.reactor, "callFromThread",
+                        lambda func, *args: calls.append((func, args)))
+    client = WssClient()
+    client.subscribe_to_trades("BTCUSD", print, queue_policy=delivery.PAUSE, queue_size=1)
+    transport = FakeTransport()
+    factory = client.factories["trades_tBTCUSD"]
+    factory.protocol_instance = type("Protocol", (), {"transport": transport})()
+    queue = client.queues["trades_tBTCUSD"]
+    queue.on_full()
+    queue.on_drain()
+    for func, args in calls:
+        if func != client.add_connection:
+            func(*args)
+    assert transport.calls == ["pause", "resume"]
+    queue.close(timeout=5)
+
+
+def test_callback_errors_do_not_stop_delivery():
+    received = []
+
+    def callback(message):
+        if message == 0:
+            raise ValueError("boom")
+        received.append(message)
+
+    queue = delivery.DeliveryQueue(callback)
+    queue.put(0)
+    queue.put(1)
+    queue.close(timeout=5)
+    assert received == [1]
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        delivery.DeliveryQueue(print, policy="unknown")
+
+
+def test_subscription_with_queue(monkeypatch):
+    monkeypatch.setattr(client_module.reactor, "callFromThread", lambda *args: None)
+    client = WssClient()
+    client.subscribe_to_ticker("BTCUSD", print, queue_policy=delivery.CONFLATE)
+    assert isinstance(client.factories["ticker_tBTCUSD"].callback, delivery.DeliveryQueue)
+    assert client.queue_stats()["ticker_tBTCUSD"]["depth"] == 0
+    client.queues["ticker_tBTCUSD"].close(timeout=5)
+
+
+def test_min_interval_conflates_updates():
+    received = []
+    queue = delivery.DeliveryQueue(
+        received.append, policy=delivery.CONFLATE, min_interval=0.2
+    )
+    queue.put([1, [0]])
+    for _ in range(50):
+        if received:
+            break
+        time.sleep(0.01)
+    for price in range(1, 10):
+        queue.put([1, [price]])
+    queue.close(timeout=5)
+    assert received == [[1, [0]], [1, [9]]]
+    assert queue.dropped == 8
+
+
+def test_conflate_keeps_events_and_snapshots():
+    callback = BlockedCallback()
+    queue = delivery.DeliveryQueue(callback, policy=delivery.CONFLATE)
+    queue.put({"event": "info"})
+    callback.started.wait(5)
+    queue.put({"event": "subscribed", "chanId": 1})
+    queue.put([1, [[1, 2], [3, 4]]])
+    queue.put([1, [5, 6]])
+    queue.put([1, [7, 8]])
+    callback.release.set()
+    queue.close(timeout=5)
+    assert callback.received == [
+        {"event": "info"},
+        {"event": "subscribed", "chanId": 1},
+        [1, [[1, 2], [3, 4]]],
+        [1, [7, 8]],
+    ]
+
+
+def test_conflated_candle_subscription(monkeypatch):
+    monkeypatch.setattr(client_module.reactor, "callFromThread", lambda *args: None)
+    client = WssClient()
+    client.subscribe_to_candles("BTCUSD", "1m", print, conflate=0.5)
+    queue = client.queues["candles_BTCUSD_1m"]
+    assert queue.policy == delivery.CONFLATE
+    assert queue.min_interval == 0.5
+    queue.close(timeout=5)
+
+
+def test_incremental_channels_refuse_conflation(monkeypatch):
+    monkeypatch.setattr(client_module.reactor, "callFromThread", lambda *args: None)
+    client = WssClient()
+    with pytest.raises(ValueError):
+        client.subscribe_to_orderbook("BTCUSD", "P0", print, queue_policy=delivery.CONFLATE)
+    with pytest.raises(ValueError):
+        client.subscribe_to_orderbook("BTCUSD", "R0", print, queue_policy=delivery.CONFLATE)
+    with pytest.raises(ValueError):
+        client.subscribe_to_trades("BTCUSD", print, queue_policy=delivery.CONFLATE)
+    assert client.queues == {}
@@ -0,0 +1,94 @@
+"""Tests for the memory mapped market data hub"""
+import multiprocessing
+import numpy as np
+import pytest
+from bitfinex.websockets import hub
+
+# pylint: disable=W0621,C0111
+
+
+@pytest.fixture
+def path(tmpdir):
+    return str(tmpdir.join("hub"))
+
+
+def test_reader_receives_published_records(path):
+    market_hub = hub.MarketDataHub(path, capacity=8)
+    reader = hub.HubReader(path)
+    market_hub.publish(hub.TRADE, "tBTCUSD", 1000, (1, 0.5, 6000.0))
+    market_hub.publish(hub.TRADE, "tETHUSD", 1001, (2, -1.0, 200.0))
+    records = np.concatenate(reader.poll())
+    assert list(records["mts"]) == [1000, 1001]
+    assert [reader.symbol(index) for index in records["symbol"]] == [
+        "tBTCUSD", "tETHUSD"
+    ]
+    assert list(records["values"][:, 2]) == [6000.0, 200.0]
+    assert np.isnan(records["values"][0, 3])
+    assert reader.poll() == []
+
+
+def test_reader_wraps_around(path):
+    market_hub = hub.MarketDataHub(path, capacity=4)
+    reader = hub.HubReader(path)
+    for mts in range(2):
+        market_hub.publish(hub.TICKER, "tBTCUSD", mts, [mts])
+    reader.poll()
+    for mts in range(2, 5):
+        market_hub.publish(hub.TICKER, "tBTCUSD", mts, [mts])
+    chunks = reader.poll()
+    assert len(chunks) == 2
+    assert list(np.concatenate(chunks)["mts"]) == [2, 3, 4]
+
+
+def test_slow_reader_loses_records(path):
+    market_hub = hub.MarketDataHub(path, capacity=4)
+    reader = hub.HubReader(path)
+    for mts in range(10):
+        market_hub.publish(hub.TICKER, "tBTCUSD", mts, [mts])
+    records = np.concatenate(reader.poll())
+    assert list(records["mts"]) == [6, 7, 8, 9]
+    assert reader.lost == 6
+
+
+def test_callbacks_parse_messages(path):
+    market_hub = hub.MarketDataHub(path)
+    reader = hub.HubReader(path)
+    market_hub.trades_callback("BTCUSD")([1, "te", [5, 1000, 0.1, 6000.0]])
+    market_hub.trades_callback("BTCUSD")([1, "hb"])
+    market_hub.orderbook_callback("BTCUSD")([2, [[6000.0, 1, 0.5], [6001.0, 2, -0.5]]])
+    market_hub.candles_callback("BTCUSD")([3, [[2000, 1, 2, 3, 0.5, 10], [1000, 1, 2, 3, 0.5, 10]]])
+    records = np.concatenate(reader.poll())
+    assert list(records["kind"]) == [hub.TRADE, hub.BOOK, hub.BOOK, hub.CANDLE, hub.CANDLE]
+    assert list(records["mts"][-2:]) == [1000, 2000]
+    assert reader.symbol(records["symbol"][0]) == "tBTCUSD"
+
+
+def _read_in_process(path, queue):
+    reader = hub.HubReader(path, from_start=True)
+    queue.put([int(mts) for chunk in reader.poll() for mts in chunk["mts"]])
+
+
+def test_records_are_shared_between_processes(path):
+    market_hub = hub.MarketDataHub(path)
+    for mts in range(5):
+        market_hub.publish(hub.TICKER, "tBTCUSD", mts, [mts])
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_read_in_process, args=(path, queue))
+    process.start()
+    assert queue.get(timeout=30) == [0, 1, 2, 3, 4]
+    process.join()
+
+
+def test_reader_drops_records_overwritten_mid_chunk(path):
+    market_hub = hub.MarketDataHub(path, capacity=4)
+    reader = hub.HubReader(path)
+    for mts in range(4):
+        market_hub.publish(hub.TICKER, "tBTCUSD", mts, [mts])
+    # The hub laps the reader after it read the write cursor: the last
+    # slots of the chunk now hold newer records
+    reader._header = reader._header.copy()
+    for mts in range(4, 6):
+        market_hub.publish(hub.TICKER, "tBTCUSD", mts, [mts])
+    records = np.concatenate(reader.poll())
+    assert list(records["mts"]) == [2, 3]
+    assert reader.lost == 2
@@ -0,0 +1,94 @@
+"""Tests for the websocket order manager"""
+import pytest
+from bitfinex import WssClient
+from bitfinex.websockets import orders
+
+# pylint: disable=W0621,C0111
+
+
+def order_data(order_id, cid, symbol="tBTCUSD", amount=1.0, status="ACTIVE"):
+    return [
+        order_id, None, cid, symbol, 1, 2, amount, 1.0, "EXCHANGE LIMIT",
+        None, None, None, 0, status, None, None, 100.0, 0.0, 0, 0,
+        None, None, None, 0, 0, None, None, None,
+    ]
+
+
+@pytest.fixture
+def manager():
+    return orders.OrderManager()
+
+
+def test_parse_order_state():
+    assert orders.parse_order_state("ACTIVE") == orders.ACTIVE
+    assert orders.parse_order_state(
+        "EXECUTED @ 107.6(-0.2): was PARTIALLY FILLED @ 107.6(-0.1)"
+    ) == orders.EXECUTED
+    assert orders.parse_order_state("PARTIALLY FILLED @ 1(-0.1)") == (
+        orders.PARTIALLY_FILLED
+    )
+    assert orders.parse_order_state("POSTONLY CANCELED") == orders.CANCELED
+    assert orders.parse_order_state("INSUFFICIENT MARGIN") == orders.REJECTED
+
+
+def test_new_orders_are_open(manager):
+    manager.on_order([0, "on", order_data(1, 11)])
+    manager.on_order([0, "on", order_data(2, 12, symbol="tETHUSD")])
+    assert manager.is_open(1)
+    assert manager.get_by_cid(12).id == 2
+    assert [order.id for order in manager.open_orders("tBTCUSD")] == [1]
+    assert manager.open_count() == 2
+
+
+def test_order_lifecycle(manager):
+    manager.on_notification([0, "n", [
+        1, "on-req", None, None, order_data(1, 11), None, "SUCCESS", "ok"
+    ]])
+    assert manager.get(1).state == orders.PENDING
+    manager.on_order([0, "on", order_data(1, 11)])
+    manager.on_order([0, "ou", order_data(1, 11, status="PARTIALLY FILLED @ 1(-0.1)")])
+    assert manager.get(1).state == orders.PARTIALLY_FILLED
+    assert manager.is_open(1)
+    manager.on_order_close([0, "oc", order_data(1, 11, status="EXECUTED @ 1(-1.0)")])
+    assert manager.get(1).state == orders.EXECUTED
+    assert not manager.is_open(1)
+    assert manager.open_orders("tBTCUSD") == []
+
+
+def test_rejected_order(manager):
+    manager.on_notification([0, "n", [
+        1, "on-req", None, None, order_data(None, 11), None, "ERROR",
+        "Invalid order: not enough balance"
+    ]])
+    assert manager.get_by_cid(11).state == orders.REJECTED
+    assert manager.open_count() == 0
+
+
+def test_snapshot_replaces_open_orders(manager):
+    manager.on_order([0, "on", order_data(1, 11)])
+    manager.on_snapshot([0, "os", [order_data(2, 12), order_data(3, 13)]])
+    assert not manager.is_open(1)
+    assert {order.id for order in manager.open_orders()} == {2, 3}
+
+
+def test_closed_orders_are_bounded():
+    manager = orders.OrderManager(max_closed=2)
+    for order_id in range(5):
+        manager.on_order([0, "on", order_data(order_id, order_id + 10)])
+        manager.on_order_close([0, "oc", order_data(order_id, order_id + 10, status="CANCELED")])
+    assert manager.get(0) is None
+    assert manager.get(4).state == orders.CANCELED
+
+
+def test_attach_registers_handlers():
+    client = WssClient("key", "secret")
+    manager = orders.OrderManager()
+    manager.attach(client)
+    received = []
+    client._auth_callback = received.append
+    client._handle_auth_message([0, "on", order_data(1, 11)])
+    assert manager.is_open(1)
+    # The manager only observes the messages
+    error = [0, "n", [1, "oc-req", None, None, [5], None, "ERROR", "not found"]]
+    client._handle_auth_message(error)
+    assert received == [[0, "on", order_data(1, 11)], error]
@@ -0,0 +1,150 @@
+"""Tests for the send side rate limiting of websocket messages"""
+import threading
+import pytest
+from bitfinex.websockets import ratelimit
+
+# pylint: disable=W0621,C0111
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def make_governor(clock, **kwargs):
+    sent, scheduled = [], []
+    governor = ratelimit.SendGovernor(
+        sent.append,
+        lambda delay, func: scheduled.append(delay),
+        clock=clock,
+        **kwargs
+    )
+    return governor, sent, scheduled
+
+
+def test_classify():
+    assert ratelimit.classify([0, "oc", None, {"id": 1}]) == ratelimit.CANCEL
+    assert ratelimit.classify([0, "on", None, {}]) == ratelimit.ORDER
+    assert ratelimit.classify([0, "ox_multi", None, [["oc", {}]]]) == ratelimit.CANCEL
+    assert ratelimit.classify([0, "ox_multi", None, [["oc", {}], ["on", {}]]]) == (
+        ratelimit.ORDER
+    )
+    assert ratelimit.classify([0, "calc", None, []]) == ratelimit.CALC
+    assert ratelimit.classify({"event": "ping", "cid": 1}) == ratelimit.PING
+
+
+def test_token_bucket(clock):
+    bucket = ratelimit.TokenBucket(2.0, 2, clock)
+    assert bucket.consume()
+    assert bucket.consume()
+    assert not bucket.consume()
+    assert bucket.delay() == pytest.approx(0.5)
+    clock.now = 0.5
+    assert bucket.consume()
+
+
+def test_messages_over_budget_are_queued(clock):
+    governor, sent, scheduled = make_governor(clock, budgets={ratelimit.ORDER: (1.0, 1)})
+    assert governor.submit(ratelimit.ORDER, "first")
+    assert not governor.submit(ratelimit.ORDER, "second")
+    assert sent == ["first"]
+    assert scheduled == [pytest.approx(1.0)]
+    clock.now = 1.0
+    governor.drain()
+    assert sent == ["first", "second"]
+    assert governor.queued == 0
+
+
+def test_cancels_are_sent_first(clock):
+    governor, sent, _ = make_governor(clock, budgets={
+        ratelimit.ORDER: (1.0, 1), ratelimit.CANCEL: (1.0, 1)
+    })
+    governor.submit(ratelimit.ORDER, "order 1")
+    governor.submit(ratelimit.CANCEL, "cancel 1")
+    governor.submit(ratelimit.ORDER, "order 2")
+    governor.submit(ratelimit.CANCEL, "cancel 2")
+    clock.now = 1.0
+    governor.drain()
+    assert sent == ["order 1", "cancel 1", "cancel 2", "order 2"]
+
+
+def test_backpressure(clock):
+    signals = []
+    governor, _, _ = make_governor(
+        clock, budgets={ratelimit.CALC: (1.0, 1)}, max_queued=3,
+        high_watermark=1, on_backpressure=signals.append
+    )
+    for _ in range(4):
+        governor.submit(ratelimit.CALC, "calc")
+    assert governor.congested
+    with pytest.raises(ratelimit.SendQueueFull):
+        governor.submit(ratelimit.CALC, "calc")
+    for second in range(1, 4):
+        clock.now = second
+        governor.drain()
+    assert governor.queued == 0
+    assert not governor.congested
+    assert signals == [True, False]
+
+
+def test_order_targets():
+    assert ratelimit.order_targets([0, "on", None, {"cid": 7}]) == {("cid", 7)}
+    assert ratelimit.order_targets([0, "oc", None, {"id": 1}]) == {("id", 1)}
+    assert ratelimit.order_targets([0, "oc_multi", None, {"cid": [[7, "2026-10-18"]]}]) == {
+        ("cid", 7)
+    }
+    assert ratelimit.order_targets([0, "oc_multi", None, {"all": 1}]) == ratelimit.ALL_ORDERS
+    assert ratelimit.order_targets(
+        [0, "ox_multi", None, [["on", {"cid": 7}], ["ou", {"id": 1}]]]
+    ) == {("cid", 7), ("id", 1)}
+    assert ratelimit.order_targets({"event": "ping", "cid": 1}) == set()
+
+
+def test_cancels_wait_for_the_orders_they_target(clock):
+    governor, sent, _ = make_governor(clock, budgets={
+        ratelimit.ORDER: (1.0, 1), ratelimit.CANCEL: (1.0, 1)
+    })
+    governor.submit(ratelimit.ORDER, "order 1", {("cid", 1)})
+    governor.submit(ratelimit.ORDER, "order 2", {("cid", 2)})
+    assert not governor.submit(ratelimit.CANCEL, "cancel 2", {("cid", 2)})
+    assert governor.submit(ratelimit.CANCEL, "cancel 1", {("cid", 1)})
+    assert not governor.submit(ratelimit.CANCEL, "cancel all", ratelimit.ALL_ORDERS)
+    for second in range(1, 4):
+        clock.now = second
+        governor.drain()
+    assert sent == ["order 1", "cancel 1", "order 2", "cancel 2", "cancel all"]
+
+
+def test_backpressure_is_signalled_without_the_lock(clock):
+    signals = []
+
+    def try_lock():
+        acquired = governor._lock.acquire(blocking=False)
+        if acquired:
+            governor._lock.release()
+        signals.append(acquired)
+
+    def on_backpressure(_):
+        # The lock is reentrant, so try to take it from another thread
+        thread = threading.Thread(target=try_lock)
+        thread.start()
+        thread.join()
+
+    governor, _, _ = make_governor(
+        clock, budgets={ratelimit.CALC: (1.0, 1)}, high_watermark=0,
+        on_backpressure=on_backpressure
+    )
+    governor.submit(ratelimit.CALC, "calc")
+    governor.submit(ratelimit.CALC, "calc")
+    clock.now = 1.0
+    governor.drain()
+    assert signals == [True, True]